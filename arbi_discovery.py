@@ -1,8 +1,8 @@
 import time
 import logging
-from Queue import Queue
+from threading import Event
 from PySide.QtCore import QThread, QObject, Signal
-from arbi.utils import merge_dict
+from arbi.utils import merge_dict, NotifyingQueue, WakeupTimer
 from arbi.constants import THREAD_ALIVE_CHECK_INTERVAL, PROCESS_EXEC_MSG_MAX_TIME, EMPTY_SRC_Q_SLEEP_TIME, BOOKIE_ID_MAP
 from arbi.feeds.vip.networking import VIPFeedThreadObj
 from arbi.feeds.vip.constants import RECONNECT_DELAY, ACCOUNT_MAP
@@ -10,6 +10,9 @@ from arbi.feeds.betfair.feed import BetfairFeedThreadObj
 from arbi.feeds.betfair.constants import BETFAIR_FEED_IP, BETFAIR_FEED_PORT, BETFAIR_USERNAME, BETFAIR_PASSWORD
 from arbi.execution.constants import HEARTBEAT_INTERVAL, EXEC_RECONNECT_DELAY
 from arbi.execution.arbi_exec import ArbiExecMsgerThreadObj, ExecMsgerConnectionError
+from arbi.discovery_shard import ShardRouter
+from arbi.models.latency import latency_stats, stamp_record_lists
+from arbi.models.opportunity import OppsDiff
 
 
 log = logging.getLogger(__name__)
@@ -18,7 +21,7 @@ log.addHandler(logging.StreamHandler())
 
 
 class ArbiDiscoverySignal(QObject):
-    found = Signal(list)
+    found = Signal(object)  # OppsDiff of the table rows, see signal_table_view_update()
     pkg_count = Signal(tuple)
     switch_vip_server = Signal(str)
     switch_yy_server = Signal(str)
@@ -32,7 +35,10 @@ class ArbiDiscoveryThread(QThread):
         self.menu_bar_model = menu_bar_model
         self.signal = ArbiDiscoverySignal()
         self.heartbeat_time = time.time()
-        self.source_queue = Queue()
+        # set when anything is put to the source queue or the exec msger queue
+        self.wakeup_event = Event()
+        self.wakeup_timer = WakeupTimer(self.wakeup_event, EMPTY_SRC_Q_SLEEP_TIME)
+        self.source_queue = NotifyingQueue(self.wakeup_event)
         self.source_queue.has_put_init_dict_in = False
 
         self.exec_msger_queue = None
@@ -40,6 +46,7 @@ class ArbiDiscoveryThread(QThread):
         self.vip_feed_thread = None
         self.betfair_feed_thread = None
         self.slow_strats_pool = None
+        self.shard_router = None  # only in sharded mode, in which it is also the source queue
         self.is_running = False
         self.threads_alive_last_checked = 0
 
@@ -58,6 +65,9 @@ class ArbiDiscoveryThread(QThread):
             }
         """
         merge_dict(self.arbi_spotter.bookie_availability_dict, bookie_id_and_status)
+        self.arbi_spotter.full_scan_required = True
+        if self.shard_router:
+            self.shard_router.put_bookie_availability(self.arbi_spotter.bookie_availability_dict)
 
     def check_threads_alive(self):
         t = time.time()
@@ -70,11 +80,18 @@ class ArbiDiscoveryThread(QThread):
                 self.betfair_feed_thread.start(delay=5)
             if self.exec_msger_thread and self.check_exec_msger_thread_flag and not self.exec_msger_thread.thread.is_alive():
                 self.run_exec_msger_thread(restart=True)
+            if self.shard_router and self.shard_router.restart_dead_shards():
+                # the restarted shards get their matches from the init dict of a new VIP feed connection
+                self.shard_router.put_bookie_availability(self.arbi_spotter.bookie_availability_dict)
+                if self.vip_feed_thread:
+                    self.vip_feed_thread.stop_event.set()
+                    self.run_vip_feed_thread()
 
     def init_data_engine_match_dict(self):
         while self.is_running:
+            self.wakeup_event.clear()
             if self.source_queue.empty():
-                time.sleep(1)
+                self.wakeup_timer.wait(1)
             else:
                 init_dict = self.source_queue.get()
                 self.engine.init_match_dict(init_dict)
@@ -101,60 +118,151 @@ class ArbiDiscoveryThread(QThread):
         total_queue_size_count = 0
         self.threads_alive_last_checked = time.time()
 
+        if self.shard_router:
+            self.run_sharded_discovery_loop()
+            return
+
         self.init_data_engine_match_dict()
 
         while self.is_running:
             self.check_threads_alive()
 
+            self.wakeup_event.clear()  # before looking into the queues, so that nothing put after is missed
             self.process_exec_msger_queue()
 
             if self.source_queue.empty():
                 queue_empty_count += 1
                 if self.break_loop_count and queue_empty_count >= self.break_loop_count:
                     break
-                time.sleep(EMPTY_SRC_Q_SLEEP_TIME)
-            else:
+                # wake up on new packets or exec messages, or when there is something else to do
+                self.wakeup_timer.wait(self.get_wait_timeout())
+                self.process_exec_msger_queue()
+
+            record_lists = []
+            if not self.source_queue.empty():
                 self.engine.clear_unneeded_matches()
                 total_queue_size += self.source_queue.qsize()
                 total_queue_size_count += 1
                 while not self.source_queue.empty():
-                    record_list = self.source_queue.get()
-                    self.engine.update_match_dict(record_list)
+                    record_lists.append(self.source_queue.get())
                     pkg_count += 1
 
                     if signalled_pkg_count != pkg_count and pkg_count and pkg_count % 100 == 0:
                         self.signal.pkg_count.emit((pkg_count, float(total_queue_size) / total_queue_size_count))
                         signalled_pkg_count = pkg_count
-
-            r_arbi_opps = self.arbi_spotter.spot_arbi()
+                stamp_record_lists(record_lists, 'dequeued')
+                self.engine.update_match_dict(self.engine.coalesce_record_lists(record_lists))
+                stamp_record_lists(record_lists, 'applied')
+
+            self.arbi_spotter.spot_arbi(self.engine.pop_dirty_match_dict())
+            stamp_record_lists(record_lists, 'spotted')
+            latency_stats.add_record_lists(record_lists)
+            self.signal_table_view_update(self.arbi_spotter.arbi_opps_tracker.diff)
             if not self.exec_msger_thread.exec_messenger:
-                continue  # error when connect with execution system
+                # error when connect with execution system. All the opps are new once it is back.
+                self.arbi_spotter.arbi_opps_tracker.clear()
+                continue
 
-            arbi_opps = self.filter_arbi_opps(r_arbi_opps)
+            # unchanged opps have been sent before, or filtered out
+            arbi_opps = self.filter_arbi_opps(self.arbi_spotter.arbi_opps_tracker.get_updated_opps())
+            self.send_arbi_opps(arbi_opps)
 
-            current_time = time.time()
-            if arbi_opps:
-                try:
-                    self.exec_msger_thread.exec_messenger.send(arbi_opps)
-                except ExecMsgerConnectionError:
-                    self.run_exec_msger_thread(restart=True)
+        self.signal.pkg_count.emit(((pkg_count, float(total_queue_size) / total_queue_size_count)))
+
+    def get_wait_timeout(self):
+        """Return seconds until the discovery loop has something to do even if there is no new data,
+        i.e. heartbeat, checking threads alive, or checking running ball prices expiry.
+        """
+        deadline = min(self.heartbeat_time + HEARTBEAT_INTERVAL,
+                       self.threads_alive_last_checked + THREAD_ALIVE_CHECK_INTERVAL,
+                       self.arbi_spotter.next_rb_prices_expiry)
+        timeout = deadline - time.time()
+        if self.arbi_spotter.cross_handicap_strat_result is not None:
+            # the async result is only collected when spotting
+            timeout = min(timeout, EMPTY_SRC_Q_SLEEP_TIME)
+
+        # A deadline can stay in the past, e.g. heartbeat is not sent while the exec system is disconnected.
+        # New data still wakes the loop up immediately.
+        return max(timeout, EMPTY_SRC_Q_SLEEP_TIME)
+
+    def run_sharded_discovery_loop(self):
+        """The feeds put records to the shards through the shard router, where they are spotted.
+        Here we only merge the opps of all shards and send the new and changed ones.
+        """
+        shard_opps = {}
+        has_new_shard_opps = False
+        signalled_pkg_count = 0
+        queue_empty_count = 0
+        total_queue_size = 0
+        total_queue_size_count = 0
 
-                self.signal_table_view_update(arbi_opps)
-                self.heartbeat_time = current_time
-            elif current_time - self.heartbeat_time > HEARTBEAT_INTERVAL:
-                try:
-                    self.exec_msger_thread.exec_messenger.send_heartbeat()
-                except ExecMsgerConnectionError:
-                    self.run_exec_msger_thread(restart=True)
+        while self.is_running:
+            self.check_threads_alive()
 
-                self.heartbeat_time = current_time
+            self.process_exec_msger_queue()
 
-        self.signal.pkg_count.emit(((pkg_count, float(total_queue_size) / total_queue_size_count)))
+            new_shard_opps = self.shard_router.get_opps(timeout=EMPTY_SRC_Q_SLEEP_TIME)
+            if new_shard_opps:
+                shard_opps.update(new_shard_opps)
+                has_new_shard_opps = True
+            else:
+                queue_empty_count += 1
+                if self.break_loop_count and queue_empty_count >= self.break_loop_count:
+                    break
+
+            total_queue_size += self.shard_router.qsize()
+            total_queue_size_count += 1
+            pkg_count = self.shard_router.pkg_count
+            if signalled_pkg_count != pkg_count and pkg_count and pkg_count % 100 == 0:
+                self.signal.pkg_count.emit((pkg_count, float(total_queue_size) / total_queue_size_count))
+                signalled_pkg_count = pkg_count
+
+            if not self.exec_msger_thread.exec_messenger:
+                # error when connect with execution system. All the opps are new once it is back.
+                self.arbi_spotter.arbi_opps_tracker.clear()
+                continue
+
+            arbi_opps_tracker = self.arbi_spotter.arbi_opps_tracker
+            if has_new_shard_opps or arbi_opps_tracker.has_forgotten_opps:
+                arbi_opps_tracker.update([arbi_opp for arbi_opps in shard_opps.itervalues() for arbi_opp in arbi_opps])
+                self.signal_table_view_update(arbi_opps_tracker.diff)
+                arbi_opps = self.filter_arbi_opps(arbi_opps_tracker.get_updated_opps())
+                has_new_shard_opps = False
+            else:
+                arbi_opps = []
+            self.send_arbi_opps(arbi_opps)
+
+        if total_queue_size_count:
+            self.signal.pkg_count.emit((self.shard_router.pkg_count, float(total_queue_size) / total_queue_size_count))
+
+    def send_arbi_opps(self, arbi_opps):
+        """Send arbi_opps to the execution system, or heartbeat if there has been none for a while"""
+        current_time = time.time()
+        if arbi_opps:
+            try:
+                if not self.exec_msger_thread.exec_messenger.send(arbi_opps):
+                    # dropped, as the execution system can't keep up. They are sent again if still found.
+                    self.arbi_spotter.arbi_opps_tracker.forget(arbi_opps)
+            except ExecMsgerConnectionError:
+                self.run_exec_msger_thread(restart=True)
+
+            self.heartbeat_time = current_time
+        elif current_time - self.heartbeat_time > HEARTBEAT_INTERVAL:
+            try:
+                self.exec_msger_thread.exec_messenger.send_heartbeat()
+            except ExecMsgerConnectionError:
+                self.run_exec_msger_thread(restart=True)
+
+            self.heartbeat_time = current_time
 
-    def signal_table_view_update(self, arbi_opps):
-        if self.menu_bar_model.account_model.table_view_update:
-            arbi_summary = [opp.get_summary() for opp in arbi_opps]
-            self.signal.found.emit(arbi_summary)
+    def signal_table_view_update(self, opps_diff):
+        """Emit the changes of the opps found, i.e. opps_diff, to the table view as an OppsDiff of (key, summary)
+        for the new and changed opps and the keys of the withdrawn ones
+        """
+        if self.menu_bar_model.account_model.table_view_update and any(opps_diff):
+            self.signal.found.emit(OppsDiff([(opp.key, opp.get_summary()) for opp in opps_diff.new],
+                                            [(opp.key, opp.get_summary()) for opp in opps_diff.changed],
+                                            [opp.key for opp in opps_diff.withdrawn]))
 
     def process_exec_msger_queue(self):
         bookie_status_dict = {}
@@ -176,6 +284,10 @@ class ArbiDiscoveryThread(QThread):
             if bookie_id_and_status:
                 bookie_status_dict.update(bookie_id_and_status)
 
+            released_cooldown = exec_msg_dict.get('released cooldown')
+            if released_cooldown:
+                self.release_cooldown_opps(released_cooldown)
+
             restart_exec_msger_thread = exec_msg_dict.get('restart exec msger')
             if restart_exec_msger_thread:
                 self.run_exec_msger_thread(restart=True)
@@ -187,6 +299,17 @@ class ArbiDiscoveryThread(QThread):
         if t - t0 > PROCESS_EXEC_MSG_MAX_TIME:
             log.warning('It took {} seconds to process {} execution system messages'.format(t - t0, count))
 
+    def release_cooldown_opps(self, released_cooldown):
+        """Forget the opps with bookies released from cooldown by the execution system. Only new and changed opps
+        are sent, so the opps still found are sent again as new ones after the next scan.
+        """
+        exec_messenger = self.exec_msger_thread.exec_messenger
+        if not exec_messenger:
+            return
+        arbi_opps_tracker = self.arbi_spotter.arbi_opps_tracker
+        arbi_opps_tracker.forget([arbi_opp for arbi_opp in arbi_opps_tracker.arbi_opps
+                                  if exec_messenger.is_released_from_cooldown(arbi_opp, released_cooldown)])
+
     def filter_arbi_opps(self, arbi_opps):
         """Apply various of rules to filter out the opportunities that we don't want
         """
@@ -234,9 +357,20 @@ class ArbiDiscoveryThread(QThread):
         if not self.menu_bar_model.account_model.use_vip_mock_data:
             self.init_arbi_spotter_unavailable_bookie_ids()
 
+        if self.menu_bar_model.account_model.discovery_shard_count > 1:
+            self.start_shard_router(self.menu_bar_model.account_model.discovery_shard_count)
+
         # Discovery loop
         self.run_discovery_loop()
 
+    def start_shard_router(self, shard_count):
+        """Start the shard processes. The feeds put records to them through the router instead of the source queue.
+        """
+        self.shard_router = ShardRouter(shard_count, self.menu_bar_model)
+        self.shard_router.start()
+        self.shard_router.put_bookie_availability(self.arbi_spotter.bookie_availability_dict)
+        self.source_queue = self.shard_router
+
     def run_vip_feed_thread(self):
         model = self.menu_bar_model.account_model
         self.vip_feed_thread = VIPFeedThreadObj(self.source_queue,
@@ -264,13 +398,15 @@ class ArbiDiscoveryThread(QThread):
         or by arbi discovery when it fails to send data to exec system.
         """
         if restart:
+            # the new connection has none of the opps sent, nor any bookie in cooldown. All the opps are new to it.
+            self.arbi_spotter.arbi_opps_tracker.clear()
             log.error('*** Lost connection to Execution System server. Reconnect in {} seconds. ***'.format(EXEC_RECONNECT_DELAY))
             self.exec_msger_thread.stop_event.set()
             time.sleep(EXEC_RECONNECT_DELAY)
             log.error('*** Reconnecting to Execution System server... ***')
 
         model = self.menu_bar_model.account_model
-        self.exec_msger_queue = Queue()
+        self.exec_msger_queue = NotifyingQueue(self.wakeup_event)
         self.exec_msger_thread = ArbiExecMsgerThreadObj(self.exec_msger_queue,
                                                         model.send_orders, model.exec_system_on_localhost)
         self.exec_msger_thread.start()
@@ -309,8 +445,15 @@ class ArbiDiscoveryThread(QThread):
 
     def stop(self):
         self.is_running = False
+        self.wakeup_timer.stop()
+        self.wakeup_event.set()
 
         self.arbi_spotter.terminate_all_pools()
+        if self.shard_router:
+            self.shard_router.stop()
+            self.shard_router = None
+            self.source_queue = NotifyingQueue(self.wakeup_event)
+            self.source_queue.has_put_init_dict_in = False
 
         if self.vip_feed_thread:
             self.vip_feed_thread.stop_event.set()
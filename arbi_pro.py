@@ -63,17 +63,16 @@ class ArbiProModel(object):
     def update_pkt_count(self, count_tuple):
         self.pkt_count, average_queue_size = count_tuple
         log.info('-- pkt_count:%s, average_queue_size: %s', self.pkt_count, average_queue_size)
-        if self.menu_bar_model.account_model.table_view_update and self.pkt_count % 500 == 0 and self.table_model.table != [[]]:
-            # if we didn't clear it, the old content would be in the table view forever
-            self.table_model.update([[]])
         if self.pkt_count % 4000 == 0:
             log.info('System has been running for {0}'.format(
                 str(datetime.timedelta(seconds=int(time.time() - self.start_time)))))
             log.info('Total number of matches in the system: {}'.format(len(self.engine.match_dict)))
+            log.info('{} of {} odds updates were superseded in the same batch and dropped.'.format(
+                self.engine.coalesced_update_count, self.engine.update_count))
 
-    def update_table_view(self, arbi_summary):
-        history_arbi_summary = self.arbi_summary_logger.save(arbi_summary)
-        self.table_model.update(arbi_summary)
+    def update_table_view(self, summary_diff):
+        history_arbi_summary = self.arbi_summary_logger.save_diff(summary_diff)
+        self.table_model.apply_diff(summary_diff)
         if history_arbi_summary:
             self.table_model_for_history.append(history_arbi_summary)
             self.view_signal.historic_opps_count.emit(self.table_model_for_history.rowCount(None))
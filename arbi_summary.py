@@ -24,6 +24,9 @@ class ArbiSummaryTableModel(QAbstractTableModel):
         super(ArbiSummaryTableModel, self).__init__()
         self.table = table
         self.header = header
+        # rows of the opps by key and their keys in table order, see apply_diff()
+        self.rows_by_key = {}
+        self.row_keys = []
 
     def clear_data(self):
         self.update([])
@@ -69,10 +72,30 @@ class ArbiSummaryTableModel(QAbstractTableModel):
 
     def update(self, new_table):
         self.emit(SIGNAL("layoutAboutToBeChanged()"))
+        self.rows_by_key = {}
+        self.row_keys = []
         del self.table[:]
         self.table.extend(new_table)
         self.emit(SIGNAL("layoutChanged()"))
 
+    def apply_diff(self, summary_diff):
+        """Update the rows with summary_diff, an OppsDiff of (key, row) for the new and changed opps and the keys of
+        the withdrawn ones. The rows of new opps go on top.
+        """
+        self.emit(SIGNAL("layoutAboutToBeChanged()"))
+        for key in summary_diff.withdrawn:
+            self.rows_by_key.pop(key, None)
+        new_keys = []
+        for key, row in summary_diff.new + summary_diff.changed:
+            if key not in self.rows_by_key:
+                new_keys.append(key)
+            self.rows_by_key[key] = row
+        new_key_set = set(new_keys)
+        self.row_keys = new_keys + [key for key in self.row_keys if key in self.rows_by_key and key not in new_key_set]
+        del self.table[:]
+        self.table.extend(self.rows_by_key[key] for key in self.row_keys)
+        self.emit(SIGNAL("layoutChanged()"))
+
     def append(self, new_table):
         self.emit(SIGNAL("layoutAboutToBeChanged()"))
         self.table = new_table + self.table
@@ -125,7 +148,13 @@ class ArbiSummaryLogger(object):
         return disappeared_opps
 
     def save(self, arbi_summary):
-        disappeared_opps_pairs = self.process_arbi_summary(arbi_summary)
+        return self.save_disappeared_opps(self.process_arbi_summary(arbi_summary))
+
+    def save_diff(self, summary_diff):
+        """The same with the changes of the opps, see ArbiSummaryTableModel.apply_diff()"""
+        return self.save_disappeared_opps(self.process_summary_diff(summary_diff))
+
+    def save_disappeared_opps(self, disappeared_opps_pairs):
         disappeared_opps = self.filter_out_saved_opps(disappeared_opps_pairs)
         if not disappeared_opps:
             return
@@ -152,6 +181,25 @@ class ArbiSummaryLogger(object):
 
         return disappeared_opps_pairs
 
+    def process_summary_diff(self, summary_diff):
+        """Update cached arbi opp dict, by opp key here, with summary_diff and return the arb opps withdrawn, or changed
+        to other prices or stakes
+        """
+        disappeared_opps_pairs = []
+        for key in summary_diff.withdrawn:
+            full_opp = self.cached_arbi_opps_dict.pop(key, None)
+            if full_opp is not None:
+                disappeared_opps_pairs.append((self.get_comparable_part(full_opp), full_opp))
+        for key, full_opp in summary_diff.new + summary_diff.changed:
+            old_full_opp = self.cached_arbi_opps_dict.get(key)
+            if old_full_opp is not None:
+                opp = self.get_comparable_part(old_full_opp)
+                if opp != self.get_comparable_part(full_opp):
+                    disappeared_opps_pairs.append((opp, old_full_opp))
+            self.cached_arbi_opps_dict[key] = full_opp
+
+        return disappeared_opps_pairs
+
     def get_arbi_opps_dict(self, arbi_summary):
         return {self.get_comparable_part(arbi_opp): arbi_opp for arbi_opp in arbi_summary}
 
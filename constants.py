@@ -17,10 +17,19 @@ SLEEP_BEFORE_RECONNECT = 15
 MINI_PROFIT = 0.01
 THREAD_ALIVE_CHECK_INTERVAL = 10
 RB_PRICE_EXPIRY_TIME = 30  # seconds
-RB_PRICE_EXPIRY_CHECK_INTERVAL = 5  # seconds
+# prices are kept in a heap by last updated time, with an entry per update. It is rebuilt when it gets too long.
+RB_PRICE_EXPIRY_HEAP_MIN_SIZE = 256
+MATCH_CLEAR_INTERVAL = 5 * 60  # seconds
+FINISHED_MATCH_IDLE_TIME = 10 * 60  # seconds without match info update before a match at full time is removed
+MATCH_EXPIRY_AFTER_KICKOFF = 12 * 60 * 60  # seconds, after which a match is removed whatever its running time
 PROCESS_EXEC_MSG_MAX_TIME = 0.5  # seconds
 EMPTY_SRC_Q_SLEEP_TIME = 0.02
+LATENCY_LOG_INTERVAL = 60  # seconds between the logs of the latency percentiles
+STRAT_WORKER_TIMEOUT = 10  # seconds
 SPORTTERY_REBATE = 0.08
+CROSS_HANDICAP_PRICE_CACHE_SIZE = 10000
+CROSS_HANDICAP_PRICE_CACHE_LOG_INTERVAL = 10 * 60  # seconds between the logs of the cache hits and misses
+CROSS_HANDICAP_PRICE_TABLE_PATH = os.path.join(ROOT_PATH, 'strats', 'static_data', 'cross_handicap_prices.pkl')
 
 NO_REPEAT_OPPS_IN_HISTORIC_VIEW_TIME_FRAME = 60 * 60 * 6
 #####################################
@@ -71,6 +80,7 @@ BOOKIE_COMMISSION_MAP = {
     'pinnacle': 0.0025,
     'betfair': -0.02,
 }
+MAX_BOOKIE_COMMISSION = max(BOOKIE_COMMISSION_MAP.values() + [0])
 
 BOOKIE_NAME_CN_MAP = {
     'crown_c': u'皇冠_C',
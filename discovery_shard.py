@@ -0,0 +1,177 @@
+"""
+Sharded discovery: matches are split across processes by match id, each with its own DataEngine and ArbiSpotter.
+
+ShardRouter takes the place of the source queue, so the feed threads route records to the shards as they put them.
+Each shard puts the opps of its matches on the opps queue after a scan that changes them, as (shard_index, arbi_opps),
+and ArbiDiscoveryThread merges them before sending them to the execution system.
+
+The shards are daemonic processes, which can't have children, so they run the cross handicap strategy in the same
+process instead of a pool.
+"""
+import logging
+from Queue import Empty
+from multiprocessing import Process, Queue
+from arbi.utils import merge_dict
+from arbi.constants import EMPTY_SRC_Q_SLEEP_TIME
+from arbi.models.engine import DataEngine
+from arbi.models.arbi_spotter import ArbiSpotter
+from arbi.models.strat_worker import get_shard_index
+from arbi.models.latency import StampedRecordList, latency_stats, stamp_record_lists
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+log.addHandler(logging.StreamHandler())
+
+
+def run_discovery_shard(shard_index, menu_bar_model, record_queue, opps_queue):
+    """Loop of a shard process until it gets None from record_queue.
+
+    record_queue gets: a list of records, an init dict, or ('bookie availability', bookie_availability_dict)
+    """
+    # the shards already use all the cores, and a daemonic process can't start the pools anyway
+    menu_bar_model.account_model.use_parallel_computing = False
+    menu_bar_model.strats_panel_model.use_async_for_cross_handicap_arb = False
+    engine = DataEngine()
+    arbi_spotter = ArbiSpotter(engine.match_dict, menu_bar_model, menu_bar_model.account_model.profit_threshold)
+    arbi_spotter.initialize_strats()
+    has_init_match_dict = False
+
+    while True:
+        try:
+            items = [record_queue.get(timeout=EMPTY_SRC_Q_SLEEP_TIME)]
+            while not record_queue.empty():
+                items.append(record_queue.get())
+        except Empty:
+            items = []
+
+        engine.clear_unneeded_matches()
+        record_lists = []
+        is_stopped = False
+        for item in items:
+            if item is None:
+                is_stopped = True
+                break
+            elif isinstance(item, tuple):
+                merge_dict(arbi_spotter.bookie_availability_dict, item[1])
+                arbi_spotter.full_scan_required = True
+            elif isinstance(item, dict) and not has_init_match_dict:
+                engine.init_match_dict(item)
+                has_init_match_dict = True
+            else:
+                record_lists.append(item)
+        if record_lists:
+            stamp_record_lists(record_lists, 'dequeued')
+            engine.update_match_dict(engine.coalesce_record_lists(record_lists))
+            stamp_record_lists(record_lists, 'applied')
+        if is_stopped:
+            arbi_spotter.terminate_all_pools()
+            return
+
+        arbi_opps = arbi_spotter.spot_arbi(engine.pop_dirty_match_dict())
+        stamp_record_lists(record_lists, 'spotted')
+        latency_stats.add_record_lists(record_lists)
+        if any(arbi_spotter.arbi_opps_tracker.diff):
+            opps_queue.put((shard_index, arbi_opps))
+
+
+class DiscoveryShard(object):
+    def __init__(self, shard_index, menu_bar_model, opps_queue):
+        self.shard_index = shard_index
+        self.record_queue = Queue()
+        self.process = Process(target=run_discovery_shard,
+                               args=(shard_index, menu_bar_model, self.record_queue, opps_queue))
+        self.process.daemon = True
+
+    def start(self):
+        self.process.start()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.record_queue.put(None)
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class ShardRouter(object):
+    """Put records and init dicts to the shards of their matches. It can be used as source queue by the feeds.
+
+    :param shard_count: number of shard processes
+    :param menu_bar_model: a copy is used by each shard
+    """
+    def __init__(self, shard_count, menu_bar_model):
+        self.menu_bar_model = menu_bar_model
+        self.has_put_init_dict_in = False
+        self.pkg_count = 0
+        self.opps_queue = Queue()
+        self.shards = [DiscoveryShard(shard_index, menu_bar_model, self.opps_queue)
+                       for shard_index in xrange(shard_count)]
+
+    def start(self):
+        for shard in self.shards:
+            shard.start()
+
+    def stop(self):
+        for shard in self.shards:
+            shard.stop()
+
+    def restart_dead_shards(self):
+        """Start a new process for each shard whose process has died. Return the indexes of the restarted shards.
+        A restarted shard has no matches until the next init dict is put.
+        """
+        restarted_shard_indexes = []
+        for shard_index, shard in enumerate(self.shards):
+            if not shard.process.is_alive():
+                log.error('Discovery shard {} exited with code {}. Restart it.'.format(shard_index,
+                                                                                       shard.process.exitcode))
+                self.shards[shard_index] = DiscoveryShard(shard_index, self.menu_bar_model, self.opps_queue)
+                self.shards[shard_index].start()
+                restarted_shard_indexes.append(shard_index)
+        return restarted_shard_indexes
+
+    def put(self, record_list):
+        """Split record_list, or an init dict, by shard"""
+        if record_list is None:
+            return
+        self.pkg_count += 1
+
+        if isinstance(record_list, dict):
+            parts = [{} for shard in self.shards]
+            for match_id, match in record_list.iteritems():
+                parts[get_shard_index(match_id, len(self.shards))][match_id] = match
+        else:
+            stamps = getattr(record_list, 'stamps', {})
+            parts = [StampedRecordList(stamps=dict(stamps)) for shard in self.shards]
+            for record in record_list:
+                parts[get_shard_index(record.record_dict['match_id'], len(self.shards))].append(record)
+
+        for shard, part in zip(self.shards, parts):
+            if part or isinstance(part, dict):  # every shard needs the init dict, even if it is empty
+                if isinstance(part, StampedRecordList):
+                    part.stamp('enqueued')  # after the split, as the time is taken by putting to the shards
+                shard.record_queue.put(part)
+
+    def put_bookie_availability(self, bookie_availability_dict):
+        # copied, as the queue pickles it later in another thread
+        bookie_availability_dict = {bookie_id: dict(status) for bookie_id, status in bookie_availability_dict.iteritems()}
+        for shard in self.shards:
+            shard.record_queue.put(('bookie availability', bookie_availability_dict))
+
+    def qsize(self):
+        return sum(shard.record_queue.qsize() for shard in self.shards)
+
+    def get_opps(self, timeout):
+        """Return {shard_index: arbi_opps} from the scans done since the last call. Only the last scan of each
+        shard is kept. Wait up to timeout seconds if there is none.
+        """
+        shard_opps = {}
+        try:
+            shard_index, arbi_opps = self.opps_queue.get(timeout=timeout)
+            shard_opps[shard_index] = arbi_opps
+            while not self.opps_queue.empty():
+                shard_index, arbi_opps = self.opps_queue.get()
+                shard_opps[shard_index] = arbi_opps
+        except Empty:
+            pass
+        return shard_opps
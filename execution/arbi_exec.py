@@ -1,12 +1,18 @@
+import io
 import time
 import socket
 import logging
 import datetime
+from Queue import Queue, Empty, Full
 from threading import Thread, Event
-from arbi.utils import gzip_string, unzip_string, get_body_size, get_hk_time_now, create_packet_header, merge_dict
-from arbi.constants import VERSION, BOOKIE_IDS_WITH_LAY_PRICES
+from arbi.utils import (gzip_string, read_gzip_lines, get_body_size, get_hk_time_now, create_packet_header, merge_dict,
+                        SocketReader)
+from arbi.constants import VERSION
+from arbi.models.bookie import get_bookie_attributes_map
+from arbi.models.latency import latency_stats
 from arbi.feeds.betfair.constants import BETFAIR_USERNAME, BETFAIR_PASSWORD
-from arbi.execution.constants import (EXEC_HOST, EXEC_PORT, EXEC_READ_BLOCK_SIZE, BET_API_VERSION)
+from arbi.execution.constants import (EXEC_HOST, EXEC_PORT, EXEC_READ_BLOCK_SIZE, BET_API_VERSION,
+                                      EXEC_SEND_QUEUE_SIZE, EXEC_SEND_COALESCE_WINDOW)
 
 
 log = logging.getLogger(__name__)
@@ -55,6 +61,7 @@ class ArbiExecMsgerThreadObj(object):
         if not self.exec_messenger.login(BETFAIR_USERNAME, BETFAIR_PASSWORD, VERSION):
             log.info('Execution system messenger (thread id {}) is finished.'.format(self.thread.ident))
             return
+        self.exec_messenger.start_sender()
 
         while not self.stop_event.is_set():
             try:
@@ -67,6 +74,7 @@ class ArbiExecMsgerThreadObj(object):
                 self.exec_msg_queue.put(bookie_id_and_status)
             time.sleep(0.1)
 
+        self.exec_messenger.stop_sender()
         log.info('Execution system messenger (thread id {}) is finished.'.format(self.thread.ident))
 
 
@@ -97,6 +105,7 @@ class ArbiExecMessenger(object):
         self.release_non_exist_cooldown_type1_count = 0
         self.release_non_exist_cooldown_type2_count = 0
         self.release_cooldown_count = 0
+        self.sender = None
         self._connect()
 
         self.heartbeat_pkt = self.create_packet(gzip_string('NH^OK'))
@@ -123,34 +132,55 @@ class ArbiExecMessenger(object):
         self.wfile.write(text)
         self.wfile.flush()
 
+    def start_sender(self):
+        """Send packets on the sender thread from now on, instead of the thread calling send()"""
+        self.sender = ArbiExecSender(self)
+        self.sender.start()
+
+    def stop_sender(self):
+        if self.sender:
+            self.sender.stop()
+
     def send_heartbeat(self):
+        if self.sender:
+            self.sender.put_packet(self.heartbeat_pkt)
+            return
+
         try:
             self.write(self.heartbeat_pkt)
         except (socket.error, AttributeError):
             raise ExecMsgerConnectionError
 
     def send(self, arbi_opps):
-        """Send arbitrage opportunity to execution system."""
+        """Send arbitrage opportunity to execution system.
+        Return False if the sender has dropped them, in which case their bookies are taken out of cooldown.
+        """
         bet_order_list = self.get_bet_order_list(arbi_opps)
-        bet_order_str = '\n'.join(bet_order_list)
-        zipped_orders = gzip_string(bet_order_str)
-        packet = self.create_packet(zipped_orders)
+        if self.sender:
+            if self.sender.put_bet_orders(bet_order_list, arbi_opps[0].occur_at_utc):
+                return True
+            self.undo_cooldown(arbi_opps)
+            return False
+
+        packet = self.create_packet(gzip_string('\n'.join(bet_order_list)))
         try:
             self.write(packet)
-            self.log_delay(arbi_opps)
+            self.log_delay(len(bet_order_list), arbi_opps[0].occur_at_utc)
         except (socket.error, AttributeError):
             raise ExecMsgerConnectionError
+        return True
 
-    def log_delay(self, arbi_opps):
-        delay = datetime.datetime.utcnow() - arbi_opps[0].occur_at_utc
-        log.info('{} opportunities occurred at {} are {} ms delayed.'.format(
-            len(arbi_opps), arbi_opps[0].occur_at_utc, delay.microseconds / 1000))
+    def log_delay(self, opp_count, occur_at_utc):
+        delay = (datetime.datetime.utcnow() - occur_at_utc).total_seconds()
+        latency_stats.add('sent', delay)
+        latency_stats.log_if_due()
+        log.info('{} opportunities occurred at {} are {:.0f} ms delayed.'.format(opp_count, occur_at_utc, delay * 1000))
 
     def _connect(self):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.connect(self.host_port)
         self.wfile = self.socket.makefile('wb', 0)
-        self.rfile = self.socket.makefile('rb', -1)
+        self.rfile = io.BufferedReader(SocketReader(self.socket))
 
     def filter_by_bookie_cooldown(self, arbi_opps):
         """Bookie cooldown.  When a arbitrage opportunity is sent, the involved bookies go to cool down by
@@ -169,14 +199,8 @@ class ArbiExecMessenger(object):
             where B1, B2, B3 are like: B{bookmaker_id}|{BetType}|{Dish}, e.g. B2|4|-5, B52|5|5
             Note: B1, B2, B3 are not necessarily selections for the same opportunity
         """
-        time_type = self._get_time_type(arbi_opp)
-        match_id = arbi_opp.match_info['match_id']
-        htpt = arbi_opp.match_info['home_team_score']
-        atpt = arbi_opp.match_info['away_team_score']
-        bookie_info_and_price_pairs = [('B{}|{}|{}'.format(s.bookie_id, self._get_bet_type(s), '' if s.odds_type == '1x2' else int(s.subtype * 4)), s.odds)
-                                       for s in arbi_opp.selections]
-
-        bookie_price_dict = self.cooldown_opps.get((time_type, match_id, htpt, atpt))
+        cooldown_key, bookie_info_and_price_pairs = self.get_cooldown_key(arbi_opp)
+        bookie_price_dict = self.cooldown_opps.get(cooldown_key)
         if bookie_price_dict:
             if any([price == bookie_price_dict.get(bookie_info) for bookie_info, price in bookie_info_and_price_pairs]):
                 return True
@@ -184,9 +208,37 @@ class ArbiExecMessenger(object):
                 bookie_price_dict.update(dict(bookie_info_and_price_pairs))
                 return False
         else:
-            self.cooldown_opps[(time_type, match_id, htpt, atpt)] = dict(bookie_info_and_price_pairs)
+            self.cooldown_opps[cooldown_key] = dict(bookie_info_and_price_pairs)
             return False
 
+    def undo_cooldown(self, arbi_opps):
+        """Take out the prices of arbi_opps put in self.cooldown_opps by filter_by_bookie_cooldown(),
+        e.g. when they have not been sent after all
+        """
+        for arbi_opp in arbi_opps:
+            cooldown_key, bookie_info_and_price_pairs = self.get_cooldown_key(arbi_opp)
+            bookie_price_dict = self.cooldown_opps.get(cooldown_key)
+            if bookie_price_dict:
+                for bookie_info, price in bookie_info_and_price_pairs:
+                    if bookie_price_dict.get(bookie_info) == price:
+                        bookie_price_dict.pop(bookie_info)
+
+    def get_cooldown_key(self, arbi_opp):
+        """Return (timetype, match_id, htpt, atpt) of arbi_opp in self.cooldown_opps, and its (B1, price1) pairs"""
+        time_type = self._get_time_type(arbi_opp)
+        match_id = arbi_opp.match_info['match_id']
+        htpt = arbi_opp.match_info['home_team_score']
+        atpt = arbi_opp.match_info['away_team_score']
+        bookie_info_and_price_pairs = [('B{}|{}|{}'.format(s.bookie_id, self._get_bet_type(s), '' if s.odds_type == '1x2' else int(s.subtype * 4)), s.odds)
+                                       for s in arbi_opp.selections]
+        return (time_type, match_id, htpt, atpt), bookie_info_and_price_pairs
+
+    def is_released_from_cooldown(self, arbi_opp, released_cooldown):
+        """Is any bookie of arbi_opp in released_cooldown, i.e. {(timetype, match_id, htpt, atpt): set of B1}?"""
+        cooldown_key, bookie_info_and_price_pairs = self.get_cooldown_key(arbi_opp)
+        bookie_infos = released_cooldown.get(cooldown_key)
+        return bool(bookie_infos) and any(bookie_info in bookie_infos for bookie_info, price in bookie_info_and_price_pairs)
+
     def get_bet_order_list(self, arbi_opps):
         """Given a list of ArbiOpportunity objects, return a list of string where each string is an bet order.
 
@@ -255,6 +307,8 @@ class ArbiExecMessenger(object):
             NR^{timetype}^{match_id}^{htpt}^{atpt}^[B1]^[B2]
             where B{bookmaker_id}|{BetType}|{Dish}
         e.g. NR^2^1014182^-1^-1^B2|4|-5^B52|5|5
+        The released bookies are also returned, as {(timetype, match_id, htpt, atpt): set of B1}, so that the opps
+        still found with them are sent again.
 
         3. Switch vip server.  Format: ND^{ip}^{port} e.g. ND^110.173.53.154^8090
 
@@ -274,8 +328,12 @@ class ArbiExecMessenger(object):
             elif msg.startswith('NR^'):
                 _, time_type, match_id, htpt, atpt, bookie_info_str = msg.split('^', 5)
                 bookie_info_list = bookie_info_str.split('^')
+                # the same types as get_cooldown_key()
+                cooldown_key = (int(time_type), match_id, int(htpt), int(atpt))
+                exec_msg_dict.setdefault('released cooldown', {}).setdefault(cooldown_key, set()).update(
+                    bookie_info_list)
 
-                bookie_price_dict = self.cooldown_opps.get((time_type, match_id, htpt, atpt))
+                bookie_price_dict = self.cooldown_opps.get(cooldown_key)
                 if bookie_price_dict:
                     for bookie_info in bookie_info_list:
                         if bookie_info in bookie_price_dict:
@@ -320,7 +378,7 @@ class ArbiExecMessenger(object):
         else:  # bet_period == '2':
             bet_period_status = {'running ball': status}
 
-        if bookie_id in BOOKIE_IDS_WITH_LAY_PRICES:
+        if get_bookie_attributes_map()[bookie_id].has_lay_prices:
             merge_dict(bookie_id_and_status, {bookie_id + ' lay': bet_period_status})
         merge_dict(bookie_id_and_status, {bookie_id: bet_period_status})
 
@@ -337,24 +395,15 @@ class ArbiExecMessenger(object):
             size = 0
 
         if size > 0:
-            zdata = ''
             try:
-                while size > EXEC_READ_BLOCK_SIZE:
-                    zdata += self.rfile.read(EXEC_READ_BLOCK_SIZE)
-                    size -= EXEC_READ_BLOCK_SIZE
-                else:
-                    zdata += self.rfile.read(size)
+                data = read_gzip_lines(self.rfile, size, EXEC_READ_BLOCK_SIZE)
             except socket.error as e:
-                udata = None
+                data = None
                 log.error('Error in reading execution message body: {0}'.format(e))
-            else:
-                udata = unzip_string(zdata)
 
-            if udata is None:
+            if data is None:
                 log.error('Error when unzip exec system data.')
                 data = []
-            else:
-                data = udata.strip().split("\n")
         else:
             data = []
 
@@ -376,6 +425,134 @@ class ArbiExecMessenger(object):
             pass
 
 
+class ArbiExecSender(object):
+    """Compress and write packets to the execution system on a thread of its own, so that a slow execution system
+    does not hold up spotting. The bet orders queued within coalesce_window seconds after a batch are sent with it
+    in one packet.
+
+    The queue is bounded. A batch is dropped if the execution system can't keep up with it, and put returns False.
+    A connection error stops the thread, dropping the batches not written yet, and is raised by the next put.
+    """
+    def __init__(self, messenger, queue_size=EXEC_SEND_QUEUE_SIZE, coalesce_window=EXEC_SEND_COALESCE_WINDOW):
+        self.messenger = messenger
+        self.queue = Queue(queue_size)
+        self.coalesce_window = coalesce_window
+        self.thread = None
+        self.is_stopped = False
+        self.has_connection_error = False
+        # seconds spent by the bet orders in each stage, in total
+        self.stage_times = {'queued': 0.0, 'compressed': 0.0, 'written': 0.0}
+        self.batch_count = 0
+        self.packet_count = 0
+        self.dropped_batch_count = 0
+
+    def start(self):
+        self.thread = Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop after what has been queued, or after the next write if the queue is full"""
+        try:
+            self.queue.put_nowait(('stop', None, time.time()))
+        except Full:
+            self.is_stopped = True
+
+    def put_bet_orders(self, bet_order_list, occur_at_utc):
+        return self.put(('bet orders', (bet_order_list, occur_at_utc), time.time()))
+
+    def put_packet(self, packet):
+        return self.put(('packet', packet, time.time()))
+
+    def put(self, item):
+        if self.has_connection_error:
+            raise ExecMsgerConnectionError
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            self.dropped_batch_count += 1
+            log.error('Execution system can not keep up. Dropped queued {}.'.format(item[0]))
+            return False
+        return True
+
+    def get(self, deadline):
+        """Return the next item queued before deadline, or None"""
+        timeout = deadline - time.time()
+        try:
+            return self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+        except Empty:
+            return None
+
+    def run(self):
+        item = self.queue.get()
+        while item[0] != 'stop':
+            kind, content, put_time = item
+            if kind == 'packet':
+                is_written = self.write(content)
+                batches = []
+                item = None
+            else:
+                batches = [(content, put_time)]
+                deadline = put_time + self.coalesce_window
+                item = self.get(deadline)
+                while item is not None and item[0] == 'bet orders':
+                    batches.append((item[1], item[2]))
+                    item = self.get(deadline)
+                is_written = self.write_bet_orders(batches)
+
+            if not is_written:
+                self.drop_unwritten(len(batches), item)
+                return
+            if self.is_stopped:
+                return
+            if item is None:
+                item = self.queue.get()
+
+    def drop_unwritten(self, batch_count, item):
+        """Count and log the batches of bet orders lost with the connection, i.e. batch_count failed to be written,
+        and item, if any, and the rest of the queue not written yet
+        """
+        items = [] if item is None else [item]
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except Empty:
+                break
+        batch_count += sum(1 for kind, content, put_time in items if kind == 'bet orders')
+        self.dropped_batch_count += batch_count
+        log.error('Lost connection to execution system. Dropped {} batches of bet orders.'.format(batch_count))
+
+    def write_bet_orders(self, batches):
+        """Write one packet for the batches of bet orders, i.e. [((bet_order_list, occur_at_utc), put_time)]"""
+        t0 = time.time()
+        bet_order_list = [bet_order for (batch_bet_order_list, occur_at_utc), put_time in batches
+                          for bet_order in batch_bet_order_list]
+        packet = self.messenger.create_packet(gzip_string('\n'.join(bet_order_list)))
+        t1 = time.time()
+        if not self.write(packet):
+            return False
+        t2 = time.time()
+
+        self.stage_times['queued'] += sum(t0 - put_time for content, put_time in batches)
+        self.stage_times['compressed'] += t1 - t0
+        self.stage_times['written'] += t2 - t1
+        self.batch_count += len(batches)
+        self.messenger.log_delay(len(bet_order_list), min(occur_at_utc for (orders, occur_at_utc), put_time in batches))
+        log.debug('{} batches of bet orders queued for {:.1f} ms, compressed in {:.1f} ms, written in {:.1f} ms'.format(
+            len(batches), (t0 - batches[0][1]) * 1000, (t1 - t0) * 1000, (t2 - t1) * 1000))
+        return True
+
+    def write(self, packet):
+        try:
+            self.messenger.write(packet)
+        except (socket.error, AttributeError) as e:
+            log.error('Error in sending to execution system: {}'.format(e))
+            self.has_connection_error = True
+            return False
+        self.packet_count += 1
+        return True
+
+
 class MockMessenger(ArbiExecMessenger):
     def __init__(self, *args, **kwargs):
         # self.unavailable_opps = {}
@@ -11,4 +11,6 @@ EXEC_READ_BLOCK_SIZE = 4096
 
 DELAY_WARNING_IN_MS = 100
 EXEC_RECONNECT_DELAY = 5
-BET_API_VERSION = 1.0
\ No newline at end of file
+BET_API_VERSION = 1.0
+EXEC_SEND_QUEUE_SIZE = 100  # bet order batches waiting to be sent, more are dropped
+EXEC_SEND_COALESCE_WINDOW = 0  # seconds, bet orders queued within it after a batch are sent with it in one packet
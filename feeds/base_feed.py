@@ -1,4 +1,5 @@
 import os
+import io
 import socket
 import time
 import logging
@@ -7,7 +8,7 @@ from threading import Thread, Event
 
 from arbi.constants import ROOT_PATH
 from arbi.feeds.vip.constants import TIME_THRESHOLD_TO_GET_ONE_PACKET, READ_BLOCK_SIZE
-from arbi.utils import unzip_string, get_body_size
+from arbi.utils import read_gzip_lines, get_body_size, SocketReader
 
 
 log = logging.getLogger(__name__)
@@ -139,7 +140,7 @@ class BaseFeed(object):
     def __init__(self, host, port):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.connect((host, port))
-        self.rfile = self.socket.makefile('rb', -1)
+        self.rfile = io.BufferedReader(SocketReader(self.socket))
         self.wfile = self.socket.makefile('wb', 0)
 
     def login(self, username, password):
@@ -192,24 +193,15 @@ class BaseFeed(object):
             raise FeedConnectionError
 
         if size > 0:
-            zdata = ''
             try:
-                while size > READ_BLOCK_SIZE:  # could hit OverflowError if read all data in one go by f.read(size)
-                    zdata += self.rfile.read(READ_BLOCK_SIZE)
-                    size -= READ_BLOCK_SIZE
-                else:
-                    zdata += self.rfile.read(size)
+                data = read_gzip_lines(self.rfile, size, READ_BLOCK_SIZE)
             except (socket.error, socket.timeout) as e:
-                udata = None
+                data = None
                 log.error('Error when read {} data feed body: {}'.format(self.FEED_NAME, e))
-            else:
-                udata = unzip_string(zdata)
 
-            if udata is None:
+            if data is None:
                 log.error('Error when unzip {} data.'.format(self.FEED_NAME))
                 raise FeedConnectionError
-            else:
-                data = udata.strip().split("\n")
         else:
             data = []
 
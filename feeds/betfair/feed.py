@@ -3,6 +3,7 @@ import logging
 from arbi.feeds.base_feed import BaseFeed, BaseFeedThreadObj, FeedConnectionError
 from arbi.feeds.betfair.constants import BET_API_VERSION
 from arbi.models.record import YYUpdateOddsRecord, IncorrectLengthRecord
+from arbi.models.latency import StampedRecordList
 from arbi.utils import gzip_string, create_packet_header
 
 
@@ -44,16 +45,24 @@ class BetfairFeedThreadObj(BaseFeedThreadObj):
                 break
             except FeedConnectionError:
                 break
+            read_at = time.time()
 
             if self.save_history_flag:
                 self.save_history(packet)
 
             record_list = self.get_record_list_from_packet(packet)
             if record_list:
+                record_list = StampedRecordList(record_list, {'read': read_at, 'parsed': time.time()})
+                record_list.stamp('enqueued')
                 self.queue.put(record_list)
 
     def get_records(self, packet):
          for record_str in packet:
+            record = YYUpdateOddsRecord.parse(record_str)
+            if record is not None:
+                yield record
+                continue
+
             try:
                 record = YYUpdateOddsRecord(record_str)
             except IncorrectLengthRecord as e:
@@ -14,5 +14,6 @@ BACKUP_ACCOUNT = 'ss0016', 'aaa111'
 
 TIME_THRESHOLD_TO_GET_ONE_PACKET = 2
 READ_BLOCK_SIZE = 4096
+INIT_ODDS_CHUNK_SIZE = 5000
 SOCKET_TIMEOUT_IN_SECONDS = 30
 RECONNECT_DELAY = 15
@@ -1,10 +1,13 @@
 # -*- coding: GBK -*-
 
+import time
 import logging
 import datetime
+from arbi.constants import MATCH_CLEAR_INTERVAL, MATCH_EXPIRY_AFTER_KICKOFF
 from arbi.models.record import InitOddsRecord, VIPUpdateOddsRecord, MatchInfoRecord, IncorrectLengthRecord
-from arbi.feeds.vip.constants import SOCKET_TIMEOUT_IN_SECONDS
-from arbi.models.match import Match
+from arbi.feeds.vip.constants import SOCKET_TIMEOUT_IN_SECONDS, INIT_ODDS_CHUNK_SIZE
+from arbi.models.match import Match, KickoffIndex, get_hk_time_str
+from arbi.models.latency import StampedRecordList
 from arbi.feeds.base_feed import BaseFeedThreadObj, BaseFeed, FeedConnectionError
 
 
@@ -41,22 +44,47 @@ class VIPFeedThreadObj(BaseFeedThreadObj):
             'o': VIPUpdateOddsRecord,
         }
         self.vip_data_update_id_dict = {}
+        # kickoff times of the matches in vip_data_update_id_dict, so that they can be dropped once they are long over
+        self.kickoff_index = KickoffIndex()
+        self.update_ids_last_cleared = time.time()
         self.sports_supported = sports_supported
 
     def initialize_data_feed(self):
+        """Put the initial packet to the queue. Return False if it can't be read."""
         log.info('Start initializing VIP feed data...')
         try:
             packet = self.data_feed.get_one_packet()
         except FeedConnectionError:
             log.info('Error in initializing VIP feed data.')
-            return
+            return False
 
         if self.save_history_flag:
             self.save_history(packet)
 
-        init_dict = self.initialize_match_dict(packet)
+        for init_dict_or_record_list in self.iter_initial_packet(packet):
+            self.queue.put(init_dict_or_record_list)
         log.info('Initializing VIP feed data finished.')
-        return init_dict
+        return True
+
+    def iter_initial_packet(self, packet):
+        """Yield an init dict of the matches in the initial packet, without odds, and then their init odds records
+        in lists of INIT_ODDS_CHUNK_SIZE. The discovery loop can start with the matches and spot each market as soon
+        as its odds are in, rather than wait for the whole packet to be processed.
+        The matches are not touched here once they are yielded.
+        """
+        init_dict = self.process_match_records(self.iter_init_records(
+            record_str for record_str in packet if record_str[:1] == 'M'))
+        yield init_dict
+
+        init_odds_records = []
+        for record in self.iter_init_records(record_str for record_str in packet if record_str[:1] != 'M'):
+            if record.record_dict['match_id'] in init_dict:
+                init_odds_records.append(record)
+                if len(init_odds_records) == INIT_ODDS_CHUNK_SIZE:
+                    yield init_odds_records
+                    init_odds_records = []
+        if init_odds_records:
+            yield init_odds_records
 
     def initialize_match_dict(self, packet):
         """A match can only be initialized by MatchInfoRecord.
@@ -98,6 +126,7 @@ class VIPFeedThreadObj(BaseFeedThreadObj):
             except FeedConnectionError:
                 log.error('Feed connection error in VIP feed.')
                 break
+            read_at = time.time()
 
             if len(packet) == 1 and packet[0] == 'LOGOUT\x00':
                 log.critical('You have been logged out')
@@ -109,6 +138,8 @@ class VIPFeedThreadObj(BaseFeedThreadObj):
             record_list = self.get_update_record_list(packet)
 
             if record_list:
+                record_list = StampedRecordList(record_list, {'read': read_at, 'parsed': time.time()})
+                record_list.stamp('enqueued')
                 self.queue.put(record_list)
 
     def run_pre_loop(self):
@@ -116,11 +147,9 @@ class VIPFeedThreadObj(BaseFeedThreadObj):
         if signal is self.TT_SIGNAL:
             return self.TT_SIGNAL
 
-        init_dict = self.initialize_data_feed()
-        if init_dict is None:
+        if not self.initialize_data_feed():
             return self.TT_SIGNAL
         else:
-            self.queue.put(init_dict)
             self.queue.has_put_init_dict_in = True
 
     def _get_records(self, packet):
@@ -131,6 +160,14 @@ class VIPFeedThreadObj(BaseFeedThreadObj):
                 # We don't care about them.
                 continue
 
+            if record_type == 'o':
+                # most records are odds updates, try the fast path first
+                record = VIPUpdateOddsRecord.parse(record_str)
+                if record is not None:
+                    if self.update_vip_update_id(record):
+                        yield record
+                    continue
+
             record_class = self.record_type_map[record_type]
             try:
                 record = record_class(record_str)
@@ -172,12 +209,25 @@ class VIPFeedThreadObj(BaseFeedThreadObj):
         else:
             if match_id not in self.vip_data_update_id_dict:
                 self.vip_data_update_id_dict[match_id] = 0
+            if isinstance(record, MatchInfoRecord):
+                self.kickoff_index.set_kickoff(match_id, record.record_dict['match_hk_time'])
 
         return True
 
+    def clear_finished_match_update_ids(self):
+        """Drop the update ids of the matches that kicked off MATCH_EXPIRY_AFTER_KICKOFF ago, checked every
+        MATCH_CLEAR_INTERVAL. Otherwise vip_data_update_id_dict keeps every match seen since the feed started.
+        """
+        t = time.time()
+        if t - self.update_ids_last_cleared > MATCH_CLEAR_INTERVAL:
+            for match_id in self.kickoff_index.pop_kicked_off_before(get_hk_time_str(MATCH_EXPIRY_AFTER_KICKOFF)):
+                self.vip_data_update_id_dict.pop(match_id, None)
+            self.update_ids_last_cleared = t
+
     def get_update_record_list(self, packet):
         """Return a list of record objects"""
         assert isinstance(packet, list), 'Expected type: list, got type: {}'.format(type(packet))
+        self.clear_finished_match_update_ids()
         update_record_list = []
         for record in self._get_records(packet):
             if isinstance(record, MatchInfoRecord):
@@ -201,20 +251,28 @@ class VIPFeedThreadObj(BaseFeedThreadObj):
         match_records = []
         init_odds_records = []
 
+        for record in self.iter_init_records(packet):
+            if isinstance(record, MatchInfoRecord):
+                match_records.append(record)
+            else:
+                init_odds_records.append(record)
+
+        return match_records, init_odds_records
+
+    def iter_init_records(self, packet):
+        """Yield the match records of supported matches and the init odds records of an initial packet"""
         for record in self._get_records(packet):
             if isinstance(record, MatchInfoRecord):
                 if self.is_sport_type_supported(record) and self.is_match_in_7_days(record):
                     record.post_validation_work()
-                    match_records.append(record)
+                    yield record
             elif isinstance(record, InitOddsRecord):
                 record.post_validation_work()
-                init_odds_records.append(record)
+                yield record
             else:
                 log.error('Should not have VIPUpdateOddsRecord in initial packet: {}'.format(
                     record.record_str))
 
-        return match_records, init_odds_records
-
     def is_sport_type_supported(self, match_record):
         sport_type = match_record.get_sport_type()
         if sport_type in self.sports_supported:
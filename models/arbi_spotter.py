@@ -1,10 +1,19 @@
 import time
+import logging
 import datetime
-from multiprocessing import Pool
+from heapq import heappop, heappush
+from Queue import Empty
+from multiprocessing import Pool, Queue
 from arbi import constants
 from arbi.constants import BOOKIE_ID_MAP
 from arbi.ui_models.menu_bar_model import StratsPanelModel
-from arbi.models.opportunity import ArbiOpportunity
+from arbi.models.opportunity import ArbiOppsTracker
+from arbi.models.strat_worker import StratWorker, get_shard_index, run_one_strat
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+log.addHandler(logging.StreamHandler())
 
 
 class ArbiSpotter(object):
@@ -24,14 +33,30 @@ class ArbiSpotter(object):
 
         self.use_parallel_computing = False
         self.use_async_for_cross_handicap_arb = True
-        self.strats_pool = {}
+        self.strat_worker_count = 1
+        self.strat_workers = []  # started on the first parallel scan
+        self.strat_result_queue = None
         self.cross_handicap_strat_pool = None
         self.selected_strats = []
         self.selected_strats_str = []
         self.selected_strats_name_map = {}
         self.cross_handicap_strat_result = None
-
-        self.last_rb_prices_expiry_checked = time.time()
+        self.cross_handicap_pending_matches = {}
+
+        # raw opps of the last scan for matches that have any, in the same format as the input of
+        # convert_to_arb_opp_objects. They are reused until the match is updated.
+        self.cached_raw_opps_by_id = {}
+        # e.g. when bookie availability changes, the cached opps are not reliable anymore
+        self.full_scan_required = True
+        # the opps of the last scan, and how they differ from the scan before
+        self.arbi_opps_tracker = ArbiOppsTracker()
+
+        # (expiry, match_id) for when the oldest price of each running ball match expires, so that only the matches
+        # due are looked at. A match's entry is in rb_prices_expiry_by_id, the others are skipped when popped.
+        self.rb_prices_expiry_heap = []
+        self.rb_prices_expiry_by_id = {}
+        # when the oldest running ball price expires, or later if there is none
+        self.next_rb_prices_expiry = time.time() + constants.RB_PRICE_EXPIRY_TIME
 
     def initialize_strats(self, strats_model_class=StratsPanelModel):
         if self.menu_bar_model is None:
@@ -40,6 +65,7 @@ class ArbiSpotter(object):
         else:
             strats_model = self.menu_bar_model.strats_panel_model
             self.use_parallel_computing = self.menu_bar_model.account_model.use_parallel_computing
+            self.strat_worker_count = self.menu_bar_model.account_model.strat_worker_count
 
         self.use_async_for_cross_handicap_arb = strats_model.use_async_for_cross_handicap_arb
 
@@ -47,30 +73,70 @@ class ArbiSpotter(object):
         self.selected_strats = [klass(self.profit_threshold) for klass in selected_strat_classes]
         self.selected_strats_str = {klass.__name__ for klass in selected_strat_classes}
 
-        self.strats_pool = {}
-        for name in self.selected_strats_str:
-            if name == 'CrossHandicapArbiStrategy':
-                self.cross_handicap_strat_pool = Pool(1)
-            else:
-                self.strats_pool[name] = Pool(1)
+        if 'CrossHandicapArbiStrategy' in self.selected_strats_str and self.use_async_for_cross_handicap_arb:
+            self.cross_handicap_strat_pool = Pool(1)
 
         self.selected_strats_name_map = {klass.__name__: klass(self.profit_threshold)
                                          for klass in selected_strat_classes}
+        self.stop_strat_workers()  # restarted with the new strats
 
-    def spot_arbi(self):
-        matches = self.match_dict.values()
-        for match in matches:
-            if match.odds and match.info:
-                if match.is_in_running and self.it_is_time_to_check_rb_prices_expiry():
-                    self.check_running_ball_prices_expiry(match.odds.odds_dict)
+        self.cross_handicap_strat_result = None
+        self.cross_handicap_pending_matches = {}
+        self.full_scan_required = True
+        self.arbi_opps_tracker.clear()
+
+    def spot_arbi(self, dirty_match_ids=None):
+        """Run strategies only on the matches that have been updated and reuse cached opps for the others.
+
+        :param dirty_match_ids: ids of the matches updated since last call, e.g. DataEngine.pop_dirty_match_dict().
+            If None, all matches are scanned.
+        """
+        if dirty_match_ids is None or self.full_scan_required:
+            self.schedule_rb_prices_expiry(self.match_dict.itervalues())
+        else:
+            self.schedule_rb_prices_expiry(self.match_dict[match_id] for match_id in dirty_match_ids
+                                           if match_id in self.match_dict)
+        expired_match_ids = self.remove_expired_rb_prices()
+
+        updated_match_ids = None if dirty_match_ids is None else expired_match_ids.union(dirty_match_ids)
+        if dirty_match_ids is None or self.full_scan_required:
+            matches = self.match_dict.values()
+            self.cached_raw_opps_by_id = {}
+            self.full_scan_required = False
+        else:
+            matches = [self.match_dict[match_id] for match_id in updated_match_ids if match_id in self.match_dict]
 
         occur_at_utc = datetime.datetime.utcnow()
-        raw_opps_by_id = self.apply_strats_in_parallel(matches) if self.use_parallel_computing else self.apply_strats(matches)
+        if self.use_parallel_computing:
+            raw_opps_by_id = self.apply_strats_in_parallel(matches, updated_match_ids)
+        else:
+            raw_opps_by_id = self.apply_strats(matches)
+        self.update_cached_raw_opps(matches, raw_opps_by_id)
 
-        arbi_opps = self.convert_to_arb_opp_objects(raw_opps_by_id, occur_at_utc)
+        arbi_opps = self.convert_to_arb_opp_objects(self.cached_raw_opps_by_id, occur_at_utc)
 
         return arbi_opps
 
+    def update_cached_raw_opps(self, matches, raw_opps_by_id):
+        """Replace cached raw opps of the scanned matches with the new ones.
+        Only matches with at least one opp are kept in cache.
+        """
+        for match in matches:
+            if match.id not in raw_opps_by_id:
+                self.cached_raw_opps_by_id.pop(match.id, None)
+
+        for match_id, new_strat_opps_dict in raw_opps_by_id.iteritems():
+            strat_opps_dict = self.cached_raw_opps_by_id.get(match_id, {})
+            strat_opps_dict.update(new_strat_opps_dict)
+            if any(strat_opps_dict.itervalues()):
+                self.cached_raw_opps_by_id[match_id] = strat_opps_dict
+            else:
+                self.cached_raw_opps_by_id.pop(match_id, None)
+
+        # matches could have been removed from data engine
+        for match_id in [match_id for match_id in self.cached_raw_opps_by_id if match_id not in self.match_dict]:
+            self.cached_raw_opps_by_id.pop(match_id)
+
     def convert_to_arb_opp_objects(self, raw_opps_by_id, occur_at_utc):
         """
         :param raw_opps_by_id: a dict with match_id being key and strat_opps_dict being value,
@@ -88,42 +154,63 @@ class ArbiSpotter(object):
                             '3': []
                         }
                 }
-        """
-        arbi_opps = []
-        for match_id, strat_opps_dict in raw_opps_by_id.iteritems():
-            for strat_id, raw_opps in strat_opps_dict.iteritems():
-                match = self.match_dict[match_id]
-                info = {key: match.info[key] for key in ArbiOpportunity.match_info_keys}
-                arbi_opps += [ArbiOpportunity(info, occur_at_utc, strat_id, raw_opp) for raw_opp in raw_opps]
-
-        return sorted(arbi_opps, key=lambda x: x.profit, reverse=True)
 
-    def it_is_time_to_check_rb_prices_expiry(self):
-        t = time.time()
-        if t - self.last_rb_prices_expiry_checked > constants.RB_PRICE_EXPIRY_CHECK_INTERVAL:
-            self.last_rb_prices_expiry_checked = t
-            return True
+        Opps unchanged since the last scan are the same objects as before, see ArbiOppsTracker.
+        """
+        return self.arbi_opps_tracker.update_with_raw_opps(raw_opps_by_id, self.match_dict, occur_at_utc)
 
-    def check_running_ball_prices_expiry(self, odds_dict):
-        """If some bookie's prices are expired, remove them
+    def schedule_rb_prices_expiry(self, matches):
+        """Push the expiry of the oldest price of the running ball matches among matches, e.g. the updated ones,
+        if it is earlier than the one they have. New prices expire later, so most updates push nothing.
+        """
+        for match in matches:
+            if match.odds and match.info and match.is_in_running:
+                oldest_update_time = match.odds.get_oldest_update_time()
+                if oldest_update_time is not None:
+                    expiry = oldest_update_time + constants.RB_PRICE_EXPIRY_TIME
+                    if match.id not in self.rb_prices_expiry_by_id or expiry < self.rb_prices_expiry_by_id[match.id]:
+                        self.rb_prices_expiry_by_id[match.id] = expiry
+                        heappush(self.rb_prices_expiry_heap, (expiry, match.id))
+
+    def remove_expired_rb_prices(self):
+        """Remove the prices of running ball matches not updated for RB_PRICE_EXPIRY_TIME.
+        Only the matches due in rb_prices_expiry_heap are looked at.
+        Return the ids of the matches that have had prices removed.
         """
         t = time.time()
-        for event_and_odds_type, odds_by_category in odds_dict.iteritems():
-            for handicap, bookie_odds_id_and_info in odds_by_category.iteritems():
-                for bookie_id, bookie_odds_info in bookie_odds_id_and_info.items():
-                    # bookie_odds_info[2] is last_updated
-                    if t - bookie_odds_info[2] > constants.RB_PRICE_EXPIRY_TIME:
-                        bookie_odds_id_and_info.pop(bookie_id)
+        expired_match_ids = set()
+        due_matches = []
+        while self.rb_prices_expiry_heap and self.rb_prices_expiry_heap[0][0] < t:
+            expiry, match_id = heappop(self.rb_prices_expiry_heap)
+            if self.rb_prices_expiry_by_id.get(match_id) != expiry:
+                continue  # pushed again with an earlier expiry
+            del self.rb_prices_expiry_by_id[match_id]
+            match = self.match_dict.get(match_id)
+            if match and match.odds and match.info and match.is_in_running:
+                if match.odds.remove_expired_prices(t - constants.RB_PRICE_EXPIRY_TIME):
+                    expired_match_ids.add(match_id)
+                due_matches.append(match)
+        self.schedule_rb_prices_expiry(due_matches)  # when their oldest price left expires
+
+        if self.rb_prices_expiry_heap:
+            self.next_rb_prices_expiry = self.rb_prices_expiry_heap[0][0]
+        else:
+            self.next_rb_prices_expiry = t + constants.RB_PRICE_EXPIRY_TIME
+        return expired_match_ids
 
     def run_cross_handicap_strat(self, matches, raw_opps_dict):
         if self.use_async_for_cross_handicap_arb:
+            # matches updated while the pool is busy are scanned in the next run
+            self.cross_handicap_pending_matches.update((match.id, match) for match in matches)
             if self.cross_handicap_strat_result is None:
                 strat = self.selected_strats_name_map['CrossHandicapArbiStrategy']
                 self.cross_handicap_strat_result = self.cross_handicap_strat_pool.apply_async(
-                    run_one_strat, (matches, strat, self.bookie_availability_dict))
+                    run_one_strat, (self.cross_handicap_pending_matches.values(), strat, self.bookie_availability_dict))
+                self.cross_handicap_pending_matches = {}
             elif self.cross_handicap_strat_result.ready():  # do not wait for the result
                 cross_handicap_opps = self.cross_handicap_strat_result.get()
-                raw_opps_dict = self.update_raw_opps_dict(raw_opps_dict, cross_handicap_opps)
+                # the result is for the matches scanned in an earlier run, which may differ from the current ones
+                raw_opps_dict = self.update_raw_opps_dict(raw_opps_dict, cross_handicap_opps, do_assert=False)
                 self.cross_handicap_strat_result = None
         else:
             strat = self.selected_strats_name_map['CrossHandicapArbiStrategy']
@@ -144,18 +231,73 @@ class ArbiSpotter(object):
 
         return raw_opps_dict
 
-    def apply_strats_in_parallel(self, matches):
-        strats_results = {}
-        for name, pool in self.strats_pool.items():
-            strat = self.selected_strats_name_map[name]
-            strats_results[name] = pool.apply_async(run_one_strat, (matches, strat, self.bookie_availability_dict))
+    def start_strat_workers(self):
+        strats_name_map = {name: strat for name, strat in self.selected_strats_name_map.iteritems()
+                           if name != 'CrossHandicapArbiStrategy'}
+        self.strat_result_queue = Queue()
+        self.strat_workers = [StratWorker(worker_id, self.strat_worker_count, strats_name_map, self.strat_result_queue)
+                              for worker_id in xrange(self.strat_worker_count)]
+        for worker in self.strat_workers:
+            worker.start()
+
+    def stop_strat_workers(self):
+        for worker in self.strat_workers:
+            worker.stop()
+        self.strat_workers = []
+        self.strat_result_queue = None
+
+    def apply_strats_in_parallel(self, matches, updated_match_ids=None):
+        """Matches are sharded across the strat workers by match id. Only the matches updated since the last scan
+        are sent to the workers, and the results are merged as they come.
+
+        :param updated_match_ids: ids of the matches updated since the last scan. If None, all matches are sent.
+        """
+        if not self.strat_workers:
+            self.start_strat_workers()
+
+        shard_matches = [[] for worker in self.strat_workers]
+        for match in matches:
+            shard_matches[get_shard_index(match.id, len(self.strat_workers))].append(match)
+
+        generations = {}
+        pending = set()
+        for worker in self.strat_workers:
+            generations[worker.worker_id] = worker.submit(
+                self.match_dict, updated_match_ids, [match.id for match in shard_matches[worker.worker_id]],
+                self.bookie_availability_dict)
+            pending.update((worker.worker_id, name) for name in worker.strat_names)
 
         raw_opps_dict = {}
-        while strats_results:  # wait until all strats finish
-            for name, result in strats_results.items():
-                if result.ready():
-                    raw_opps_dict = self.update_raw_opps_dict(raw_opps_dict, result.get())
-                    strats_results.pop(name)
+        while pending:  # wait until all strats finish on all shards
+            try:
+                worker_id, generation, name, new_raw_opps_dict = self.strat_result_queue.get(
+                    timeout=constants.STRAT_WORKER_TIMEOUT)
+            except Empty:
+                log.error('Strat workers did not respond in {} seconds. Restart them.'.format(
+                    constants.STRAT_WORKER_TIMEOUT))
+                for worker_id, name in pending:
+                    new_raw_opps_dict = run_one_strat(shard_matches[worker_id], self.selected_strats_name_map[name],
+                                                      self.bookie_availability_dict)
+                    raw_opps_dict = self.update_raw_opps_dict(raw_opps_dict, new_raw_opps_dict, do_assert=False)
+                self.stop_strat_workers()
+                break
+
+            if generation != generations[worker_id]:
+                continue  # left over from an earlier scan
+
+            if name is None:
+                # the replica of the worker is out of sync. Run its shard here this time and rebuild it next time.
+                worker = self.strat_workers[worker_id]
+                worker.match_snapshot.full_snapshot_required = True
+                for name in worker.strat_names:
+                    new_raw_opps_dict = run_one_strat(shard_matches[worker_id], self.selected_strats_name_map[name],
+                                                      self.bookie_availability_dict)
+                    raw_opps_dict = self.update_raw_opps_dict(raw_opps_dict, new_raw_opps_dict, do_assert=False)
+                    pending.discard((worker_id, name))
+            else:
+                # shards have different match ids
+                raw_opps_dict = self.update_raw_opps_dict(raw_opps_dict, new_raw_opps_dict, do_assert=False)
+                pending.discard((worker_id, name))
 
         if 'CrossHandicapArbiStrategy' in self.selected_strats_str:
             raw_opps_dict = self.run_cross_handicap_strat(matches, raw_opps_dict)
@@ -196,17 +338,12 @@ class ArbiSpotter(object):
 
         for match_id, strat_opps_dict in new_opps_dict.iteritems():
             assert len(strat_opps_dict) == 1
-            raw_opps_dict[match_id].update(new_opps_dict[match_id])
+            raw_opps_dict.setdefault(match_id, {}).update(strat_opps_dict)
 
         return raw_opps_dict
 
     def terminate_all_pools(self):
-        for pool in self.strats_pool.values():
-            pool.terminate()
+        self.stop_strat_workers()
         if self.cross_handicap_strat_pool:
             self.cross_handicap_strat_pool.terminate()
 
-
-def run_one_strat(matches, strat, bookie_availability_dict):
-    return {match.id: {strat.id: strat.spot_arbi(match, bookie_availability_dict)}
-            for match in matches if match.odds and match.info}
@@ -0,0 +1,52 @@
+"""
+Attributes of the bookie ids in odds_dict, e.g. '2', '7' and '7 lay', worked out once per bookie id
+instead of from the bookie constants in every strategy loop.
+"""
+from arbi import constants
+
+
+class BookieAttributes(object):
+    """
+    :param bookie_id: bookie id of the feeds, with ' lay' appended for lay prices
+    """
+    __slots__ = ('bookie_id', 'base_bookie_id', 'is_lay', 'commission', 'is_traditional_ah', 'has_lay_prices')
+
+    def __init__(self, bookie_id):
+        self.bookie_id = bookie_id
+        self.base_bookie_id = bookie_id.split()[0]  # '7 lay' -> '7'
+        self.is_lay = bookie_id.endswith(' lay')
+        self.commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP.get(bookie_id), 0)
+        self.is_traditional_ah = bookie_id not in constants.NON_TRADITIONAL_AH_BOOKIE_IDS
+        self.has_lay_prices = self.base_bookie_id in constants.BOOKIE_IDS_WITH_LAY_PRICES  # both '7' and '7 lay'
+
+
+def get_bookie_constants():
+    return (constants.BOOKIE_ID_MAP, constants.BOOKIE_COMMISSION_MAP, constants.NON_TRADITIONAL_AH_BOOKIE_IDS,
+            constants.BOOKIE_IDS_WITH_LAY_PRICES)
+
+
+class BookieAttributesMap(dict):
+    """{bookie_id: BookieAttributes}, filled as bookie ids are looked up"""
+    def __init__(self):
+        super(BookieAttributesMap, self).__init__()
+        self.bookie_constants = get_bookie_constants()
+
+    def __missing__(self, bookie_id):
+        bookie_attributes = self[bookie_id] = BookieAttributes(bookie_id)
+        return bookie_attributes
+
+    def is_outdated(self):
+        return any(used is not current for used, current in zip(self.bookie_constants, get_bookie_constants()))
+
+
+bookie_attributes_map = BookieAttributesMap()
+
+
+def get_bookie_attributes_map():
+    """Return the BookieAttributesMap of the current bookie constants. It is meant to be called once per strategy call
+    and looked up in the loops. The map starts again if the constants have been replaced, e.g. patched in tests.
+    """
+    global bookie_attributes_map
+    if bookie_attributes_map.is_outdated():
+        bookie_attributes_map = BookieAttributesMap()
+    return bookie_attributes_map
@@ -40,6 +40,17 @@ def calculate_stakes(odds1, odds2, commission1=0, commission2=0, profit_threshol
         return round(stake1, 1), round(stake2, 1), profit
 
 
+def may_be_arbitrage(max_odds1, max_odds2, max_commission=0, profit_threshold=MINI_PROFIT):
+    """Return False if calculate_stakes() can't find arbitrage for any odds1 <= max_odds1 and odds2 <= max_odds2,
+    with commissions up to max_commission. The profit only goes up with the odds and the commissions,
+    so the strategies can skip a market if even its highest prices are not arbitrage.
+    """
+    if max_odds1 <= 0 or max_odds2 <= 0:
+        return False
+    # a slightly lower threshold, so that float rounding never makes this stricter than calculate_stakes()
+    return calculate_stakes(max_odds1, max_odds2, max_commission, max_commission, profit_threshold - 1e-9) is not None
+
+
 def calculate_stakes_new(k1, k2, k3, c1=0, c2=0, c3=0, profit_threshold=MINI_PROFIT):
     """Given price1, price2, price3 and their related commissions, can we create arbitrage opportunities?
     """
@@ -56,6 +67,14 @@ def calculate_stakes_new(k1, k2, k3, c1=0, c2=0, c3=0, profit_threshold=MINI_PRO
         return stake1, stake2, stake3, profit
 
 
+def may_be_3_way_arbitrage(max_k1, max_k2, max_k3, max_commission=0, profit_threshold=MINI_PROFIT):
+    """Like may_be_arbitrage(), for calculate_stakes_new() with prices up to max_k1, max_k2 and max_k3"""
+    if max_k1 <= 0 or max_k2 <= 0 or max_k3 <= 0:
+        return False
+    return calculate_stakes_new(max_k1, max_k2, max_k3, max_commission, max_commission, max_commission,
+                                profit_threshold - 1e-9) is not None
+
+
 def convert_back_lay_prices(price, round_up=True):
     """This function does both back -> lay and lay -> back convertion.
     """
@@ -93,3 +112,41 @@ def get_better_price_from_back_lay_prices(back_lay_prices_dict):
 
     return only_back_or_lay_prices_dict
 
+
+
+accumulated_grid_cache = {}
+
+
+def get_accumulated_grid(start, step, size):
+    """Return [start, start + step, start + step + step, ...] with size + 1 values.
+
+    Values are accumulated one step at a time, so they are exactly the ones visited by a loop of `x += step`.
+    """
+    key = start, step, size
+    if key not in accumulated_grid_cache:
+        grid = [start]
+        for _ in xrange(size):
+            grid.append(grid[-1] + step)
+        accumulated_grid_cache[key] = grid
+    return accumulated_grid_cache[key]
+
+
+def bisect_grid(condition, grid, hi=None):
+    """Return the index of the first value in grid for which condition is False,
+    or hi if condition is True for all of grid[:hi].
+
+    condition must be monotonic along the grid, i.e. True, ..., True, False, ..., False.
+    It is called about log2(hi) times, instead of up to hi times when stepping through the grid.
+    The first value is always checked, as stepping through the grid would do.
+    """
+    hi = len(grid) if hi is None else hi
+    if not hi or not condition(grid[0]):
+        return 0
+    lo = 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if condition(grid[mid]):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
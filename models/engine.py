@@ -1,8 +1,9 @@
 import logging
 import datetime
 from threading import RLock
-from arbi.models.match import Match
-from arbi.models.record import MatchInfoRecord
+from arbi.constants import MATCH_CLEAR_INTERVAL, FINISHED_MATCH_IDLE_TIME, MATCH_EXPIRY_AFTER_KICKOFF
+from arbi.models.match import Match, KickoffIndex, get_hk_time_str
+from arbi.models.record import MatchInfoRecord, InitOddsRecord
 
 
 log = logging.getLogger(__name__)
@@ -15,8 +16,22 @@ class DataEngine(object):
         # this overall dict can not have sub categories like "football", "basketball"
         # because the update records do not have sport type information.
         self.match_dict = {}
+        # Matches updated since the last time the spotter looked, together with the markets that changed, e.g.
+        #     {
+        #         '001': {('FT', 'AH', -0.5), ('HT', 'OU', 1.25)},
+        #         '002': set(),  # match info updated
+        #     }
+        self.dirty_match_dict = {}
+        # Indexes of match_dict kept up to date with match info, so that clearing doesn't look at every match:
+        # ids of in running matches, ids of matches at full time (see is_match_finishing()), and kickoff times
+        self.in_running_match_ids = set()
+        self.finishing_match_ids = set()
+        self.kickoff_index = KickoffIndex()
         self.last_clear_time = datetime.datetime.utcnow()
         self.match_dict_lock = RLock()
+        # odds records given to coalesce_record_lists() and how many of them were dropped
+        self.update_count = 0
+        self.coalesced_update_count = 0
 
     def get_inspector_table(self):
         return sorted([[match.id, match.info['is_in_running'],
@@ -29,17 +44,39 @@ class DataEngine(object):
     def clear_data(self):
         with self.match_dict_lock:
             self.match_dict.clear()
+            self.dirty_match_dict.clear()
+            self.in_running_match_ids.clear()
+            self.finishing_match_ids.clear()
+            self.kickoff_index.clear()
 
     def is_it_time_to_clear(self):
-        return datetime.datetime.utcnow() - self.last_clear_time > datetime.timedelta(minutes=5)
+        return datetime.datetime.utcnow() - self.last_clear_time > datetime.timedelta(seconds=MATCH_CLEAR_INTERVAL)
 
     def init_match_dict(self, init_dict):
         self.match_dict.update(init_dict)
+        for match_id, match in init_dict.iteritems():
+            self.index_match(match_id, match)
+            self.mark_dirty(match_id)
+            if match.odds:
+                self.dirty_match_dict[match_id].update(match.odds.get_markets())
+
+    def mark_dirty(self, match_id, market=None):
+        markets = self.dirty_match_dict.setdefault(match_id, set())
+        if market:
+            markets.add(market)
+
+    def pop_dirty_match_dict(self):
+        """Return matches updated since last call and reset the record.
+        """
+        dirty_match_dict = self.dirty_match_dict
+        self.dirty_match_dict = {}
+        return dirty_match_dict
 
     def update_match_dict(self, record_list):
         """Update match dict.
 
-        :param record_list: a list of record objects
+        :param record_list: a list of record objects. Init odds records of the initial packet come in lists too,
+            after the init dict.
         """
         if isinstance(record_list, dict):
             # When switch vip server, vip feed thread will send init dict again. We ignore it.
@@ -51,29 +88,102 @@ class DataEngine(object):
             match_id = record.record_dict['match_id']
             if match_id in self.match_dict:
                 old_match = self.match_dict[match_id]
-                old_match.update_with_record(record)
+                if isinstance(record, InitOddsRecord):
+                    market = old_match.init_update(record)
+                else:
+                    market = old_match.update_with_record(record)
+                if isinstance(record, MatchInfoRecord):
+                    self.index_match(match_id, old_match)
+                    self.mark_dirty(match_id, market)
+                elif market:
+                    self.mark_dirty(match_id, market)
             elif isinstance(record, MatchInfoRecord):
-                self.match_dict[match_id] = Match(record)
+                match = self.match_dict[match_id] = Match(record)
+                self.index_match(match_id, match)
+                self.mark_dirty(match_id)
 
-    def should_match_be_cleared(self, match):
+    def index_match(self, match_id, match):
+        """Update the indexes with the match info of a match in match_dict"""
+        if match.is_in_running:
+            self.in_running_match_ids.add(match_id)
+        else:
+            self.in_running_match_ids.discard(match_id)
+        if self.is_match_finishing(match):
+            self.finishing_match_ids.add(match_id)
+        else:
+            self.finishing_match_ids.discard(match_id)
+        if match.info:
+            self.kickoff_index.set_kickoff(match_id, match.info['match_hk_time'])
+
+    def remove_match(self, match_id):
+        """Remove a match from match_dict and the indexes and return it"""
+        self.dirty_match_dict.pop(match_id, None)
+        self.in_running_match_ids.discard(match_id)
+        self.finishing_match_ids.discard(match_id)
+        self.kickoff_index.discard(match_id)
+        return self.match_dict.pop(match_id)
+
+    def coalesce_record_lists(self, record_lists):
+        """Merge record lists, e.g. all packets taken from the source queue at once, into one record list for
+        update_match_dict(). An odds record is dropped if a later one updates the same prices of the same bookie,
+        with no match info record of the match in between, which could change the handicap or clear the prices.
+        Init dicts and None are skipped, as update_match_dict() would ignore them.
+        """
+        records = []
+        odds_record_indices = {}  # the index in records of the latest odds record for each price
+        match_info_counts = {}  # the number of match info records so far for each match
+        odds_record_count = 0
+        for record_list in record_lists:
+            if record_list is None or isinstance(record_list, dict):
+                continue
+            for record in record_list:
+                record_dict = record.record_dict
+                match_id = record_dict['match_id']
+                if isinstance(record, MatchInfoRecord):
+                    match_info_counts[match_id] = match_info_counts.get(match_id, 0) + 1
+                else:
+                    key = (match_id, match_info_counts.get(match_id, 0), record_dict['event_type'],
+                           record_dict['odds_type'], record_dict['dish'], record_dict['bookie_id'],
+                           record_dict['lay_flag'])
+                    index = odds_record_indices.get(key)
+                    if index is not None:
+                        records[index] = None
+                    odds_record_indices[key] = len(records)
+                    odds_record_count += 1
+                records.append(record)
+
+        coalesced_records = [record for record in records if record is not None]
+        self.update_count += odds_record_count
+        self.coalesced_update_count += len(records) - len(coalesced_records)
+        return coalesced_records
+
+    @staticmethod
+    def is_match_finishing(match):
+        """True if the match is at the end of the second half, or has no info"""
         if match.info:
             running_time = match.info['running_time'].split()
-            return (running_time and running_time[0] == '2h' and running_time[1] >= '45' and
-                    datetime.datetime.utcnow() - match.match_info_last_updated > datetime.timedelta(minutes=10))
+            return bool(running_time and running_time[0] == '2h' and running_time[1] >= '45')
+        else:
+            return True
+
+    def should_match_be_cleared(self, match):
+        if match.info:
+            return (self.is_match_finishing(match) and datetime.datetime.utcnow() - match.match_info_last_updated >
+                    datetime.timedelta(seconds=FINISHED_MATCH_IDLE_TIME))
         else:
             return True
 
     def clear_unneeded_matches(self):
-        """Remove finished matches.
+        """Remove finished matches, i.e. matches at full time whose info is no longer updated, and matches that
+        kicked off MATCH_EXPIRY_AFTER_KICKOFF ago. Only the matches in the indexes are looked at.
         """
         if self.is_it_time_to_clear():
-            to_be_cleared = []
-            for match_id, match in self.match_dict.iteritems():
-                if self.should_match_be_cleared(match):
-                    to_be_cleared.append((match_id, match))
+            to_be_cleared = [match_id for match_id in self.finishing_match_ids
+                             if self.should_match_be_cleared(self.match_dict[match_id])]
+            to_be_cleared.extend(self.kickoff_index.pop_kicked_off_before(get_hk_time_str(MATCH_EXPIRY_AFTER_KICKOFF)))
 
-            for match_id, match in to_be_cleared:
-                self.match_dict.pop(match_id)
+            for match_id in set(to_be_cleared):
+                match = self.remove_match(match_id)
                 if match.info:
                     log.info('Remove finished match: {} - {} vs {}'.format(
                         match.info['league_name'], match.info['home_team_name'], match.info['away_team_name']
@@ -84,6 +194,5 @@ class DataEngine(object):
     def clear_in_running_matches(self):
         """Sometimes we only want to do dead balls, e.g. in tc tool
         """
-        for match_id, match in self.match_dict.items():
-            if match.is_in_running:
-                self.match_dict.pop(match_id)
+        for match_id in list(self.in_running_match_ids):
+            self.remove_match(match_id)
@@ -0,0 +1,128 @@
+"""
+Latency of the feed packets through the stages of the discovery, from the packet read to the bet orders sent.
+
+The feed threads put each packet's records as a StampedRecordList, stamped when the packet is read, parsed and put
+in the source queue. The discovery loop stamps it when it is got from the queue, applied to the match dict and
+spotted. The time from the previous stage goes to a histogram per stage, which is logged as percentiles every
+LATENCY_LOG_INTERVAL seconds. The 'sent' stage is the time from an opportunity spotted to its bet orders written.
+
+The stamps are time.time(), as they are compared across the feed threads and the shard processes.
+"""
+import time
+import bisect
+import logging
+from threading import Lock
+from arbi.constants import LATENCY_LOG_INTERVAL
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+log.addHandler(logging.StreamHandler())
+
+PACKET_STAGES = ('read', 'parsed', 'enqueued', 'dequeued', 'applied', 'spotted')
+PERCENTILES = (50, 90, 99)
+# upper bounds of the histogram buckets in ms, about 19% apart from 0.05 ms to 100 s
+BUCKET_BOUNDS = [0.05 * 2 ** (i / 4.0) for i in xrange(85)]
+
+
+class StampedRecordList(list):
+    """A list of records with the times of the packet at each stage, i.e. {stage: time}"""
+    def __init__(self, records=(), stamps=None):
+        super(StampedRecordList, self).__init__(records)
+        self.stamps = stamps if stamps is not None else {}
+
+    def stamp(self, stage, at=None):
+        self.stamps[stage] = time.time() if at is None else at
+
+
+def stamp_record_lists(record_lists, stage):
+    """Stamp the StampedRecordLists among record_lists with the same time. Init dicts and plain lists are skipped."""
+    now = time.time()
+    for record_list in record_lists:
+        if isinstance(record_list, StampedRecordList):
+            record_list.stamp(stage, now)
+
+
+class LatencyHistogram(object):
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.max = 0
+
+    def add(self, ms):
+        self.bucket_counts[bisect.bisect_left(BUCKET_BOUNDS, ms)] += 1
+        self.count += 1
+        self.max = max(self.max, ms)
+
+    def get_percentile(self, percentile):
+        """Return the upper bound of the bucket the percentile falls in, in ms"""
+        rank = max(self.count * percentile / 100.0, 1)
+        cumulative_count = 0
+        for bound, bucket_count in zip(BUCKET_BOUNDS, self.bucket_counts):
+            cumulative_count += bucket_count
+            if cumulative_count >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class LatencyStats(object):
+    """Histograms of the latency by stage, since they were last logged. It is shared by the threads of a process."""
+    def __init__(self, log_interval=LATENCY_LOG_INTERVAL):
+        self.log_interval = log_interval
+        self.histograms = {}
+        self.last_logged = time.time()
+        self.lock = Lock()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = LatencyHistogram()
+            self.histograms[stage].add(seconds * 1000)
+
+    def add_stamps(self, stamps):
+        """Add the time between each two stages stamped in a row, and from read to the last stage as 'total'"""
+        stamped_stages = [stage for stage in PACKET_STAGES if stage in stamps]
+        for previous_stage, stage in zip(stamped_stages, stamped_stages[1:]):
+            self.add(stage, stamps[stage] - stamps[previous_stage])
+        if len(stamped_stages) > 1 and stamped_stages[0] == 'read':
+            self.add('total', stamps[stamped_stages[-1]] - stamps['read'])
+
+    def add_record_lists(self, record_lists):
+        for record_list in record_lists:
+            if isinstance(record_list, StampedRecordList):
+                self.add_stamps(record_list.stamps)
+        self.log_if_due()
+
+    def get_stats(self):
+        """Return {stage: {'count': count, 'p50': ms, 'p90': ms, 'p99': ms, 'max': ms}}"""
+        with self.lock:
+            stats = {}
+            for stage, histogram in self.histograms.iteritems():
+                stage_stats = stats[stage] = {'count': histogram.count, 'max': histogram.max}
+                for percentile in PERCENTILES:
+                    stage_stats['p{}'.format(percentile)] = histogram.get_percentile(percentile)
+            return stats
+
+    def log_if_due(self):
+        """Log the percentiles every log_interval seconds, and start the histograms again"""
+        if time.time() - self.last_logged < self.log_interval:
+            return False
+
+        stats = self.get_stats()
+        for stage in PACKET_STAGES[1:] + ('total', 'sent'):
+            if stage in stats:
+                stage_stats = stats[stage]
+                log.info('Latency of {}: {} samples, {} ms, max {:.1f} ms'.format(
+                    stage, stage_stats['count'],
+                    ', '.join('p{} {:.1f}'.format(p, stage_stats['p{}'.format(p)]) for p in PERCENTILES),
+                    stage_stats['max']))
+        self.reset()
+        return True
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.last_logged = time.time()
+
+
+latency_stats = LatencyStats()
@@ -1,5 +1,6 @@
 # -*- coding: GBK -*-
 
+import heapq
 import logging
 import datetime
 from threading import RLock
@@ -38,6 +39,8 @@ class Match(object):
 
     def init_update(self, record):
         """This function is only used when process initial packet
+
+        For init odds records, return the market, i.e. (event_type, odds_type, handicap), that has been updated.
         """
         if isinstance(record, MatchInfoRecord):
             self.info = record.record_dict
@@ -45,14 +48,19 @@ class Match(object):
         elif isinstance(record, InitOddsRecord):
             goal_diff = self.info['home_team_score'] - self.info['away_team_score']
             if self.odds:
-                self.odds.update_with_dict(record.record_dict, goal_diff)
+                return self.odds.update_with_dict(record.record_dict, goal_diff)
             else:
                 self.odds = Odds(record.record_dict, goal_diff)
+                markets = self.odds.get_markets()
+                return markets[0] if markets else None
         else:
             log.error(u'Should not have UpdateOddsRecord in an initial packet: {0}'.format(record.record_str))
 
     def update_with_record(self, record):
-        """Apply latest record from feed"""
+        """Apply latest record from feed.
+
+        For odds records, return the market, i.e. (event_type, odds_type, handicap), that has been updated.
+        """
         if isinstance(record, InitOddsRecord):
             log.error(u'Should not have InitOddsRecord in a update packet: {0}'.format(record.record_str))
         elif isinstance(record, MatchInfoRecord):
@@ -64,9 +72,11 @@ class Match(object):
         else:
             goal_diff = self.info['home_team_score'] - self.info['away_team_score'] if self.info else None
             if self.odds:
-                self.odds.update_with_dict(record.record_dict, goal_diff)
+                return self.odds.update_with_dict(record.record_dict, goal_diff)
             else:
                 self.odds = Odds(record.record_dict, goal_diff)
+                markets = self.odds.get_markets()
+                return markets[0] if markets else None
 
     def in_running_match_scored(self, match_info_record):
         if self.is_in_running:
@@ -95,3 +105,45 @@ class Match(object):
 
             else:
                 return new_home_score - current_home_score >= 1 or new_away_score - current_away_score >= 1
+
+
+def get_hk_time_str(seconds_ago=0):
+    """Return the HK time of seconds_ago in the format of match_hk_time, e.g. '2015-04-17 03:05:00'"""
+    hk_time = datetime.datetime.utcnow() + datetime.timedelta(hours=8) - datetime.timedelta(seconds=seconds_ago)
+    return hk_time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class KickoffIndex(object):
+    """Match ids by kickoff time, to find the matches that kicked off long ago without looking at every match.
+
+    Kickoff times are match_hk_time strings, which sort like the times they stand for. A match gets a new heap entry
+    when its kickoff time changes, and the old entry is skipped when it is popped.
+    """
+    def __init__(self):
+        self.kickoff_dict = {}
+        self.heap = []
+
+    def __len__(self):
+        return len(self.kickoff_dict)
+
+    def set_kickoff(self, match_id, kickoff):
+        if self.kickoff_dict.get(match_id) != kickoff:
+            self.kickoff_dict[match_id] = kickoff
+            heapq.heappush(self.heap, (kickoff, match_id))
+
+    def discard(self, match_id):
+        self.kickoff_dict.pop(match_id, None)
+
+    def clear(self):
+        self.kickoff_dict.clear()
+        del self.heap[:]
+
+    def pop_kicked_off_before(self, kickoff):
+        """Remove the matches that kicked off before kickoff from the index and return their ids"""
+        match_ids = []
+        while self.heap and self.heap[0][0] < kickoff:
+            entry_kickoff, match_id = heapq.heappop(self.heap)
+            if self.kickoff_dict.get(match_id) == entry_kickoff:
+                del self.kickoff_dict[match_id]
+                match_ids.append(match_id)
+        return match_ids
@@ -0,0 +1,130 @@
+"""
+Matches shared with the strategy workers when parallel computing is enabled.
+
+Instead of pickling the matches for every scan, the spotter writes the matches updated since the last scan
+into a memory mapped file once, stamped with a generation number.
+The workers are only told "generation N, match ids to scan". Each worker process keeps a replica of the matches,
+which it brings up to date from the snapshot before running the strategies.
+
+Snapshot layout: header (generation, data size) followed by the pickled (is_full, {match_id: match}, removed_match_ids)
+"""
+import os
+import mmap
+import struct
+import cPickle
+import tempfile
+
+
+HEADER = struct.Struct('<qq')
+INITIAL_SNAPSHOT_SIZE = 4 * 1024 * 1024
+
+
+class MatchSnapshotWriter(object):
+    def __init__(self, size=INITIAL_SNAPSHOT_SIZE):
+        self.size = size
+        self.generation = 0
+        self.path = None
+        self.old_paths = []
+        self.mm = None
+        self.match_ids = set()  # ids of the matches the replicas have
+        # e.g. for new workers, whose replicas are empty
+        self.full_snapshot_required = True
+
+    def open(self, size):
+        """Snapshot files are never resized, as a file mapped by other processes can not be resized on Windows.
+        A bigger file is created instead, and the workers switch to it when they see its new path.
+        """
+        self.close()
+        fd, self.path = tempfile.mkstemp(prefix='arbi_match_snapshot_')
+        os.write(fd, '\0' * size)
+        self.mm = mmap.mmap(fd, size)
+        os.close(fd)
+        self.size = size
+
+    def close(self):
+        if self.mm:
+            self.mm.close()
+            self.mm = None
+        if self.path:
+            self.old_paths.append(self.path)
+            self.path = None
+
+        for path in self.old_paths[:]:
+            try:
+                os.remove(path)
+                self.old_paths.remove(path)
+            except OSError:
+                pass  # still mapped by a worker on Windows, try again next time
+
+    def write(self, match_dict, updated_match_ids=None):
+        """Write the matches updated since the last generation and return (path, generation).
+        All matches are written if updated_match_ids is None or the replicas need to be rebuilt.
+        """
+        is_full = updated_match_ids is None or self.full_snapshot_required
+        if is_full:
+            matches = dict(match_dict)
+            removed_match_ids = []
+        else:
+            matches = {match_id: match_dict[match_id] for match_id in updated_match_ids if match_id in match_dict}
+            removed_match_ids = [match_id for match_id in self.match_ids if match_id not in match_dict]
+
+        data = cPickle.dumps((is_full, matches, removed_match_ids), cPickle.HIGHEST_PROTOCOL)
+        required_size = HEADER.size + len(data)
+        if self.mm is None or required_size > self.size:
+            size = self.size
+            while size < required_size:
+                size *= 2
+            self.open(size)
+
+        self.generation += 1
+        self.mm[HEADER.size:HEADER.size + len(data)] = data
+        self.mm[:HEADER.size] = HEADER.pack(self.generation, len(data))
+
+        if is_full:
+            self.match_ids = set(matches)
+        else:
+            self.match_ids.difference_update(removed_match_ids)
+            self.match_ids.update(matches)
+        self.full_snapshot_required = False
+
+        return self.path, self.generation
+
+
+class MatchReplica(object):
+    """All matches as of a generation, kept in a worker process"""
+    def __init__(self):
+        self.generation = 0
+        self.match_dict = {}
+        self.path = None
+        self.mm = None
+
+    def update(self, path, generation):
+        """Bring the replica up to generation. Return False if it can not, e.g. a generation has been missed,
+        in which case a full snapshot is needed.
+        """
+        if generation == self.generation:
+            return True
+
+        if path != self.path:
+            if self.mm:
+                self.mm.close()
+            with open(path, 'rb') as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.path = path
+
+        snapshot_generation, size = HEADER.unpack_from(self.mm, 0)
+        if snapshot_generation != generation:
+            return False
+
+        is_full, matches, removed_match_ids = cPickle.loads(self.mm[HEADER.size:HEADER.size + size])
+        if is_full:
+            self.match_dict = matches
+        elif self.generation == generation - 1:
+            self.match_dict.update(matches)
+            for match_id in removed_match_ids:
+                self.match_dict.pop(match_id, None)
+        else:
+            return False
+
+        self.generation = generation
+        return True
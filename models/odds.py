@@ -1,8 +1,10 @@
 import time
 import logging
+from bisect import insort
+from heapq import heapify, heappop, heappush
 from collections import namedtuple
-from arbi.utils import merge_dict
-from arbi.constants import BOOKIE_ID_MAP
+from arbi.constants import BOOKIE_ID_MAP, RB_PRICE_EXPIRY_HEAP_MIN_SIZE
+from arbi.models.calculations import convert_back_lay_prices
 
 
 log = logging.getLogger(__name__)
@@ -25,6 +27,161 @@ class UnknownOddsType(Exception):
 BookieOddsInfo = namedtuple('BookieOddsInfo', 'prices bet_data last_updated')
 
 
+class SortedPrices(object):
+    """
+    Prices from all bookies for one handicap, sorted by position (home/away, or home/draw/away for 1x2), best price first.
+
+    Each position keeps three lists of (-price, bookie_id, receipt, is_complete):
+        back_prices: prices from back bookies
+        lay_prices: original prices from lay bookies, e.g. '7 lay'
+        lay_prices_converted: prices from lay bookies converted to back prices
+    is_complete is True if the bookie offers prices for all positions. Prices of 0 are not kept.
+
+    :param bookie_odds_id_and_info: {bookie_id: BookieOddsInfo}
+    """
+    def __init__(self, bookie_odds_id_and_info=None):
+        self.back_prices = []
+        self.lay_prices = []
+        self.lay_prices_converted = []
+        for bookie_id, bookie_odds_info in (bookie_odds_id_and_info or {}).iteritems():
+            self.add(bookie_id, bookie_odds_info)
+
+    def add(self, bookie_id, bookie_odds_info):
+        prices, receipt = bookie_odds_info[0], bookie_odds_info[1]
+        is_complete = all(prices)
+        is_lay = bookie_id.endswith(' lay')
+        while len(self.back_prices) < len(prices):
+            self.back_prices.append([])
+            self.lay_prices.append([])
+            self.lay_prices_converted.append([])
+
+        for position, price in enumerate(prices):
+            if not price:
+                continue
+            if is_lay:
+                insort(self.lay_prices[position], (-price, bookie_id, receipt, is_complete))
+                if price > 1:
+                    price_converted = convert_back_lay_prices(price, round_up=False)
+                    insort(self.lay_prices_converted[position], (-price_converted, bookie_id, receipt, is_complete))
+            else:
+                insort(self.back_prices[position], (-price, bookie_id, receipt, is_complete))
+
+    def remove(self, bookie_id):
+        for seq in self.back_prices + self.lay_prices + self.lay_prices_converted:
+            for i, entry in enumerate(seq):
+                if entry[1] == bookie_id:
+                    del seq[i]
+                    break
+
+    @staticmethod
+    def iter_prices(seq, bookie_availability_dict, bet_period, complete_only):
+        for neg_price, bookie_id, receipt, is_complete in seq:
+            if complete_only and not is_complete:
+                continue
+            if bookie_availability_dict is not None and not (
+                    bookie_id in bookie_availability_dict and bookie_availability_dict[bookie_id][bet_period]):
+                continue
+            yield bookie_id, -neg_price, receipt
+
+    def get_back_prices(self, position, bookie_availability_dict=None, bet_period=None, complete_only=False):
+        """Return [(bookie_id, price, receipt), ...] with the best price first"""
+        if position >= len(self.back_prices):
+            return []
+        return list(self.iter_prices(self.back_prices[position], bookie_availability_dict, bet_period, complete_only))
+
+    def get_lay_prices_converted(self, position, bookie_availability_dict=None, bet_period=None, complete_only=False):
+        """Return [(lay_bookie_id, converted_price, receipt), ...] with the best price first"""
+        if position >= len(self.lay_prices_converted):
+            return []
+        return list(self.iter_prices(self.lay_prices_converted[position], bookie_availability_dict, bet_period,
+                                     complete_only))
+
+    def get_best_back_price(self, position, bookie_availability_dict=None, bet_period=None):
+        """Return (bookie_id, price, receipt) or None"""
+        if position >= len(self.back_prices):
+            return
+        return next(self.iter_prices(self.back_prices[position], bookie_availability_dict, bet_period, False), None)
+
+    def get_max_back_price(self, position):
+        """Return the highest back price of any bookie, or 0 if there is none.
+        Bookie availability and completeness are not checked, so it is an upper bound of the back prices
+        the strategies could use, for a quick check before looking into them bookie by bookie.
+        """
+        if position < len(self.back_prices) and self.back_prices[position]:
+            return -self.back_prices[position][0][0]
+        return 0
+
+    def get_max_lay_price_converted(self, position):
+        """Return the highest converted lay price of any bookie, or 0 if there is none. See get_max_back_price()."""
+        if position < len(self.lay_prices_converted) and self.lay_prices_converted[position]:
+            return -self.lay_prices_converted[position][0][0]
+        return 0
+
+    def get_best_price(self, position):
+        """Return (bookie_id, price, receipt) or None, regardless of back or lay and bookie availability"""
+        if position >= len(self.back_prices):
+            return
+        candidates = [seq[position][0] for seq in (self.back_prices, self.lay_prices) if seq[position]]
+        if candidates:
+            neg_price, bookie_id, receipt, is_complete = min(candidates)
+            return bookie_id, -neg_price, receipt
+
+
+class BookieOddsDict(dict):
+    """
+    {bookie_id: BookieOddsInfo} for one handicap, with the SortedPrices updated along with it.
+    """
+    def __init__(self, *args, **kwargs):
+        super(BookieOddsDict, self).__init__(*args, **kwargs)
+        self.sorted_prices = SortedPrices(self)
+
+    def __reduce__(self):
+        # The pool in ArbiSpotter pickles matches. Rebuild sorted prices instead of pickling them.
+        return self.__class__, (dict(self),)
+
+    def __setitem__(self, bookie_id, bookie_odds_info):
+        if bookie_id in self:
+            self.sorted_prices.remove(bookie_id)
+        super(BookieOddsDict, self).__setitem__(bookie_id, bookie_odds_info)
+        self.sorted_prices.add(bookie_id, bookie_odds_info)
+
+    def __delitem__(self, bookie_id):
+        super(BookieOddsDict, self).__delitem__(bookie_id)
+        self.sorted_prices.remove(bookie_id)
+
+    def pop(self, bookie_id, *default):
+        if bookie_id in self:
+            self.sorted_prices.remove(bookie_id)
+        return super(BookieOddsDict, self).pop(bookie_id, *default)
+
+    def popitem(self):
+        bookie_id, bookie_odds_info = super(BookieOddsDict, self).popitem()
+        self.sorted_prices.remove(bookie_id)
+        return bookie_id, bookie_odds_info
+
+    def setdefault(self, bookie_id, bookie_odds_info=None):
+        if bookie_id not in self:
+            self[bookie_id] = bookie_odds_info
+        return self[bookie_id]
+
+    def update(self, *args, **kwargs):
+        for bookie_id, bookie_odds_info in dict(*args, **kwargs).iteritems():
+            self[bookie_id] = bookie_odds_info
+
+    def clear(self):
+        super(BookieOddsDict, self).clear()
+        self.sorted_prices = SortedPrices()
+
+
+def get_sorted_prices(bookie_odds_id_and_info):
+    """Return SortedPrices for {bookie_id: BookieOddsInfo}.
+    It is only built here if the prices did not come from Odds, e.g. merged from other sources.
+    """
+    if isinstance(bookie_odds_id_and_info, BookieOddsDict):
+        return bookie_odds_id_and_info.sorted_prices
+    return SortedPrices(bookie_odds_id_and_info)
+
+
 class Odds(object):
     """
     All odds from all bookies for a specific match.
@@ -33,6 +190,10 @@ class Odds(object):
     :param record_dict: Record.record_dict in record.py
     """
     def __init__(self, record_dict, goal_diff=None):
+        # (last_updated, (event_type, odds_type), handicap, bookie_id) for each update, oldest first,
+        # so that expired prices are found without looking at all prices
+        self.expiry_heap = []
+        self.expiry_heap_max_size = RB_PRICE_EXPIRY_HEAP_MIN_SIZE
         odds_details = self.get_odds_details(record_dict)
         if odds_details:
             event_type, odds_type, bookie_id, bet_data, odds_type_value, prices = odds_details
@@ -48,17 +209,22 @@ class Odds(object):
                 else:
                     odds_type_value += goal_diff
 
+            last_updated = time.time()
             self.odds_dict = {
                 (event_type, odds_type): {
-                    odds_type_value: {
-                        bookie_id: BookieOddsInfo(prices, bet_data, time.time())
-                    }
+                    odds_type_value: BookieOddsDict({
+                        bookie_id: BookieOddsInfo(prices, bet_data, last_updated)
+                    })
                 }
             }
+            self.push_expiry_entry(last_updated, (event_type, odds_type), odds_type_value, bookie_id)
         else:
             self.odds_dict = {}
 
     def update_with_dict(self, record_dict, goal_diff=None):
+        """Return the market, i.e. (event_type, odds_type, handicap), that has been updated,
+        or None if the record is ignored.
+        """
         odds_details = self.get_odds_details(record_dict)
         if odds_details:
             event_type, odds_type, bookie_id, bet_data, odds_type_value, prices = odds_details
@@ -67,15 +233,57 @@ class Odds(object):
                     return
                 else:
                     odds_type_value += goal_diff
-            merge_dict(self.odds_dict,
-                {
-                    (event_type, odds_type): {
-                        odds_type_value: {
-                            bookie_id: BookieOddsInfo(prices, bet_data, time.time())
-                        }
-                    }
-                }
-            )
+            # one lookup per level, rather than merging a nested dict built for each update
+            odds_by_category = self.odds_dict.get((event_type, odds_type))
+            if odds_by_category is None:
+                odds_by_category = self.odds_dict[(event_type, odds_type)] = {}
+            bookie_odds_id_and_info = odds_by_category.get(odds_type_value)
+            if bookie_odds_id_and_info is None:
+                bookie_odds_id_and_info = odds_by_category[odds_type_value] = BookieOddsDict()
+            last_updated = time.time()
+            bookie_odds_id_and_info[bookie_id] = BookieOddsInfo(prices, bet_data, last_updated)
+            self.push_expiry_entry(last_updated, (event_type, odds_type), odds_type_value, bookie_id)
+            return event_type, odds_type, odds_type_value
+
+    def push_expiry_entry(self, last_updated, event_and_odds_type, handicap, bookie_id):
+        heappush(self.expiry_heap, (last_updated, event_and_odds_type, handicap, bookie_id))
+        if len(self.expiry_heap) > self.expiry_heap_max_size:
+            # most entries are for prices updated again since, keep only the latest one of each price
+            self.expiry_heap = [(bookie_odds_info[2], event_and_odds_type, handicap, bookie_id)
+                                for event_and_odds_type, odds_by_category in self.odds_dict.iteritems()
+                                for handicap, bookie_odds_id_and_info in odds_by_category.iteritems()
+                                for bookie_id, bookie_odds_info in bookie_odds_id_and_info.iteritems()]
+            heapify(self.expiry_heap)
+            self.expiry_heap_max_size = max(2 * len(self.expiry_heap), RB_PRICE_EXPIRY_HEAP_MIN_SIZE)
+
+    def remove_expired_prices(self, updated_before):
+        """Remove prices last updated before updated_before. Return True if any price is removed.
+        Only the entries of expiry_heap older than updated_before are looked at.
+        """
+        expired = False
+        while self.expiry_heap and self.expiry_heap[0][0] < updated_before:
+            last_updated, event_and_odds_type, handicap, bookie_id = heappop(self.expiry_heap)
+            bookie_odds_id_and_info = self.odds_dict.get(event_and_odds_type, {}).get(handicap, {})
+            bookie_odds_info = bookie_odds_id_and_info.get(bookie_id)
+            # the price could have been updated or removed since
+            if bookie_odds_info is not None and bookie_odds_info[2] == last_updated:
+                bookie_odds_id_and_info.pop(bookie_id)
+                expired = True
+        return expired
+
+    def get_oldest_update_time(self):
+        """Return the last updated time of the oldest price, or None if there is no price.
+        It can be earlier, if that price has been updated or removed since.
+        """
+        if self.expiry_heap:
+            return self.expiry_heap[0][0]
+
+    def get_markets(self):
+        """Return a list of markets, i.e. (event_type, odds_type, handicap), for all the prices we have
+        """
+        return [(event_type, odds_type, handicap)
+                for (event_type, odds_type), odds_by_category in self.odds_dict.iteritems()
+                for handicap in odds_by_category]
 
     def get_odds_details(self, record_dict):
         event_type = record_dict['event_type']
@@ -5,6 +5,16 @@ from arbi.constants import BOOKIE_COMMISSION_MAP, BOOKIE_NAME_CN_MAP, BOOKIE_ID_
 
 Selection = namedtuple('Selection', ['odds_type', 'subtype', 'f_ht', 'bookie_id', 'stake', 'odds',
                                      'bet_data', 'lay_flag'])
+# opps found, found again with different prices or stakes, and no longer found since the last scan
+OppsDiff = namedtuple('OppsDiff', ['new', 'changed', 'withdrawn'])
+
+
+def get_opp_key(match_id, strat_id, opportunity):
+    """Return what identifies an opp from scan to scan: the match, the strat and the bets, without prices and stakes
+
+    :param opportunity: a raw opp from the strats, i.e. (profit, selections)
+    """
+    return match_id, strat_id, tuple((s[0], s[1], s[2], s[3], s[7]) for s in opportunity[1])
 
 
 class ArbiOpportunity(object):
@@ -17,9 +27,14 @@ class ArbiOpportunity(object):
         self.occur_at_utc = occur_at_utc
         self.strat_id = strat_id
         self.occur_at_hk_str = str(occur_at_utc + datetime.timedelta(hours=8))[:-3]
+        self.opportunity = opportunity
         self.profit, selections = opportunity
         self.selections = [Selection(*s) for s in selections]
 
+    @property
+    def key(self):
+        return get_opp_key(self.match_info['match_id'], self.strat_id, self.opportunity)
+
     @property
     def involved_bookie_ids(self):
         return [selection.bookie_id for selection in self.selections]
@@ -53,6 +68,101 @@ class ArbiOpportunity(object):
         return str(self.get_summary())
 
 
+class ArbiOppsTracker(object):
+    """Keep the opps of the last scan by key. An opp found again unchanged stays the same ArbiOpportunity object,
+    with the time it first occurred, so only new and changed opps need to be built and passed on.
+    """
+    def __init__(self):
+        self.arbi_opps_by_key = {}
+        self.arbi_opps = []  # sorted by profit
+        self.diff = OppsDiff([], [], [])
+        self.has_forgotten_opps = False  # since the last update
+        # withdrawn in the next update if they are not found again
+        self.forgotten_opps_by_key = {}
+
+    def update_with_raw_opps(self, raw_opps_by_id, match_dict, occur_at_utc):
+        """Update with the raw opps of a scan, see ArbiSpotter.convert_to_arb_opp_objects(), and return all the opps
+        sorted by profit. ArbiOpportunity objects are only built for new and changed opps.
+        """
+        arbi_opps_by_key = {}
+        new_opps = []
+        changed_opps = []
+        for match_id, strat_opps_dict in raw_opps_by_id.iteritems():
+            match_info = match_dict[match_id].info
+            info = {key: match_info[key] for key in ArbiOpportunity.match_info_keys}
+            for strat_id, raw_opps in strat_opps_dict.iteritems():
+                for raw_opp in raw_opps:
+                    key = get_opp_key(match_id, strat_id, raw_opp)
+                    if key in arbi_opps_by_key:
+                        key += (raw_opp,)  # same bets at other prices in the same scan
+                    old_arbi_opp = self.arbi_opps_by_key.get(key)
+                    if old_arbi_opp is not None and old_arbi_opp.opportunity == raw_opp and \
+                            old_arbi_opp.match_info == info:
+                        arbi_opp = old_arbi_opp
+                    else:
+                        arbi_opp = ArbiOpportunity(info, occur_at_utc, strat_id, raw_opp)
+                        (new_opps if old_arbi_opp is None else changed_opps).append(arbi_opp)
+                    arbi_opps_by_key[key] = arbi_opp
+
+        return self.set_arbi_opps(arbi_opps_by_key, new_opps, changed_opps)
+
+    def update(self, arbi_opps):
+        """The same with ArbiOpportunity objects, e.g. the opps of all the shards"""
+        arbi_opps_by_key = {}
+        new_opps = []
+        changed_opps = []
+        for arbi_opp in arbi_opps:
+            key = arbi_opp.key
+            if key in arbi_opps_by_key:
+                key += (arbi_opp.opportunity,)
+            old_arbi_opp = self.arbi_opps_by_key.get(key)
+            if old_arbi_opp is None:
+                new_opps.append(arbi_opp)
+            elif old_arbi_opp.opportunity != arbi_opp.opportunity or old_arbi_opp.match_info != arbi_opp.match_info:
+                changed_opps.append(arbi_opp)
+            else:
+                arbi_opp = old_arbi_opp
+            arbi_opps_by_key[key] = arbi_opp
+
+        return self.set_arbi_opps(arbi_opps_by_key, new_opps, changed_opps)
+
+    def set_arbi_opps(self, arbi_opps_by_key, new_opps, changed_opps):
+        withdrawn_opps = [arbi_opp for old_arbi_opps_by_key in (self.arbi_opps_by_key, self.forgotten_opps_by_key)
+                          for key, arbi_opp in old_arbi_opps_by_key.iteritems() if key not in arbi_opps_by_key]
+        self.diff = OppsDiff(new_opps, changed_opps, withdrawn_opps)
+        self.arbi_opps_by_key = arbi_opps_by_key
+        self.has_forgotten_opps = False
+        self.forgotten_opps_by_key = {}
+        if new_opps or changed_opps or withdrawn_opps:
+            self.arbi_opps = sorted(arbi_opps_by_key.itervalues(), key=lambda x: x.profit, reverse=True)
+        return self.arbi_opps
+
+    def get_updated_opps(self):
+        """Return the new and changed opps of the last update sorted by profit"""
+        return sorted(self.diff.new + self.diff.changed, key=lambda x: x.profit, reverse=True)
+
+    def forget(self, arbi_opps):
+        """Drop arbi_opps, so that they are new again if they are still found in the next update,
+        e.g. when the execution system releases their bookies from cooldown
+        """
+        forgotten_ids = {id(arbi_opp) for arbi_opp in arbi_opps}
+        if not forgotten_ids:
+            return
+        for key, arbi_opp in self.arbi_opps_by_key.items():
+            if id(arbi_opp) in forgotten_ids:
+                self.forgotten_opps_by_key[key] = self.arbi_opps_by_key.pop(key)
+        self.arbi_opps = [arbi_opp for arbi_opp in self.arbi_opps if id(arbi_opp) not in forgotten_ids]
+        self.has_forgotten_opps = True
+
+    def clear(self):
+        """Forget all the opps, so that all those found in the next update are new"""
+        self.forgotten_opps_by_key.update(self.arbi_opps_by_key)
+        self.arbi_opps_by_key = {}
+        self.arbi_opps = []
+        self.diff = OppsDiff([], [], [])
+        self.has_forgotten_opps = True
+
+
 def convert_raw_odds_to_effective_odds(raw_odds, commission):
     return round(raw_odds * (1 + commission), 3)
 
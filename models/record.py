@@ -1,7 +1,9 @@
 """
 One record is a line that ends with \n
 """
+import time
 import logging
+import calendar
 import datetime
 from arbi.constants import MAX_ODDS
 from arbi.models.data_utils import is_match_basketball
@@ -11,6 +13,21 @@ log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 log.addHandler(logging.StreamHandler())
 
+# odds type and event type codes in odds records
+ODDS_TYPE_MAP = {
+    '0': '1x2',
+    '4': 'OU',
+    '5': 'AH',
+    '6': '1or2',
+    '9': 'EH',
+}
+EVENT_TYPE_MAP = {
+    '0': 'FT',
+    '1': 'HT',
+}
+IS_IN_RUNNING_MAP = {'0': False, '1': True}
+HK_TIME_OFFSET = datetime.timedelta(hours=8)
+
 
 class IncorrectLengthRecord(Exception):
     """The record has unexpected number of fields
@@ -23,14 +40,30 @@ class UnknownValueRecord(Exception):
 
 
 class Record(object):
+    """Records are created for every line of every packet, so they have no __dict__.
+    Subclasses must declare __slots__ too, even if empty.
+    """
+    __slots__ = ('record_str', 'record_dict', 'received_at')
     keys = []
+    # only records with text, e.g. team names, need to be decoded
+    is_gbk_text = True
 
     def __init__(self, record_str):
-        self.record_str = record_str.decode('gbk')
+        self.record_str = record_str.decode('gbk') if self.is_gbk_text else record_str
         record_list = self.record_str[1:].split('|')
         record_list = self.validate_record_format(record_list)
-        self.record_dict = {k: v for k, v in zip(self.keys, record_list)}
-        self.timestamp = datetime.datetime.utcnow() + datetime.timedelta(hours=8)  # when we received the record in HK time
+        self.record_dict = dict(zip(self.keys, record_list))
+        self.received_at = time.time()
+
+    @property
+    def timestamp(self):
+        """When we received the record in HK time"""
+        return datetime.datetime.utcfromtimestamp(self.received_at) + HK_TIME_OFFSET
+
+    @timestamp.setter
+    def timestamp(self, hk_time):
+        utc_time = hk_time - HK_TIME_OFFSET
+        self.received_at = calendar.timegm(utc_time.timetuple()) + utc_time.microsecond / 1e6
 
     def validate_record_format(self, record_list):
         if len(record_list) != len(self.keys):
@@ -49,6 +82,7 @@ class Record(object):
 
 
 class MatchInfoRecord(Record):
+    __slots__ = ()
     keys = ['match_id', 'league_id', 'league_name', 'league_name_simp', 'league_name_trad',
             'home_team_id', 'home_team_name', 'home_team_name_simp', 'home_team_name_trad', 'away_team_id',
             'away_team_name', 'away_team_name_simp', 'away_team_name_trad', 'match_hk_time', 'group_color',
@@ -68,7 +102,7 @@ class MatchInfoRecord(Record):
     def refine_info(self):
         self.record_dict['home_team_score'] = int(self.record_dict['home_team_score'])
         self.record_dict['away_team_score'] = int(self.record_dict['away_team_score'])
-        self.record_dict['is_in_running'] = {'0': False, '1': True}[self.record_dict['is_in_running']]
+        self.record_dict['is_in_running'] = IS_IN_RUNNING_MAP[self.record_dict['is_in_running']]
 
         if not self.record_dict['is_in_running']:
             self.record_dict['home_team_score'] = -1
@@ -76,7 +110,12 @@ class MatchInfoRecord(Record):
 
 
 class OddsRecord(Record):
+    """Odds records only have codes, ids and numbers, so they are kept as byte strings,
+    which compare and hash equal to the unicode ids of match records.
+    """
+    __slots__ = ('prices',)
     keys = []
+    is_gbk_text = False
 
     def __init__(self, record_str):
         super(OddsRecord, self).__init__(record_str)
@@ -85,11 +124,11 @@ class OddsRecord(Record):
 
     def is_valid(self):
         # check odds type
-        if self.record_dict['ot'] not in ['0', '4', '5', '6', '9']:
+        if self.record_dict['ot'] not in ODDS_TYPE_MAP:
             return False
 
         # check event type
-        if self.record_dict['et'] not in ['0', '1']:
+        if self.record_dict['et'] not in EVENT_TYPE_MAP:
             log.warn("Unknown value for event_type: {1}. Possible values are: 0, 1".format(
                 self.record_dict['et']))
             return False
@@ -104,28 +143,16 @@ class OddsRecord(Record):
         return True
 
     def post_validation_work(self):
+        if self.prices is not None:
+            # created by parse(), which has done all of this already
+            return
         self.explain_odds_record()
         self.produce_dish_value()
         self.produce_prices_value()
 
     def explain_odds_record(self):
-        explain_map = {
-            ('ot', 'odds_type'): {
-                '0': '1x2',
-                '4': 'OU',
-                '5': 'AH',
-                '6': '1or2',
-                '9': 'EH',
-            },
-            ('et', 'event_type'): {
-                '0': 'FT',
-                '1': 'HT',
-            },
-        }
-        for names, values in explain_map.items():
-            short_name, full_name = names
-            symbol = self.record_dict[short_name]
-            self.record_dict[full_name] = values[symbol]
+        self.record_dict['odds_type'] = ODDS_TYPE_MAP[self.record_dict['ot']]
+        self.record_dict['event_type'] = EVENT_TYPE_MAP[self.record_dict['et']]
 
     def produce_dish_value(self):
         """This is only for VIP data. YY data has this function overridden
@@ -160,6 +187,72 @@ class OddsRecord(Record):
 
         self.record_dict['lay_flag'] = bool(int(self.record_dict['lay_flag']))
 
+    @classmethod
+    def parse(cls, record_str):
+        """Single pass alternative to the constructor, is_valid() and post_validation_work() for update records,
+        which are most of the feed data.
+        Return None if the record can't be handled here, and the constructor should be used instead,
+        so that malformed or unusual records are still rejected, logged or fixed as before.
+        """
+        record_list = record_str[1:].split('|')
+        if len(record_list) != len(cls.keys):
+            return None
+
+        record_dict = dict(zip(cls.keys, record_list))
+        odds_type = ODDS_TYPE_MAP.get(record_dict['ot'])
+        event_type = EVENT_TYPE_MAP.get(record_dict['et'])
+        o1 = record_dict['o1']
+        o2 = record_dict['o2']
+        o3 = record_dict['o3']
+        if odds_type is None or event_type is None or not o1 or not o2:
+            return None
+
+        try:
+            o1 = float(o1)
+            o2 = float(o2)
+            if o3:
+                o3 = float(o3)
+            record_dict['lay_flag'] = bool(int(record_dict['lay_flag']))
+            if not cls.refine_parsed_record_dict(record_dict, odds_type):
+                return None
+        except ValueError:
+            return None
+
+        if o1 > MAX_ODDS:
+            log.debug('Odds {0} is too big. The record is {1}'.format(o1, record_str))
+            o1 = 0
+        if o2 > MAX_ODDS:
+            log.debug('Odds {0} is too big. The record is {1}'.format(o2, record_str))
+            o2 = 0
+        record_dict['o1'] = o1
+        record_dict['o2'] = o2
+        record_dict['o3'] = o3
+        record_dict['odds_type'] = odds_type
+        record_dict['event_type'] = event_type
+        # the same few bookie ids are in every record, and become keys of odds_dict and bookie_availability_dict
+        record_dict['bookie_id'] = intern(record_dict['bookie_id'])
+
+        record = cls.__new__(cls)
+        record.record_str = record_str
+        record.record_dict = record_dict
+        record.received_at = time.time()
+        record.prices = [o1, o2] if odds_type in ('AH', 'OU', '1or2') else [o1, o2, o3]
+        return record
+
+    @classmethod
+    def refine_parsed_record_dict(cls, record_dict, odds_type):
+        """Convert the fields specific to the record type and set dish for parse(), here for VIP data as in
+        produce_dish_value(). Return False if parse() can't handle the record. May raise ValueError.
+        """
+        if odds_type in ('AH', 'OU'):
+            record_dict['dish'] = float(record_dict['o3']) / 4.0
+        elif odds_type in ('1x2', '1or2'):
+            record_dict['dish'] = None
+        else:
+            # unknown for VIP data, logged by produce_dish_value()
+            return False
+        return True
+
     def validate_record_format(self, record_list):
         if len(record_list) == len(self.keys) - 1:
             record_list.append(False)
@@ -172,23 +265,40 @@ class OddsRecord(Record):
 
 
 class InitOddsRecord(OddsRecord):
+    __slots__ = ()
     keys = ['et', 'ot', 'match_id', 'bookie_id', 'bet_data', 'o1', 'o2', 'o3', 'lay_flag']
 
 
 class VIPUpdateOddsRecord(OddsRecord):
+    __slots__ = ()
     keys = ['update_id'] + InitOddsRecord.keys
 
     def convert_data_type(self):
         super(VIPUpdateOddsRecord, self).convert_data_type()
         self.record_dict['update_id'] = int(self.record_dict['update_id'])
 
+    @classmethod
+    def refine_parsed_record_dict(cls, record_dict, odds_type):
+        if not super(VIPUpdateOddsRecord, cls).refine_parsed_record_dict(record_dict, odds_type):
+            return False
+
+        record_dict['update_id'] = int(record_dict['update_id'])
+        return True
+
 
 class YYUpdateOddsRecord(OddsRecord):
     """Format:
     o{update_id}|{lay_flag}|{et}|{ot}|{dish}|{match_id}|{bookmaker_id}|{bet_data}|{o1}|{o2}|{o3}
     """
+    __slots__ = ()
     keys = ['update_id', 'lay_flag', 'et', 'ot', 'dish', 'match_id', 'bookie_id', 'bet_data', 'o1', 'o2', 'o3']
 
     def produce_dish_value(self):
         dish = self.record_dict['dish']
         self.record_dict['dish'] = float(dish) / 4 if dish else None
+
+    @classmethod
+    def refine_parsed_record_dict(cls, record_dict, odds_type):
+        dish = record_dict['dish']
+        record_dict['dish'] = float(dish) / 4 if dish else None
+        return True
@@ -0,0 +1,91 @@
+"""
+Long lived processes that run the strategies when parallel computing is enabled.
+
+Matches are sharded across the workers by match id, and every worker runs all strategies (apart from cross handicap)
+on its shard. The strategies are sent once when a worker starts. Each worker has its own MatchSnapshotWriter,
+so every scan only pickles the matches updated since the last scan, once, for the shard they belong to.
+Raw opps are put on the result queue strategy by strategy as soon as each one finishes.
+
+Result queue messages look like (worker_id, generation, strat_name, raw_opps_dict).
+strat_name and raw_opps_dict are None if the replica of the worker is out of sync.
+"""
+import zlib
+from multiprocessing import Process, Queue
+from arbi.models.match_snapshot import MatchSnapshotWriter, MatchReplica
+
+
+def get_shard_index(match_id, shard_count):
+    """crc32 rather than hash, so that match ids go to the same shard in all processes"""
+    return (zlib.crc32(str(match_id)) & 0xffffffff) % shard_count
+
+
+def run_one_strat(matches, strat, bookie_availability_dict):
+    return {match.id: {strat.id: strat.spot_arbi(match, bookie_availability_dict)}
+            for match in matches if match.odds and match.info}
+
+
+def run_strat_worker(worker_id, strats_name_map, task_queue, result_queue):
+    """Loop of a worker process until it gets None from task_queue"""
+    match_replica = MatchReplica()
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        snapshot_path, generation, match_ids, bookie_availability_dict = task
+        if not match_replica.update(snapshot_path, generation):
+            result_queue.put((worker_id, generation, None, None))
+            continue
+
+        matches = [match_replica.match_dict[match_id] for match_id in match_ids if match_id in match_replica.match_dict]
+        for name, strat in strats_name_map.iteritems():
+            result_queue.put((worker_id, generation, name, run_one_strat(matches, strat, bookie_availability_dict)))
+
+
+class StratWorker(object):
+    """
+    :param worker_id: also the shard index of the worker
+    :param shard_count: number of workers
+    :param strats_name_map: {strat class name: strat}
+    :param result_queue: shared by all workers
+    """
+    def __init__(self, worker_id, shard_count, strats_name_map, result_queue):
+        self.worker_id = worker_id
+        self.shard_count = shard_count
+        self.strat_names = strats_name_map.keys()
+        self.task_queue = Queue()
+        self.match_snapshot = MatchSnapshotWriter()
+        self.process = Process(target=run_strat_worker,
+                               args=(worker_id, strats_name_map, self.task_queue, result_queue))
+        self.process.daemon = True
+
+    def start(self):
+        self.process.start()
+
+    def submit(self, match_dict, updated_match_ids, match_ids, bookie_availability_dict):
+        """Write the matches of the shard updated since the last scan to the snapshot and ask the worker to scan
+        match_ids. Return the generation of the snapshot, which comes back with the results.
+
+        :param match_dict: all matches
+        :param updated_match_ids: ids of all matches updated since the last scan, or None if unknown
+        :param match_ids: ids of the matches of the shard to scan
+        """
+        if updated_match_ids is None or self.match_snapshot.full_snapshot_required:
+            match_dict = {match_id: match for match_id, match in match_dict.iteritems()
+                          if get_shard_index(match_id, self.shard_count) == self.worker_id}
+            updated_match_ids = None
+        else:
+            updated_match_ids = [match_id for match_id in updated_match_ids
+                                 if get_shard_index(match_id, self.shard_count) == self.worker_id]
+
+        snapshot_path, generation = self.match_snapshot.write(match_dict, updated_match_ids)
+        self.task_queue.put((snapshot_path, generation, match_ids, bookie_availability_dict))
+        return generation
+
+    def stop(self):
+        if self.process.is_alive():
+            self.task_queue.put(None)
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.match_snapshot.close()
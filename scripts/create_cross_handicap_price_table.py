@@ -0,0 +1,37 @@
+"""
+Precompute total goals price curves used by CrossHandicapArbiStrategy.ou_checker and save them to
+CROSS_HANDICAP_PRICE_TABLE_PATH, which is loaded the first time the prices are needed.
+"""
+import time
+from arbi.constants import CROSS_HANDICAP_PRICE_TABLE_PATH
+from arbi.models.calculations import convert_back_lay_prices
+from arbi.strats import cross_handicap_tg_prices
+from arbi.strats.cross_handicap_price_cache import save_price_table
+
+
+OU_LINES = [x * 0.25 for x in range(6, 21)]  # 1.5 - 5.0
+ODDS = [x / 100.0 for x in range(101, 501)]  # 1.01 - 5.00
+
+
+def main():
+    t0 = time.time()
+    price_cache = cross_handicap_tg_prices.price_cache
+    price_cache.max_size = len(OU_LINES) * len(ODDS) * 2
+    price_cache.load_table()
+    for line in OU_LINES:
+        for odds in ODDS:
+            # ou_checker hedges with both the over price and the converted under price
+            for hedge_odds in (odds, convert_back_lay_prices(odds, round_up=False)):
+                try:
+                    cross_handicap_tg_prices.get_prices(-line, hedge_odds, 0, 0, 1)
+                except ZeroDivisionError:
+                    pass
+        print 'OU line {} done'.format(line)
+
+    save_price_table(CROSS_HANDICAP_PRICE_TABLE_PATH, [price_cache])
+    print 'Saved prices to {} in {:.1f} seconds, {}'.format(CROSS_HANDICAP_PRICE_TABLE_PATH, time.time() - t0,
+                                                            price_cache.get_stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
 from arbi import constants
 
+from arbi.models.bookie import get_bookie_attributes_map
 from arbi.models.calculations import convert_back_lay_prices
-from arbi.models.calculations import calculate_stakes, calculate_stakes_new
+from arbi.models.calculations import calculate_stakes, calculate_stakes_new, may_be_arbitrage, may_be_3_way_arbitrage
+from arbi.models.odds import get_sorted_prices
 from arbi.strats.strat import BaseArbiStrategy
 
 
@@ -69,16 +71,25 @@ class AHvs2Strategy(BaseArbiStrategy):
         return arbi_opps
 
     def spot_arbi_both(self, odds_dict, handicap, bookie_availability_dict, bet_period, is_arbi_reversed):
+        bookie_attributes_map = get_bookie_attributes_map()
         arbi_args = self.arbi_args_for_both_map[is_arbi_reversed]
         arbi_opps = []
         for event_type in ['FT', 'HT']:
             if (event_type, 'AH') in odds_dict and (event_type, '1x2') in odds_dict:
                 if handicap in odds_dict[(event_type, 'AH')] and None in odds_dict[(event_type, '1x2')]:
+                    max_ah_price = get_sorted_prices(odds_dict[(event_type, 'AH')][handicap]).get_max_back_price(
+                        arbi_args['AH'])
+                    max_x_price = get_sorted_prices(odds_dict[(event_type, '1x2')][None]).get_max_back_price(
+                        arbi_args['1x2'])
+                    if not may_be_arbitrage(max_ah_price, max_x_price, profit_threshold=self.profit_threshold):
+                        continue
+
                     ah_prices = []
                     for bookie_id, bookie_odds_info in odds_dict[(event_type, 'AH')][handicap].iteritems():
                         prices, receipt, last_updated = bookie_odds_info
-                        if bookie_availability_dict[bookie_id][bet_period] and not bookie_id.endswith(' lay') and \
-                                bookie_id not in constants.NON_TRADITIONAL_AH_BOOKIE_IDS:
+                        if bookie_availability_dict[bookie_id][bet_period] and \
+                                not bookie_attributes_map[bookie_id].is_lay and \
+                                bookie_attributes_map[bookie_id].is_traditional_ah:
                             ah_price = prices[arbi_args['AH']]
                             if ah_price:  # cannot be 0
                                 ah_prices.append((bookie_id, ah_price, receipt))
@@ -87,8 +98,9 @@ class AHvs2Strategy(BaseArbiStrategy):
                     x_prices = []
                     for bookie_id, bookie_odds_info in odds_dict[(event_type, '1x2')][None].iteritems():
                         prices, receipt, last_updated = bookie_odds_info
-                        if bookie_availability_dict[bookie_id][bet_period] and not bookie_id.endswith(' lay') and \
-                                bookie_id not in constants.NON_TRADITIONAL_AH_BOOKIE_IDS:
+                        if bookie_availability_dict[bookie_id][bet_period] and \
+                                not bookie_attributes_map[bookie_id].is_lay and \
+                                bookie_attributes_map[bookie_id].is_traditional_ah:
                             x_price = prices[arbi_args['1x2']]
                             if x_price:
                                 x_prices.append((bookie_id, x_price, receipt))
@@ -188,6 +200,7 @@ class AHvsXvs2Strategy(BaseArbiStrategy):
          3. continue until both lists are exhausted
          4. the ah prices used can't be used again in later calculation
         """
+        bookie_attributes_map = get_bookie_attributes_map()
         arbi_opps = []
         used_ah_price_index_list = []
         used_x_lay_price_index_list = []
@@ -197,8 +210,8 @@ class AHvsXvs2Strategy(BaseArbiStrategy):
                 ah_bookie_id, ah_price, ah_receipt = ah_data
                 if ah_index not in used_ah_price_index_list and x_lay_index not in used_x_lay_price_index_list and \
                         ah_bookie_id not in [x_lay_bookie_id, x_lay_bookie_id.replace(' lay', '')]:
-                    comm1 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[ah_bookie_id], 0)
-                    comm2 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[x_lay_bookie_id], 0)
+                    comm1 = bookie_attributes_map[ah_bookie_id].commission
+                    comm2 = bookie_attributes_map[x_lay_bookie_id].commission
                     result = calculate_stakes(ah_price, x_lay_price_converted, comm1, comm2, self.profit_threshold)
 
                     if result:
@@ -219,15 +232,16 @@ class AHvsXvs2Strategy(BaseArbiStrategy):
         return ah_prices, arbi_opps
 
     def find_opps_for_ah_draw_and_x_prices(self, ah_prices, draw_prices, x_prices, arbi_args, event_type, handicap):
+        bookie_attributes_map = get_bookie_attributes_map()
         arbi_opps = []
         for ah_data, draw_data, x_data in zip(ah_prices, draw_prices, x_prices):
             ah_bookie_id, ah_price, ah_receipt = ah_data
             draw_bookie_id, draw_price, draw_receipt = draw_data
             x_bookie_id, x_price, x_receipt = x_data
             if {ah_bookie_id, draw_bookie_id, x_bookie_id} != {ah_bookie_id}:
-                commission1 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[ah_bookie_id], 0)
-                commission2 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[draw_bookie_id], 0)
-                commission3 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[x_bookie_id], 0)
+                commission1 = bookie_attributes_map[ah_bookie_id].commission
+                commission2 = bookie_attributes_map[draw_bookie_id].commission
+                commission3 = bookie_attributes_map[x_bookie_id].commission
                 result = calculate_stakes_new(ah_price, draw_price, x_price,
                                               commission1, commission2, commission3, self.profit_threshold)
 
@@ -246,12 +260,13 @@ class AHvsXvs2Strategy(BaseArbiStrategy):
         return arbi_opps
 
     def get_prices_by_position(self, odds_dict, bookie_availability_dict, bet_period, arbi_args, event_type, handicap):
+        bookie_attributes_map = get_bookie_attributes_map()
         ah_prices = []
         for bookie_id, bookie_odds_info in odds_dict[(event_type, 'AH')][handicap].iteritems():
             prices, receipt, last_updated = bookie_odds_info
             # because betfair AH has rules different from traditional AH, we don't include them in AH prices
-            if bookie_availability_dict[bookie_id][bet_period] and not bookie_id.endswith(' lay') and \
-                    bookie_id not in constants.NON_TRADITIONAL_AH_BOOKIE_IDS:
+            if bookie_availability_dict[bookie_id][bet_period] and not bookie_attributes_map[bookie_id].is_lay and \
+                    bookie_attributes_map[bookie_id].is_traditional_ah:
                 ah_price = prices[arbi_args['AH']]
                 if ah_price:  # cannot be 0
                     ah_prices.append((bookie_id, ah_price, receipt))
@@ -262,7 +277,7 @@ class AHvsXvs2Strategy(BaseArbiStrategy):
         for bookie_id, bookie_odds_info in odds_dict[(event_type, '1x2')][None].iteritems():
             prices, receipt, last_updated = bookie_odds_info
             if bookie_availability_dict[bookie_id][bet_period]:
-                if bookie_id.endswith(' lay'):
+                if bookie_attributes_map[bookie_id].is_lay:
                     x_lay_price = prices[arbi_args['1x2 lay']]
                     if x_lay_price:
                         x_lay_prices.append((bookie_id, convert_back_lay_prices(x_lay_price, round_up=False), receipt))
@@ -279,12 +294,27 @@ class AHvsXvs2Strategy(BaseArbiStrategy):
 
         return ah_prices, draw_prices, x_prices, x_lay_prices
 
+    def may_be_arbitrage(self, odds_dict, arbi_args, event_type, handicap, even_score):
+        """Check the highest prices of all bookies first, as most handicaps can't be arbitrage"""
+        ah_sorted_prices = get_sorted_prices(odds_dict[(event_type, 'AH')][handicap])
+        x_sorted_prices = get_sorted_prices(odds_dict[(event_type, '1x2')][None])
+        max_ah_price = ah_sorted_prices.get_max_back_price(arbi_args['AH'])
+        if even_score and may_be_arbitrage(max_ah_price, x_sorted_prices.get_max_lay_price_converted(arbi_args['1x2 lay']),
+                                           constants.MAX_BOOKIE_COMMISSION, self.profit_threshold):
+            return True
+        return may_be_3_way_arbitrage(max_ah_price, x_sorted_prices.get_max_back_price(1),
+                                      x_sorted_prices.get_max_back_price(arbi_args['1x2']),
+                                      constants.MAX_BOOKIE_COMMISSION, self.profit_threshold)
+
     def spot_arbi_both(self, odds_dict, handicap, bookie_availability_dict, bet_period, is_arbi_reversed, even_score=True):
         arbi_args = self.arbi_args_for_both_map[is_arbi_reversed]
         arbi_opps = []
         for event_type in ['FT', 'HT']:
             if (event_type, 'AH') in odds_dict and (event_type, '1x2') in odds_dict and \
                     handicap in odds_dict[(event_type, 'AH')] and None in odds_dict[(event_type, '1x2')]:
+                if not self.may_be_arbitrage(odds_dict, arbi_args, event_type, handicap, even_score):
+                    continue
+
                 ah_prices, draw_prices, x_prices, x_lay_prices = self.get_prices_by_position(odds_dict,
                                                  bookie_availability_dict, bet_period, arbi_args, event_type, handicap)
                 found_2_selection_opps = False
@@ -1,5 +1,4 @@
-from arbi import constants
-
+from arbi.models.bookie import get_bookie_attributes_map
 from arbi.models.calculations import convert_back_lay_prices
 from arbi.models.calculations import calculate_stakes_new, calculate_stakes
 from arbi.strats.strat import BaseArbiStrategy
@@ -83,6 +82,7 @@ class EHvsEHXvsAHStrategy(BaseArbiStrategy):
         return ah_prices, draw_prices, eh_prices, eh_lay_prices
 
     def spot_arbi_normal(self, odds_dict, bookie_availability_dict, bet_period):
+        bookie_attributes_map = get_bookie_attributes_map()
         arbi_opps = []
         if ('FT', 'AH') in odds_dict and ('FT', 'EH') in odds_dict:
             for eh_hcp, ah_hcp in [(-1, -0.5), (-2, -1.5), (-3, -2.5)]:
@@ -96,8 +96,8 @@ class EHvsEHXvsAHStrategy(BaseArbiStrategy):
                         eh_lay_bookie_id, eh_lay_price_converted, eh_lay_receipt = eh_lay_data
                         ah_bookie_id, ah_price, ah_receipt = ah_data
                         if eh_lay_bookie_id != ah_bookie_id:
-                            eh_lay_comm = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[eh_lay_bookie_id], 0)
-                            ah_comm = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[ah_bookie_id], 0)
+                            eh_lay_comm = bookie_attributes_map[eh_lay_bookie_id].commission
+                            ah_comm = bookie_attributes_map[ah_bookie_id].commission
 
                             result = calculate_stakes(eh_lay_price_converted, ah_price, eh_lay_comm, ah_comm, self.profit_threshold)
                             if result:
@@ -121,9 +121,9 @@ class EHvsEHXvsAHStrategy(BaseArbiStrategy):
                         draw_bookie_id, draw_price, draw_receipt = draw_data
                         ah_bookie_id, ah_price, ah_receipt = ah_data
                         if {eh_bookie_id, draw_bookie_id, ah_bookie_id} != {ah_bookie_id}:
-                            eh_comm = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[eh_bookie_id], 0)
-                            draw_comm = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[draw_bookie_id], 0)
-                            ah_comm = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[ah_bookie_id], 0)
+                            eh_comm = bookie_attributes_map[eh_bookie_id].commission
+                            draw_comm = bookie_attributes_map[draw_bookie_id].commission
+                            ah_comm = bookie_attributes_map[ah_bookie_id].commission
 
                             result = calculate_stakes_new(eh_price, draw_price, ah_price,
                                                           eh_comm, draw_comm, ah_comm, self.profit_threshold)
@@ -142,6 +142,7 @@ class EHvsEHXvsAHStrategy(BaseArbiStrategy):
         return arbi_opps
 
     def spot_arbi_reversed(self, odds_dict, bookie_availability_dict, bet_period):
+        bookie_attributes_map = get_bookie_attributes_map()
         arbi_opps = []
         if ('FT', 'AH') in odds_dict and ('FT', 'EH') in odds_dict:
             for eh_hcp, ah_hcp in [(1, 0.5), (2, 1.5), (3, 2.5)]:
@@ -154,8 +155,8 @@ class EHvsEHXvsAHStrategy(BaseArbiStrategy):
                         eh_lay_bookie_id, eh_lay_price_converted, eh_lay_receipt = eh_lay_data
                         ah_bookie_id, ah_price, ah_receipt = ah_data
                         if eh_lay_bookie_id != ah_bookie_id:
-                            eh_lay_comm = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[eh_lay_bookie_id], 0)
-                            ah_comm = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[ah_bookie_id], 0)
+                            eh_lay_comm = bookie_attributes_map[eh_lay_bookie_id].commission
+                            ah_comm = bookie_attributes_map[ah_bookie_id].commission
 
                             result = calculate_stakes(ah_price, eh_lay_price_converted, ah_comm, eh_lay_comm, self.profit_threshold)
                             if result:
@@ -179,9 +180,9 @@ class EHvsEHXvsAHStrategy(BaseArbiStrategy):
                         draw_bookie_id, draw_price, draw_receipt = draw_data
                         ah_bookie_id, ah_price, ah_receipt = ah_data
                         if {eh_bookie_id, draw_bookie_id, ah_bookie_id} != {ah_bookie_id}:
-                            eh_comm = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[eh_bookie_id], 0)
-                            draw_comm = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[draw_bookie_id], 0)
-                            ah_comm = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[ah_bookie_id], 0)
+                            eh_comm = bookie_attributes_map[eh_bookie_id].commission
+                            draw_comm = bookie_attributes_map[draw_bookie_id].commission
+                            ah_comm = bookie_attributes_map[ah_bookie_id].commission
 
                             result = calculate_stakes_new(ah_price, draw_price, eh_price,
                                                           ah_comm, draw_comm, eh_comm, self.profit_threshold)
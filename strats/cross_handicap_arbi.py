@@ -1,8 +1,9 @@
 import math
 from operator import itemgetter
-from arbi import constants
 
+from arbi.models.bookie import get_bookie_attributes_map
 from arbi.models.calculations import calculate_stakes
+from arbi.models.odds import get_sorted_prices
 from arbi.strats import cross_handicap_hcp_prices
 from arbi.strats import cross_handicap_tg_prices
 from arbi.strats.strat import BaseArbiStrategy
@@ -11,24 +12,10 @@ from arbi.strats.strat import BaseArbiStrategy
 class CrossHandicapArbiStrategy(BaseArbiStrategy):
 
     def get_top_price(self, price_dict):
-        best_x_bookie_id = -999
-        best_x_bookie_odds = 0.0
-        best_y_bookie_id = -999
-        best_y_bookie_odds = 0.0
-        best_x_receipt = ''
-        best_y_receipt = ''
-        for bookie_id, bookie_odds_info in price_dict.iteritems():
-            prices, receipt, last_updated = bookie_odds_info
-            if prices[0] > best_x_bookie_odds:
-                best_x_bookie_id = bookie_id
-                best_x_bookie_odds = prices[0]
-                best_x_receipt = receipt
-            if prices[1] > best_y_bookie_odds:
-                best_y_bookie_id = bookie_id
-                best_y_bookie_odds = prices[1]
-                best_y_receipt = receipt
-
-        return best_x_bookie_id, best_x_bookie_odds, best_x_receipt, best_y_bookie_id, best_y_bookie_odds, best_y_receipt
+        sorted_prices = get_sorted_prices(price_dict)
+        best_x_price_info = sorted_prices.get_best_price(0) or (-999, 0.0, '')
+        best_y_price_info = sorted_prices.get_best_price(1) or (-999, 0.0, '')
+        return best_x_price_info + best_y_price_info
 
     def hcp_checker(self, line, dict, return_list, ou_line, ou_odds):
         swap_jolly_bool = 0
@@ -126,6 +113,7 @@ class CrossHandicapArbiStrategy(BaseArbiStrategy):
         return arbi_opps
 
     def spot_arbi_both(self, odds_dict, bookie_availability_dict, bet_period):
+        bookie_attributes_map = get_bookie_attributes_map()
         arbi_opps = []
         if bet_period == 'dead ball':
             for event_type in ['FT', 'HT']:
@@ -139,8 +127,8 @@ class CrossHandicapArbiStrategy(BaseArbiStrategy):
                             if line < 0:
                                 bet_bookie_id, bet_bookie_odds, bet_receipt = x_info
                                 hedge_bookie_id, hedge_bookie_odds, hedge_receipt = y_info
-                                bet_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[bet_bookie_id], 0)
-                                hedge_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[hedge_bookie_id], 0)
+                                bet_commission = bookie_attributes_map[bet_bookie_id].commission
+                                hedge_commission = bookie_attributes_map[hedge_bookie_id].commission
                                 result = calculate_stakes(bet_bookie_odds, hedge_equivalent_line_price, bet_commission, hedge_commission, 0.005)
                                 if result:
                                     stake1, stake2, profit = result
@@ -152,8 +140,8 @@ class CrossHandicapArbiStrategy(BaseArbiStrategy):
                             else:
                                 bet_bookie_id, bet_bookie_odds, bet_receipt = y_info
                                 hedge_bookie_id, hedge_bookie_odds, hedge_receipt = x_info
-                                bet_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[bet_bookie_id], 0)
-                                hedge_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[hedge_bookie_id], 0)
+                                bet_commission = bookie_attributes_map[bet_bookie_id].commission
+                                hedge_commission = bookie_attributes_map[hedge_bookie_id].commission
                                 result = calculate_stakes(bet_bookie_odds, hedge_equivalent_line_price, bet_commission, hedge_commission, 0.005)
                                 if result:
                                     stake1, stake2, profit = result
@@ -165,8 +153,8 @@ class CrossHandicapArbiStrategy(BaseArbiStrategy):
                         elif market_type == 'OU':
                             bet_bookie_id, bet_bookie_odds, bet_receipt = x_info
                             hedge_bookie_id, hedge_bookie_odds, hedge_receipt = y_info
-                            bet_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[bet_bookie_id], 0)
-                            hedge_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[hedge_bookie_id], 0)
+                            bet_commission = bookie_attributes_map[bet_bookie_id].commission
+                            hedge_commission = bookie_attributes_map[hedge_bookie_id].commission
                             result = calculate_stakes(bet_bookie_odds, hedge_equivalent_line_price, bet_commission, hedge_commission, 0.005)
                             if result:
                                 stake1, stake2, profit = result
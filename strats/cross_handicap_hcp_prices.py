@@ -1,9 +1,36 @@
 import math
+from array import array
+from bisect import bisect_right
+from arbi.constants import CROSS_HANDICAP_PRICE_CACHE_SIZE, CROSS_HANDICAP_PRICE_TABLE_PATH
+from arbi.models.calculations import get_accumulated_grid, bisect_grid
+from arbi.strats.cross_handicap_price_cache import PriceCache, memoize_prices
+from arbi.strats.cross_handicap_poisson import get_score_masses
 from arbi.strats.static_data.cross_handicap_strat_data import jolly_win_generics, jolly_win_wb12, non_poisson_adjustment
 
 global_matrixSize = 11  # need to add 1
 global_HcpSize = 11
 
+price_cache = PriceCache('hcp', CROSS_HANDICAP_PRICE_CACHE_SIZE, CROSS_HANDICAP_PRICE_TABLE_PATH)
+
+
+class SortedTable(object):
+    """Static table sorted by its first column, with each column kept in an array for bisect lookup"""
+    def __init__(self, rows):
+        self.columns = [array('d', column) for column in zip(*rows)]
+        self.keys = self.columns[0]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, value):
+        """Return the index of the first row whose key is bigger than value, or len(self) if there is none"""
+        return bisect_right(self.keys, value)
+
+
+jolly_win_generics_table = SortedTable(jolly_win_generics)
+jolly_win_wb12_table = SortedTable(jolly_win_wb12)
+non_poisson_adjustment_table = SortedTable(non_poisson_adjustment)
+
 
 def calc_SJD(stats):
     return (stats[0] + stats[1])/2.0, (stats[0] - stats[1])/2.0, (stats[0] + stats[1] + 0.01)/2.0, (stats[0] - stats[1] - 0.01)/2.0
@@ -37,14 +64,11 @@ def db_poisson(nrow , ncol, deltaFlag, hg_info):
 
 def map_non_poisson_adjustments(value, index):
     if index == 1 or index == 2:
-        nrow = 21
-
-        i = 0
-        while i < nrow:
-            if value - non_poisson_adjustment[i][0] < 0:
-                tmp_value = non_poisson_adjustment[i-1][index]
-                return (tmp_value / 0.05 - int(tmp_value/0.05)) * (non_poisson_adjustment[i][index] - non_poisson_adjustment[i-1][index]) + non_poisson_adjustment[i-1][index]
-            i += 1
+        i = non_poisson_adjustment_table.find(value)
+        if i < len(non_poisson_adjustment_table):
+            column = non_poisson_adjustment_table.columns[index]
+            tmp_value = column[i-1]
+            return (tmp_value / 0.05 - int(tmp_value/0.05)) * (column[i] - column[i-1]) + column[i-1]
 
         return -100.0
     else:
@@ -53,15 +77,9 @@ def map_non_poisson_adjustments(value, index):
 
 def map_jolly_win_generics(value, index):
     if index == 1 or index == 2:
-        nrow = 251
-        i = 0
-        while i < nrow:
-            if value - jolly_win_generics[i][0] < 0:
-                if i == 0:
-                    return jolly_win_generics[0][index]
-                else:
-                    return jolly_win_generics[i-1][index]
-            i += 1
+        i = jolly_win_generics_table.find(value)
+        if i < len(jolly_win_generics_table):
+            return jolly_win_generics_table.columns[index][max(i - 1, 0)]
         return -100.0
     else:
         return -100.0
@@ -69,20 +87,19 @@ def map_jolly_win_generics(value, index):
 
 def map_jolly_win_wb12(value, index):
     if index == 1 or index == 2:
-        nrow = 261
-        i = 0
-        while i < nrow:
-            if value - jolly_win_wb12[i][0] < 0:
-                if i == 0:
-                    return jolly_win_wb12[0][index]
-                else:
-                    return jolly_win_wb12[i-1][index]
-            i += 1
+        i = jolly_win_wb12_table.find(value)
+        if i < len(jolly_win_wb12_table):
+            return jolly_win_wb12_table.columns[index][max(i - 1, 0)]
         return -100.0
     else:
         return -100.0
 
 
+def map_batch(map_func, values, index):
+    """Map a batch of values, e.g. jolly_mid of several supremacy candidates, with one of the map functions above"""
+    return [map_func(value, index) for value in values]
+
+
 def calc_hcp_price(index, j_mid, x_mid, d_mid, jwb1, jwb2):
     switcher = {
         0: d_mid / j_mid + 1.0,
@@ -142,94 +159,53 @@ def calc_ou_price(ou_prob):
     return over_prices, under_prices
 
 
-def calc_expG(hedge_OU, hedge_odds):
+def get_ou_prob(e_goal):
     tmp_sum = 0.0
     ou_working_array = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
-
-    index = int(math.fabs(hedge_OU / 0.25) - 6)
-
-    e = 1.0
-    cnt = 0
-    iterations = 10000
-
     for i in range(0, 6):
         if i == 5:
             ou_working_array[i] = 1.0 - tmp_sum
         else:
-            ou_working_array[i] = poisson_value(i,e)
+            ou_working_array[i] = poisson_value(i, e_goal)
             tmp_sum += ou_working_array[i]
-    over_array, under_array = calc_ou_price(ou_working_array)
-    cnt += 1
+    return ou_working_array
+
+
+def calc_expG(hedge_OU, hedge_odds, tolerance=0.001):
+    """Expected goals are searched from 1.0 upwards, in steps of tolerance,
+    until the price of hedge_OU reaches hedge_odds. Prices are monotonic in expected goals,
+    so the steps are bisected rather than walked one by one, which gives the same result.
+    """
+    index = int(math.fabs(hedge_OU / 0.25) - 6)
+    iterations = 10000
 
     if hedge_OU <= 0:
-        while index < len(over_array) and over_array[index] > hedge_odds and cnt <= iterations:
-            tmp_sum = 0.0
-            for i in range(0, 6):
-                if i == 5:
-                    ou_working_array[i] = 1.0 - tmp_sum
-                else:
-                    ou_working_array[i] = poisson_value(i,e)
-                    tmp_sum += ou_working_array[i]
-            over_array, under_array = calc_ou_price(ou_working_array)
-            e += 0.001
-            cnt += 1
+        def price_not_reached(e):
+            over_array, under_array = calc_ou_price(get_ou_prob(e))
+            return index < len(over_array) and over_array[index] > hedge_odds
     else:
-        while index < len(under_array) and under_array[index] < hedge_odds and cnt <= iterations:
-            tmp_sum = 0.0
-            for i in range(0,6):
-                if i == 5:
-                    ou_working_array[i] = 1.0 - tmp_sum
-                else:
-                    ou_working_array[i] = poisson_value(i,e)
-                    tmp_sum += ou_working_array[i]
-            over_array, under_array = calc_ou_price(ou_working_array)
-            e += 0.001
-            cnt += 1
-    return e
+        def price_not_reached(e):
+            over_array, under_array = calc_ou_price(get_ou_prob(e))
+            return index < len(under_array) and under_array[index] < hedge_odds
 
+    e_grid = get_accumulated_grid(1.0, tolerance, iterations)
+    steps = bisect_grid(price_not_reached, e_grid, iterations - 1)
+    if steps == 0:
+        return e_grid[0]
+    # e is always one step ahead of the prices checked
+    return e_grid[min(steps + 1, iterations)]
 
-def get_prices(hedge_HCP, hedge_odds, tgValue, tgOdds, non_poisson_flag, to_bet_bool, to_hedge_bool):
-    true_goals = calc_expG(tgValue, tgOdds)
+
+@memoize_prices(price_cache)
+def get_prices(hedge_HCP, hedge_odds, tgValue, tgOdds, non_poisson_flag, to_bet_bool, to_hedge_bool, tolerance=0.001):
+    true_goals = calc_expG(tgValue, tgOdds, tolerance)
     (home_adv, home_rating, away_adv, supremacy, jollyHG, dogHG, jollyHG_delta, dogHG_delta) = config([abs(hedge_HCP + (hedge_HCP + 1.35)), 0.0, 0.0, true_goals, 0.0, 0.0])
 
     run = 1
     while run:
-        jollyHG, dogHG, jollyHG_delta, dogHG_delta = calc_SJD([true_goals, supremacy])
-        poisson_matrix = db_poisson(global_matrixSize, global_matrixSize, 0, [jollyHG, dogHG, jollyHG_delta, dogHG_delta])
-        jolly_mid = 0.0
-        jolly_mid_by_one = 0.0
-        jolly_mid_by_two = 0.0
-        draw_mid = 0.0
-
-        for i in range(global_matrixSize):
-            for j in range(global_matrixSize):
-                if i > j:
-                    jolly_mid += poisson_matrix[i][j]
-                    if (i-j) == 1:
-                        jolly_mid_by_one += poisson_matrix[i][j]
-                    if (i-j) == 2:
-                        jolly_mid_by_two += poisson_matrix[i][j]
-                else:
-                    if i == j:
-                        draw_mid += poisson_matrix[i][j]
+        jolly_mid, draw_mid, jolly_mid_by_one, jolly_mid_by_two = get_score_masses(true_goals, supremacy, global_matrixSize)
         dog_mid = 1.0 - jolly_mid - draw_mid
 
-        poisson_matrix_delta = db_poisson(global_matrixSize, global_matrixSize, 1, [jollyHG, dogHG, jollyHG_delta, dogHG_delta])
-        jolly_delta = 0.0
-        draw_delta = 0.0
-
-        for i in range(0, global_matrixSize):
-            for j in range(0, global_matrixSize):
-                if i > j:
-                    jolly_delta += poisson_matrix_delta[i][j]
-                elif i == j:
-                    draw_delta += poisson_matrix_delta[i][j]
-
-        dog_delta = 1.0 - jolly_delta - draw_delta
-        jolly_delta -= jolly_mid
-        draw_delta -= draw_mid
-        dog_delta -= dog_mid
-
         jolly_non_poisson_adjust = jolly_mid - map_non_poisson_adjustments(jolly_mid, 1)
 
         if non_poisson_flag:
@@ -0,0 +1,44 @@
+"""
+Poisson score matrix used by cross_handicap_hcp_prices.
+
+The matrix is the outer product of the goal distributions of both teams, so only 2 * size Poisson
+probabilities are calculated, instead of two for every cell. Masses are summed in the same order
+as the original double loops, so the results are exactly the same.
+"""
+import math
+
+
+def poisson_pmf(lam, size):
+    """[P(0), P(1), ..., P(size - 1)] of Poisson(lam)"""
+    return [math.pow(lam, a) * math.exp(-lam) / math.factorial(a) for a in range(size)]
+
+
+def score_matrix(jolly_hg, dog_hg, size):
+    """matrix[i][j] is the probability of jolly scoring i and dog scoring j"""
+    dog_pmf = poisson_pmf(dog_hg, size)
+    return [[jolly_p * dog_p for dog_p in dog_pmf] for jolly_p in poisson_pmf(jolly_hg, size)]
+
+
+def sum_score_masses(matrix):
+    """Return (jolly, draw, jolly_by_one, jolly_by_two), i.e. the probabilities of jolly winning, a draw,
+    jolly winning by exactly one goal and by exactly two goals.
+    """
+    jolly = 0.0
+    jolly_by_one = 0.0
+    jolly_by_two = 0.0
+    draw = 0.0
+    for i, row in enumerate(matrix):
+        for j in range(i):
+            jolly += row[j]
+        if i >= 1:
+            jolly_by_one += row[i-1]
+        if i >= 2:
+            jolly_by_two += row[i-2]
+        if i < len(row):
+            draw += row[i]
+    return jolly, draw, jolly_by_one, jolly_by_two
+
+
+def get_score_masses(true_goals, supremacy, size):
+    """Return (jolly, draw, jolly_by_one, jolly_by_two) for the goals expected in total and the supremacy of jolly"""
+    return sum_score_masses(score_matrix((true_goals + supremacy)/2.0, (true_goals - supremacy)/2.0, size))
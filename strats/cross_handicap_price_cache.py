@@ -0,0 +1,110 @@
+"""
+Memoization for cross handicap price curves.
+
+The same inputs recur across matches and scans, as odds are quoted on a 0.01 grid and lines on a 0.25 grid,
+so calculated prices are kept in a LRU cache. The hits and misses are logged periodically by the process using
+the cache, which is the cross handicap pool process when it runs asynchronously. A precomputed table can be saved to disk and is loaded the first time
+the cache is used, in whichever process runs the strategy.
+"""
+import os
+import time
+import cPickle
+import logging
+from collections import OrderedDict
+from functools import wraps
+from arbi.constants import CROSS_HANDICAP_PRICE_CACHE_LOG_INTERVAL
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+log.addHandler(logging.StreamHandler())
+
+
+class PriceCache(object):
+    def __init__(self, name, max_size, table_path=None, log_interval=CROSS_HANDICAP_PRICE_CACHE_LOG_INTERVAL):
+        self.name = name
+        self.max_size = max_size
+        self.table_path = table_path
+        self.log_interval = log_interval
+        self.last_logged = time.time()
+        self.table_loaded = False
+        self.table = {}  # precomputed, never evicted
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if not self.table_loaded:
+            self.load_table()
+
+        self.log_stats_if_due()
+        if key in self.table:
+            self.hits += 1
+            return self.table[key]
+
+        value = self.cache.pop(key, None)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.cache[key] = value  # move to the most recently used end
+        return value
+
+    def set(self, key, value):
+        self.cache[key] = value
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.cache), 'table size': len(self.table)}
+
+    def log_stats_if_due(self):
+        if time.time() - self.last_logged >= self.log_interval:
+            self.last_logged = time.time()
+            log.info('Cross handicap %s price cache: %s', self.name, self.get_stats())
+
+    def load_table(self):
+        self.table_loaded = True
+        if self.table_path and os.path.isfile(self.table_path):
+            try:
+                with open(self.table_path, 'rb') as f:
+                    self.table = cPickle.load(f).get(self.name, {})
+                log.info('Loaded %s precomputed %s prices from %s', len(self.table), self.name, self.table_path)
+            except Exception as e:
+                log.warning('Failed to load precomputed prices from %s: %s', self.table_path, e)
+
+
+def memoize_prices(price_cache):
+    """Decorator for get_prices functions which take numbers and flags and return {line: price}.
+    The key is the exact arguments, so a cached result is always the one of the same inputs. Converted lay prices
+    still hit the cache, as they are converted the same way every time.
+    Callers get their own copy of the dict, so the cached one is never modified.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = args + tuple(sorted(kwargs.iteritems())) if kwargs else args
+            prices = price_cache.get(key)
+            if prices is None:
+                prices = func(*args, **kwargs)
+                price_cache.set(key, prices)
+            return dict(prices)
+        wrapper.price_cache = price_cache
+        return wrapper
+    return decorator
+
+
+def save_price_table(table_path, price_caches):
+    """Save everything in the caches, including previously loaded tables, as the precomputed table"""
+    table = {}
+    for price_cache in price_caches:
+        table[price_cache.name] = dict(price_cache.table)
+        table[price_cache.name].update(price_cache.cache)
+
+    with open(table_path, 'wb') as f:
+        cPickle.dump(table, f, cPickle.HIGHEST_PROTOCOL)
@@ -1,10 +1,15 @@
 import math
+from arbi.constants import CROSS_HANDICAP_PRICE_CACHE_SIZE, CROSS_HANDICAP_PRICE_TABLE_PATH
+from arbi.models.calculations import get_accumulated_grid, bisect_grid
+from arbi.strats.cross_handicap_price_cache import PriceCache, memoize_prices
 
 
 startLine = 0.5
 totalIntGoals = 11
 totalTGLines = int((totalIntGoals - 1) * 4 - 2)  # (2 + (startLine - 0.5)/0.25))
 
+price_cache = PriceCache('tg', CROSS_HANDICAP_PRICE_CACHE_SIZE, CROSS_HANDICAP_PRICE_TABLE_PATH)
+
 
 def calc_ou_price(ou_prob):
     over_working_array = [0.0] * totalTGLines
@@ -52,52 +57,42 @@ def poisson_value(a, e_goal):
     return math.pow(e_goal, a) * math.exp(-e_goal) / math.factorial(a)
 
 
-def get_prices(hedge_OU, hedge_odds, sides, to_bet_bool, to_hedge_bool):
+def get_ou_prob(e_goal):
     tmp_sum = 0.0
     ou_working_array = [0.0] * totalIntGoals
-
-    index = int(math.fabs(hedge_OU / 0.25) - 2)
-
-    e = abs(hedge_OU) - 1.0
-    cnt = 0
-    iterations = 10000
-
     for i in range(0, totalIntGoals):
         if i == (totalIntGoals - 1):
             ou_working_array[i] = 1.0 - tmp_sum
         else:
-            ou_working_array[i] = poisson_value(i,e)
+            ou_working_array[i] = poisson_value(i, e_goal)
             tmp_sum += ou_working_array[i]
-    over_array, under_array = calc_ou_price(ou_working_array)
-    cnt += 1
+    return ou_working_array
+
+
+@memoize_prices(price_cache)
+def get_prices(hedge_OU, hedge_odds, sides, to_bet_bool, to_hedge_bool, tolerance=0.001):
+    """Expected goals are searched from abs(hedge_OU) - 1.0 upwards, in steps of tolerance,
+    until the price of hedge_OU reaches hedge_odds. Prices are monotonic in expected goals,
+    so the steps are bisected rather than walked one by one, which gives the same result.
+    """
+    index = int(math.fabs(hedge_OU / 0.25) - 2)
+    iterations = 10000
 
     if hedge_OU <= 0:
-        while index < len(over_array) and over_array[index] > hedge_odds and cnt <= iterations:
-            tmp_sum = 0.0
-            for i in range(0, totalIntGoals):
-                if i == (totalIntGoals - 1):
-                    ou_working_array[i] = 1.0 - tmp_sum
-                else:
-                    ou_working_array[i] = poisson_value(i,e)
-                    tmp_sum += ou_working_array[i]
-            over_array, under_array = calc_ou_price(ou_working_array)
-            e += 0.001
-            cnt += 1
+        def price_not_reached(e):
+            over_array, under_array = calc_ou_price(get_ou_prob(e))
+            return index < len(over_array) and over_array[index] > hedge_odds
     else:
-        while under_array[index] < hedge_odds and cnt <= iterations:
-            tmp_sum = 0.0
-            for i in range(0, totalIntGoals):
-                if i == totalIntGoals - 1:
-                    ou_working_array[i] = 1.0 - tmp_sum
-                else:
-                    ou_working_array[i] = poisson_value(i,e)
-                    tmp_sum += ou_working_array[i]
-            over_array, under_array = calc_ou_price(ou_working_array)
-            e += 0.001
-            cnt += 1
+        def price_not_reached(e):
+            over_array, under_array = calc_ou_price(get_ou_prob(e))
+            return under_array[index] < hedge_odds
+
+    e_grid = get_accumulated_grid(abs(hedge_OU) - 1.0, tolerance, iterations)
+    steps = bisect_grid(price_not_reached, e_grid, iterations - 1)
+    over_array, under_array = calc_ou_price(get_ou_prob(e_grid[steps]))
 
     return_dict = {}
-    if cnt < iterations:
+    if steps < iterations - 2:
         if sides != 0:
             startIndex = max(0, index - sides)
             endIndex = min(totalTGLines, index + (sides + 1))
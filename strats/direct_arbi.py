@@ -1,6 +1,9 @@
 from arbi import constants
 
-from arbi.models.calculations import calculate_stakes, convert_back_lay_prices, get_better_price_from_back_lay_prices
+from arbi.models.bookie import get_bookie_attributes_map
+from arbi.models.calculations import (calculate_stakes, convert_back_lay_prices, get_better_price_from_back_lay_prices,
+                                     may_be_arbitrage)
+from arbi.models.odds import get_sorted_prices
 from arbi.strats.strat import BaseArbiStrategy
 
 
@@ -68,6 +71,7 @@ class DirectArbiStrategy(BaseArbiStrategy):
     def spot_direct_arb_for_1or2(event_type, odds_by_category, bookie_availability_dict, bet_period, profit_threshold):
         """This is for matches with only win or lose results, e.g. basketball
         """
+        bookie_attributes_map = get_bookie_attributes_map()
         # TODO handle lay prices
         arbi_opps = []
         home_back_prices = []
@@ -79,7 +83,8 @@ class DirectArbiStrategy(BaseArbiStrategy):
         for bookie_id, bookie_odds_info in bookie_odds_id_and_info.iteritems():
             prices, receipt, last_updated = bookie_odds_info
             home_price, away_price = prices
-            if bookie_availability_dict[bookie_id][bet_period] and not bookie_id.endswith(' lay') and home_price and away_price:
+            if bookie_availability_dict[bookie_id][bet_period] and not bookie_attributes_map[bookie_id].is_lay and \
+                    home_price and away_price:
                 home_back_prices.append((bookie_id, home_price, receipt))
                 away_back_prices.append((bookie_id, away_price, receipt))
 
@@ -89,8 +94,8 @@ class DirectArbiStrategy(BaseArbiStrategy):
         for home_price_info, away_price_info in zip(home_back_prices, away_back_prices):
             home_bookie_id, home_price, home_receipt = home_price_info
             away_bookie_id, away_price, away_receipt = away_price_info
-            commission1 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[home_bookie_id], 0)
-            commission2 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[away_bookie_id], 0)
+            commission1 = bookie_attributes_map[home_bookie_id].commission
+            commission2 = bookie_attributes_map[away_bookie_id].commission
             result = calculate_stakes(home_price, away_price, commission1, commission2, profit_threshold)
             if result:
                 stake1, stake2, profit = result
@@ -110,49 +115,37 @@ class DirectArbiStrategy(BaseArbiStrategy):
 
         e.g. Home back (sbo) vs Home lay (betfair)
         """
+        bookie_attributes_map = get_bookie_attributes_map()
         arbi_opps = []
-        home_back_prices = []
-        draw_back_prices = []
-        away_back_prices = []
-        home_lay_prices_converted = []
-        draw_lay_prices_converted = []
-        away_lay_prices_converted = []
         bookie_odds_id_and_info = odds_by_category.get(None)
         if not bookie_odds_id_and_info:
             return []
 
-        for bookie_id, bookie_odds_info in bookie_odds_id_and_info.iteritems():
-            prices, receipt, last_updated = bookie_odds_info
-            home_price, draw_price, away_price = prices
-            if bookie_id in bookie_availability_dict and bookie_availability_dict[bookie_id][bet_period] and \
-                    home_price and draw_price and away_price:
-                if bookie_id.endswith(' lay'):
-                    home_lay_price_converted = convert_back_lay_prices(home_price, round_up=False)
-                    draw_lay_price_converted = convert_back_lay_prices(draw_price, round_up=False)
-                    away_lay_price_converted = convert_back_lay_prices(away_price, round_up=False)
-                    home_lay_prices_converted.append((bookie_id, home_lay_price_converted, receipt))
-                    draw_lay_prices_converted.append((bookie_id, draw_lay_price_converted, receipt))
-                    away_lay_prices_converted.append((bookie_id, away_lay_price_converted, receipt))
-                elif bookie_id in constants.BOOKIE_IDS_WITH_LAY_PRICES:
-                    pass  # we don't use it if the bookie_id could appear on lay side
-                else:
-                    home_back_prices.append((bookie_id, home_price, receipt))
-                    draw_back_prices.append((bookie_id, draw_price, receipt))
-                    away_back_prices.append((bookie_id, away_price, receipt))
+        sorted_prices = get_sorted_prices(bookie_odds_id_and_info)
+        if not any(may_be_arbitrage(sorted_prices.get_max_back_price(position),
+                                    sorted_prices.get_max_lay_price_converted(position),
+                                    constants.MAX_BOOKIE_COMMISSION, profit_threshold) for position in range(3)):
+            return []
 
+        home_lay_prices_converted, draw_lay_prices_converted, away_lay_prices_converted = [
+            sorted_prices.get_lay_prices_converted(position, bookie_availability_dict, bet_period, complete_only=True)
+            for position in range(3)]
         if not home_lay_prices_converted or not draw_lay_prices_converted or not away_lay_prices_converted:
             return []
 
-        for seq in [home_lay_prices_converted, draw_lay_prices_converted, away_lay_prices_converted,
-                    home_back_prices, draw_back_prices, away_back_prices]:
-            seq.sort(key=lambda x: x[1], reverse=True)
+        # we don't use back prices if the bookie_id could appear on lay side
+        home_back_prices, draw_back_prices, away_back_prices = [
+            [price_info for price_info in
+             sorted_prices.get_back_prices(position, bookie_availability_dict, bet_period, complete_only=True)
+             if not bookie_attributes_map[price_info[0]].has_lay_prices]
+            for position in range(3)]
 
         for back_prices, lay_prices, sub_type_flag in [(home_back_prices, home_lay_prices_converted, 'Home'),
                                                         (draw_back_prices, draw_lay_prices_converted, 'Draw'),
                                                         (away_back_prices, away_lay_prices_converted, 'Away')]:
             for (back_bookie_id, back_price, back_receipt), (lay_bookie_id, lay_price, lay_receipt) in zip(back_prices, lay_prices):
-                commission1 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[back_bookie_id], 0)
-                commission2 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[lay_bookie_id], 0)
+                commission1 = bookie_attributes_map[back_bookie_id].commission
+                commission2 = bookie_attributes_map[lay_bookie_id].commission
                 result = calculate_stakes(back_price, lay_price, commission1, commission2, profit_threshold)
                 if result:
                     stake1, stake2, profit = result
@@ -167,18 +160,26 @@ class DirectArbiStrategy(BaseArbiStrategy):
     @staticmethod
     def spot_direct_arb_for_AH_and_OU(event_type, odds_type, goal_diff, odds_by_category,
                                       bookie_availability_dict, bet_period, profit_threshold):
+        bookie_attributes_map = get_bookie_attributes_map()
         arbi_opps = []
         odds_type1 = '{} {}'.format(odds_type, {'AH': 'Home', 'OU': 'Over'}[odds_type])
         odds_type2 = '{} {}'.format(odds_type, {'AH': 'Away', 'OU': 'Under'}[odds_type])
         for handicap, bookie_odds_id_and_info in odds_by_category.iteritems():
+            # lay home price is converted to away price and vice versa
+            sorted_prices = get_sorted_prices(bookie_odds_id_and_info)
+            max_home_price = max(sorted_prices.get_max_back_price(0), sorted_prices.get_max_lay_price_converted(1))
+            max_away_price = max(sorted_prices.get_max_back_price(1), sorted_prices.get_max_lay_price_converted(0))
+            if not may_be_arbitrage(max_home_price, max_away_price, constants.MAX_BOOKIE_COMMISSION, profit_threshold):
+                continue
+
             home_prices, away_prices = DirectArbiStrategy.get_prices_by_position(bookie_odds_id_and_info,
                                                                           bookie_availability_dict, bet_period)
 
             away_handicap = handicap * -1 if odds_type == 'AH' else handicap
             for (bookie_id1, odds1, receipt1), (bookie_id2, odds2, receipt2) in zip(home_prices, away_prices):
                 if DirectArbiStrategy.is_valid(bookie_id1, bookie_id2):
-                    commission1 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[bookie_id1], 0)
-                    commission2 = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[bookie_id2], 0)
+                    commission1 = bookie_attributes_map[bookie_id1].commission
+                    commission2 = bookie_attributes_map[bookie_id2].commission
                     result = calculate_stakes(odds1, odds2, commission1, commission2, profit_threshold)
                     if result:
                         stake1, stake2, profit = result
@@ -212,8 +213,22 @@ class DirectArbiStrategy(BaseArbiStrategy):
 
     @staticmethod
     def get_prices_by_position(bookie_odds_id_and_info, bookie_availability_dict, bet_period):
-        home_prices = []  # [(bookie1, 2.1, receipt1), (bookie2, 2.0, receipt2), ...]
-        away_prices = []
+        bookie_attributes_map = get_bookie_attributes_map()
+        # [(bookie1, 2.1, receipt1), (bookie2, 2.0, receipt2), ...], already sorted in Odds
+        sorted_prices = get_sorted_prices(bookie_odds_id_and_info)
+        home_prices, away_prices = [], []
+        lay_prices_merged = False
+        for seq, position in [(home_prices, 0), (away_prices, 1)]:
+            seq.extend(price_info for price_info in
+                       sorted_prices.get_back_prices(position, bookie_availability_dict, bet_period, complete_only=True)
+                       if not bookie_attributes_map[price_info[0]].has_lay_prices)
+            # lay home price is converted to away price and vice versa
+            for price_info in sorted_prices.get_lay_prices_converted(1 - position, bookie_availability_dict, bet_period,
+                                                                     complete_only=True):
+                if not bookie_attributes_map[price_info[0]].has_lay_prices:
+                    seq.append(price_info)
+                    lay_prices_merged = True
+
         # lay_bookie_prices_dict is for bookies which can offer lay prices
         # It looks like:
         # {'7': {'7': ([1.95, 2.0], 'a!1'), '7 lay': ([1.97, 2.02], 'b!2')}}
@@ -222,29 +237,31 @@ class DirectArbiStrategy(BaseArbiStrategy):
         # e.g. for back price [x, y] and lay price [a, b],
         # we only get [x, b] if x and b are better than a and y.
         lay_bookie_prices_dict = {}
-        for bookie_id, bookie_odds_info in bookie_odds_id_and_info.iteritems():
-            prices, receipt, last_updated = bookie_odds_info
-            price1, price2 = prices
-            if bookie_id in bookie_availability_dict and bookie_availability_dict[bookie_id][bet_period] and \
-                    price1 and price2:
-                if bookie_id.endswith(' lay'):
-                    price1_tmp = convert_back_lay_prices(price1, round_up=False)
-                    price2_tmp = convert_back_lay_prices(price2, round_up=False)
-                    price1, price2 = price2_tmp, price1_tmp
-                if bookie_id.split()[0] in constants.BOOKIE_IDS_WITH_LAY_PRICES:
-                    lay_bookie_prices_dict_dict = lay_bookie_prices_dict.get(bookie_id.split()[0], {})
-                    lay_bookie_prices_dict_dict[bookie_id] = ([price1, price2], receipt)
-                    lay_bookie_prices_dict[bookie_id.split()[0]] = lay_bookie_prices_dict_dict
-                else:
-                    home_prices.append((bookie_id, price1, receipt))
-                    away_prices.append((bookie_id, price2, receipt))
-
-        only_back_or_lay_prices_dict = get_better_price_from_back_lay_prices(lay_bookie_prices_dict)
-        for home_info, away_info in only_back_or_lay_prices_dict.itervalues():
-            home_prices.append(home_info)
-            away_prices.append(away_info)
-        home_prices.sort(key=lambda x: x[1], reverse=True)
-        away_prices.sort(key=lambda x: x[1], reverse=True)
+        for base_bookie_id in constants.BOOKIE_IDS_WITH_LAY_PRICES:
+            for bookie_id in (base_bookie_id, base_bookie_id + ' lay'):
+                bookie_odds_info = bookie_odds_id_and_info.get(bookie_id)
+                if not bookie_odds_info:
+                    continue
+                prices, receipt, last_updated = bookie_odds_info
+                price1, price2 = prices
+                if bookie_id in bookie_availability_dict and bookie_availability_dict[bookie_id][bet_period] and \
+                        price1 and price2:
+                    if bookie_id.endswith(' lay'):
+                        price1_tmp = convert_back_lay_prices(price1, round_up=False)
+                        price2_tmp = convert_back_lay_prices(price2, round_up=False)
+                        price1, price2 = price2_tmp, price1_tmp
+                    lay_bookie_prices_dict.setdefault(base_bookie_id, {})[bookie_id] = ([price1, price2], receipt)
+
+        if lay_bookie_prices_dict:
+            only_back_or_lay_prices_dict = get_better_price_from_back_lay_prices(lay_bookie_prices_dict)
+            for home_info, away_info in only_back_or_lay_prices_dict.itervalues():
+                home_prices.append(home_info)
+                away_prices.append(away_info)
+                lay_prices_merged = True
+
+        if lay_prices_merged:
+            home_prices.sort(key=lambda x: x[1], reverse=True)
+            away_prices.sort(key=lambda x: x[1], reverse=True)
 
         return home_prices, away_prices
 
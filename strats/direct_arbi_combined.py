@@ -1,6 +1,6 @@
-from arbi import constants
-
+from arbi.models.bookie import get_bookie_attributes_map
 from arbi.models.calculations import calculate_stakes
+from arbi.models.odds import get_sorted_prices
 from arbi.strats.strat import BaseArbiStrategy
 
 
@@ -8,27 +8,11 @@ class DirectArbiCombinedStrategy(BaseArbiStrategy):
     # todo rewrite this strategy in pythonic way
     # todo support lay prices
     def get_top_price(self, price_dict, bookie_availability_dict, bet_period):
-        best_home_bookie_id = None
-        best_home_bookie_odds = 0
-        best_away_bookie_id = None
-        best_away_bookie_odds = 0
-        best_home_receipt = ''
-        best_away_receipt = ''
-        for bookie_id, bookie_odds_info in price_dict.iteritems():
-            if not bookie_availability_dict[bookie_id][bet_period] or bookie_id.endswith(' lay'):
-                continue
-            prices, receipt, last_updated = bookie_odds_info
-            if prices[0] > best_home_bookie_odds:
-                best_home_bookie_id = bookie_id
-                best_home_bookie_odds = prices[0]
-                best_home_receipt = receipt
-            if prices[1] > best_away_bookie_odds:
-                best_away_bookie_id = bookie_id
-                best_away_bookie_odds = prices[1]
-                best_away_receipt = receipt
-
-        if best_home_bookie_id and best_away_bookie_id:
-            return best_home_bookie_id, best_home_bookie_odds, best_home_receipt, best_away_bookie_id, best_away_bookie_odds, best_away_receipt
+        sorted_prices = get_sorted_prices(price_dict)
+        best_home_price_info = sorted_prices.get_best_back_price(0, bookie_availability_dict, bet_period)
+        best_away_price_info = sorted_prices.get_best_back_price(1, bookie_availability_dict, bet_period)
+        if best_home_price_info and best_away_price_info:
+            return best_home_price_info + best_away_price_info
 
     def hcp_checker(self, line, hcp_dict, bookie_availability_dict, bet_period):
         plus_line = line + 0.25
@@ -91,6 +75,7 @@ class DirectArbiCombinedStrategy(BaseArbiStrategy):
             return selection1, selection2, selection3, selection4
 
     def spot_arbi(self, match, bookie_availability_dict):
+        bookie_attributes_map = get_bookie_attributes_map()
         odds_dict = match.odds.odds_dict
         arbi_opps = []
         bet_period = 'running ball' if match.is_in_running else 'dead ball'
@@ -105,7 +90,7 @@ class DirectArbiCombinedStrategy(BaseArbiStrategy):
                     for bookie_id, bookie_odds_info in odds_dict[(event_type, odds_type)][handicap].iteritems():
                         prices, receipt, last_updated = bookie_odds_info
                         home_price, away_price = prices
-                        if bookie_availability_dict[bookie_id][bet_period] and not bookie_id.endswith(' lay') and home_price and away_price:
+                        if bookie_availability_dict[bookie_id][bet_period] and not bookie_attributes_map[bookie_id].is_lay and home_price and away_price:
                             home_prices.append((bookie_id, home_price, receipt))
                             away_prices.append((bookie_id, away_price, receipt))
 
@@ -117,16 +102,16 @@ class DirectArbiCombinedStrategy(BaseArbiStrategy):
                         away_bookie_id, a_price, a_receipt = a_data
 
                         if home_bookie_id != -999:
-                            h_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[home_bookie_id], 0)
+                            h_commission = bookie_attributes_map[home_bookie_id].commission
                         else:
-                            hb1_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[h_pcent_info[0]], 0)
-                            hb2_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[h_pcent_info[3]], 0)
+                            hb1_commission = bookie_attributes_map[h_pcent_info[0]].commission
+                            hb2_commission = bookie_attributes_map[h_pcent_info[3]].commission
                             h_commission = hb1_commission if hb1_commission > hb2_commission else hb2_commission
                         if away_bookie_id != -999:
-                            a_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[away_bookie_id], 0)
+                            a_commission = bookie_attributes_map[away_bookie_id].commission
                         else:
-                            ab1_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[a_pcent_info[0]], 0)
-                            ab2_commission = constants.BOOKIE_COMMISSION_MAP.get(constants.BOOKIE_ID_MAP[a_pcent_info[3]], 0)
+                            ab1_commission = bookie_attributes_map[a_pcent_info[0]].commission
+                            ab2_commission = bookie_attributes_map[a_pcent_info[3]].commission
                             a_commission = ab1_commission if ab1_commission > ab2_commission else ab2_commission
 
                         result = calculate_stakes(h_price, a_price, h_commission, a_commission, self.profit_threshold)
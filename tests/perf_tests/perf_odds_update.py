@@ -0,0 +1,27 @@
+"""
+Per update cost of Odds.update_with_dict, the same prices of a few bookies updated again and again.
+Run: python -m arbi.tests.perf_tests.perf_odds_update
+"""
+import timeit
+from arbi.models.odds import Odds
+
+
+UPDATE_COUNT = 100000
+RECORD_DICTS = [{'event_type': 'FT', 'odds_type': 'AH', 'bookie_id': bookie_id, 'bet_data': '1A!2', 'lay_flag': False,
+                 'dish': dish, 'o1': 1.9 + i % 10 / 100.0, 'o2': 2.0 - i % 10 / 100.0, 'o3': ''}
+                for i, (bookie_id, dish) in enumerate([(b, d) for d in (-0.5, 0, 0.25) for b in ('2', '5', '69')] * 10)]
+
+
+def update_odds():
+    odds = Odds(RECORD_DICTS[0])
+    for i in xrange(UPDATE_COUNT):
+        odds.update_with_dict(RECORD_DICTS[i % len(RECORD_DICTS)])
+
+
+def main():
+    elapsed = min(timeit.repeat(update_odds, number=1, repeat=3))
+    print '{} updates in {:.3f}s, {:.2f}us per update'.format(UPDATE_COUNT, elapsed, elapsed / UPDATE_COUNT * 1e6)
+
+
+if __name__ == '__main__':
+    main()
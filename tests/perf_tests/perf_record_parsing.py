@@ -0,0 +1,35 @@
+"""
+Compare parse() of update odds records to the constructor, is_valid() and post_validation_work().
+Run: python -m arbi.tests.perf_tests.perf_record_parsing
+"""
+import timeit
+from arbi.models.record import VIPUpdateOddsRecord, YYUpdateOddsRecord
+
+
+RECORD_COUNT = 50000
+VIP_RECORD_STRS = ['o{}|0|5|972960|5|4338773245!A127367|1.930|2.010|-6|0'.format(i) for i in xrange(RECORD_COUNT)]
+YY_RECORD_STRS = ['o{}|1|0|9|-2|972960|7|4338773245!A127367|2.90|3.00|3.10'.format(i) for i in xrange(RECORD_COUNT)]
+
+
+def construct_records(record_class, record_strs):
+    for record_str in record_strs:
+        record = record_class(record_str)
+        if record.is_valid():
+            record.post_validation_work()
+
+
+def parse_records(record_class, record_strs):
+    for record_str in record_strs:
+        record_class.parse(record_str)
+
+
+def main():
+    for record_class, record_strs in [(VIPUpdateOddsRecord, VIP_RECORD_STRS), (YYUpdateOddsRecord, YY_RECORD_STRS)]:
+        construct_time = min(timeit.repeat(lambda: construct_records(record_class, record_strs), number=1, repeat=3))
+        parse_time = min(timeit.repeat(lambda: parse_records(record_class, record_strs), number=1, repeat=3))
+        print '{}: {} records, constructor {:.3f}s, parse {:.3f}s'.format(
+            record_class.__name__, RECORD_COUNT, construct_time, parse_time)
+
+
+if __name__ == '__main__':
+    main()
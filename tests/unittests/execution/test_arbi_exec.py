@@ -1,12 +1,14 @@
 import socket
+from io import BytesIO
 import time
 import datetime
 import inspect
 from mock import patch, Mock
 from unittest2 import TestCase
 
-from arbi.utils import gzip_string
-from arbi.execution.arbi_exec import ArbiExecMessenger, MockMessenger, ArbiExecMsgerThreadObj, ExecMsgerConnectionError
+from arbi.utils import gzip_string, unzip_string
+from arbi.execution.arbi_exec import (ArbiExecMessenger, MockMessenger, ArbiExecMsgerThreadObj, ExecMsgerConnectionError,
+                                      ArbiExecSender)
 from arbi.models.opportunity import ArbiOpportunity
 
 
@@ -50,6 +52,22 @@ class ArbiExecTest(TestCase):
         expected_msg_head = chr(len(expected_msg_body)) + '\x00\x00\x00'
         mock_wfile.write.assert_called_with(expected_msg_head + expected_msg_body + '[END]')
 
+    def test_log_delay(self):
+        with patch('arbi.execution.arbi_exec.socket'):
+            messenger = ArbiExecMessenger('', '')
+
+        occur_at_utc = datetime.datetime(2015, 4, 15, 22, 55, 0, 1000)
+        with patch('arbi.execution.arbi_exec.datetime') as mock_datetime, \
+                patch('arbi.execution.arbi_exec.latency_stats') as mock_latency_stats, \
+                patch('arbi.execution.arbi_exec.log') as mock_log:
+            mock_datetime.datetime.utcnow.return_value = occur_at_utc + datetime.timedelta(seconds=2, milliseconds=5)
+            messenger.log_delay(3, occur_at_utc)
+
+        # not only the microseconds of the delay
+        mock_latency_stats.add.assert_called_once_with('sent', 2.005)
+        mock_log.info.assert_called_once_with(
+            '3 opportunities occurred at 2015-04-15 22:55:00.001000 are 2005 ms delayed.')
+
     def test_send_lay(self):
         with patch('arbi.execution.arbi_exec.socket'):
             messenger = ArbiExecMessenger('', '')
@@ -163,12 +181,14 @@ class ArbiExecTest(TestCase):
         messenger.check_cooldown_opps_timestamp = lambda : None
         self.assertEqual(messenger.cooldown_opps, {})
 
-        messenger.cooldown_opps = {('2', '1014182', '-1', '-1'): {'B2|4|-5': 100, 'B52|5|5': 200}}
+        messenger.cooldown_opps = {(2, '1014182', -1, -1): {'B2|4|-5': 100, 'B52|5|5': 200}}
         messenger.read_exec_msg = lambda: ['NS^1^0^2', 'NS^3^9^1', 'NS^a^b^c^d', 'XX^2^1',
                                             'NR^2^1014182^-1^-1^B2|4|-5^B3|5|5', 'NR^2^1014183^1^0^B2|4|-5']
         bookie_id_and_status = messenger.process_exec_msg()
-        self.assertEqual(bookie_id_and_status, {'bookie id and status': {'1': {'running ball': False}}})
-        self.assertEqual(messenger.cooldown_opps, {('2', '1014182', '-1', '-1'): {'B52|5|5': 200}})
+        self.assertEqual(bookie_id_and_status, {'bookie id and status': {'1': {'running ball': False}},
+                                                'released cooldown': {(2, '1014182', -1, -1): {'B2|4|-5', 'B3|5|5'},
+                                                                      (2, '1014183', 1, 0): {'B2|4|-5'}}})
+        self.assertEqual(messenger.cooldown_opps, {(2, '1014182', -1, -1): {'B52|5|5': 200}})
 
         messenger.read_exec_msg = lambda: ['NS^2^0^1', 'NS^1^1^2']
         bookie_id_and_status = messenger.process_exec_msg()
@@ -254,7 +274,7 @@ class ArbiExecTest(TestCase):
         with patch('arbi.execution.arbi_exec.socket'):
             messenger = ArbiExecMessenger('', '')
 
-        messenger.rfile.read = mock_read
+        messenger.rfile = Mock(read=mock_read)
         with self.assertRaises(ExecMsgerConnectionError):
             messenger.read_exec_msg()
 
@@ -265,7 +285,7 @@ class ArbiExecTest(TestCase):
         original_message = 'hello world !'
         packet = messenger.create_packet(original_message)
 
-        messenger.rfile.read.side_effect = [packet[:4], packet[4:-5]]
+        messenger.rfile = BytesIO(packet[:-5])
         result = messenger.read_exec_msg()
 
         self.assertEqual(result, [])
@@ -274,7 +294,7 @@ class ArbiExecTest(TestCase):
         with patch('arbi.execution.arbi_exec.socket'):
             messenger = ArbiExecMessenger('', '')
 
-        messenger.rfile.read.return_value = '' * 4
+        messenger.rfile = BytesIO('' * 4)
         result = messenger.read_exec_msg()
 
         self.assertEqual(result, [])
@@ -286,7 +306,7 @@ class ArbiExecTest(TestCase):
         original_message = 'hello world !' * 1000
         packet = messenger.create_packet(gzip_string(original_message))
 
-        messenger.rfile.read.side_effect = [packet[:4], packet[4: -5]]  # remove [END] from the end whose length is 5
+        messenger.rfile = BytesIO(packet[:-5])  # remove [END] from the end whose length is 5
         result = messenger.read_exec_msg()
 
         self.assertEqual(result, [original_message])
@@ -300,6 +320,99 @@ class ArbiExecTest(TestCase):
                 method(*args[1:])
 
 
+class ArbiExecSenderTest(TestCase):
+    def setUp(self):
+        with patch('arbi.execution.arbi_exec.socket'):
+            self.messenger = ArbiExecMessenger('', '')
+        self.messenger.wfile = Mock()
+        self.occur_at_utc = datetime.datetime(2015, 4, 15, 22, 55, 0, 1000)
+
+    def get_written_packets(self):
+        packets = [call[0][0] for call in self.messenger.wfile.write.call_args_list]
+        return [packet if packet == self.messenger.heartbeat_pkt else unzip_string(packet[4:-5]) for packet in packets]
+
+    def test_send_through_sender(self):
+        self.messenger.sender = sender = ArbiExecSender(self.messenger)
+        self.messenger.get_bet_order_list = lambda arbi_opps: ['NB^{}'.format(len(arbi_opps))]
+        opps1 = [Mock(occur_at_utc=self.occur_at_utc)]
+        opps2 = [Mock(occur_at_utc=self.occur_at_utc), Mock(occur_at_utc=self.occur_at_utc)]
+
+        self.messenger.send(opps1)
+        self.messenger.send(opps2)  # queued together, so sent in one packet
+        self.messenger.send_heartbeat()
+        self.messenger.send(opps1)
+        self.assertEqual(self.messenger.wfile.write.call_count, 0)
+
+        self.messenger.stop_sender()
+        sender.run()
+        self.assertEqual(self.get_written_packets(), ['NB^1\nNB^2', self.messenger.heartbeat_pkt, 'NB^1'])
+        self.assertEqual((sender.batch_count, sender.packet_count), (3, 3))
+        self.assertGreater(sender.stage_times['queued'], 0)
+
+    def test_coalesce_window(self):
+        sender = ArbiExecSender(self.messenger, coalesce_window=0.2)
+        sender.start()
+        sender.put_bet_orders(['NB^1'], self.occur_at_utc)
+        time.sleep(0.05)
+        sender.put_bet_orders(['NB^2'], self.occur_at_utc)
+        sender.stop()
+        sender.thread.join(1)
+
+        self.assertEqual(self.get_written_packets(), ['NB^1\nNB^2'])
+
+    def test_full_queue(self):
+        sender = ArbiExecSender(self.messenger, queue_size=2)
+        for i in range(3):
+            sender.put_bet_orders(['NB^{}'.format(i)], self.occur_at_utc)
+        sender.stop()
+        sender.run()
+
+        self.assertEqual(self.get_written_packets(), ['NB^0\nNB^1'])
+        self.assertEqual(sender.dropped_batch_count, 1)
+
+    def test_dropped_opps_out_of_cooldown(self):
+        self.messenger.sender = ArbiExecSender(self.messenger, queue_size=1)
+        match_info = {'match_id': '001', 'home_team_score': 0, 'away_team_score': 0, 'is_in_running': True}
+        opp1 = ArbiOpportunity(match_info, self.occur_at_utc, '1',
+                               (0.02, (('AH Home', -0.5, 'FT', '1', 49, 2.08, 'a!A1', False),
+                                       ('AH Away', 0.5, 'FT', '2', 51, 2.02, 'b!B2', False))))
+        opp2 = ArbiOpportunity(match_info, self.occur_at_utc, '1',
+                               (0.01, (('AH Home', -0.75, 'FT', '3', 49, 2.07, 'c!C3', False),
+                                       ('AH Away', 0.75, 'FT', '4', 51, 2.01, 'd!D4', False))))
+
+        self.assertTrue(self.messenger.send(self.messenger.filter_by_bookie_cooldown([opp1])))
+        cooldown_opps = {key: dict(bookie_price_dict) for key, bookie_price_dict in self.messenger.cooldown_opps.items()}
+        self.assertFalse(self.messenger.send(self.messenger.filter_by_bookie_cooldown([opp2])))  # the queue is full
+        self.assertEqual(self.messenger.sender.dropped_batch_count, 1)
+        self.assertEqual(self.messenger.cooldown_opps, cooldown_opps)
+
+    def test_connection_error(self):
+        sender = ArbiExecSender(self.messenger)
+        self.messenger.wfile.write.side_effect = socket.error
+        sender.put_packet(self.messenger.heartbeat_pkt)
+        sender.put_packet(self.messenger.heartbeat_pkt)
+        sender.run()  # stopped by the error
+
+        self.assertEqual(sender.packet_count, 0)
+        with self.assertRaises(ExecMsgerConnectionError):
+            sender.put_packet(self.messenger.heartbeat_pkt)
+
+    def test_connection_error_with_batches_queued(self):
+        sender = ArbiExecSender(self.messenger, coalesce_window=0)
+        self.messenger.wfile.write.side_effect = socket.error
+        sender.put_bet_orders(['NB^1'], self.occur_at_utc)
+        sender.put_packet(self.messenger.heartbeat_pkt)
+        sender.put_bet_orders(['NB^2'], self.occur_at_utc)
+        sender.put_bet_orders(['NB^3'], self.occur_at_utc)
+        with patch('arbi.execution.arbi_exec.log') as mock_log:
+            sender.run()  # stopped by the error
+
+        self.assertEqual(self.messenger.wfile.write.call_count, 1)
+        self.assertEqual(sender.dropped_batch_count, 3)
+        self.assertTrue(sender.queue.empty())
+        mock_log.error.assert_called_with('Lost connection to execution system. Dropped 3 batches of bet orders.')
+
+
 class ArbiExecMsgerThreadObjTest(TestCase):
     def test_create_exec_messenger(self):
         thread_obj = ArbiExecMsgerThreadObj(None, True, True)
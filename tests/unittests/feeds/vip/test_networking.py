@@ -8,6 +8,7 @@ from arbi.feeds.base_feed import FeedConnectionError
 from arbi.constants import ROOT_PATH
 from arbi.tests.utils import simplify_dict
 from arbi.models.record import VIPUpdateOddsRecord, MatchInfoRecord, InitOddsRecord
+from arbi.models.engine import DataEngine
 
 
 class VIPFeedThreadObjTest(TestCase):
@@ -82,12 +83,37 @@ class VIPFeedThreadObjTest(TestCase):
         init_dict = source_queue.get()
         self.assertEqual(len(init_dict), 1)
         self.assertIn('101', init_dict)
+        self.assertIsNone(init_dict['101'].odds)
+
+        engine = DataEngine()
+        engine.init_match_dict(init_dict)
+        engine.update_match_dict(source_queue.get())
         expected_odds_dict = {
             ('FT', 'OU'): {2.5: {'2': ([1.84, 2.1], '0!A', mock.ANY)}},
             ('FT', 'AH'): {0.5: {'5': ([1.94, 2.0], '1!A', mock.ANY)}},
             ('FT', '1x2'): {None: {'7': ([2.99, 2.95, 2.9], '2!A', mock.ANY)}},
         }
         self.assertEqual(init_dict['101'].odds.odds_dict, expected_odds_dict)
+        self.assertEqual(engine.pop_dirty_match_dict(),
+                         {'101': {('FT', 'OU', 2.5), ('FT', 'AH', 0.5), ('FT', '1x2', None)}})
+
+    def test_iter_initial_packet(self):
+        packet = [
+            'O0|4|101|2|0!A|1.840|2.100|10.0',
+            'M101||Europa Cup||||Wolfsburg||||Napoli|||||1|0|0|1h 5|||',
+            'O0|5|101|5|1!A|1.940|2.000|2.0',
+            'O0|5|102|5|1!A|1.940|2.000|2.0',  # unknown match
+            'O0|0|101|7|2!A|2.990|2.950|2.900',
+        ]
+        thread_obj = self.ceate_thread_obj()
+
+        with mock.patch('arbi.feeds.vip.networking.INIT_ODDS_CHUNK_SIZE', 2):
+            init_items = list(thread_obj.iter_initial_packet(packet))
+
+        self.assertEqual(len(init_items), 3)
+        self.assertEqual(init_items[0].keys(), ['101'])
+        self.assertEqual([[record.record_str for record in record_list] for record_list in init_items[1:]],
+                         [[packet[0], packet[2]], [packet[4]]])
 
     def test_do_not_support_basketball(self):
         data = ['M1135514|35|NBA|NBA|NBA|799|L.A. Clippers|Kuai Chuan|Kuai Ting|821|A.Hawks|Lao Ying|Ying Dui|2016-03-06 11:30:00|#ff0000|1|0|0||1|-1|-1',
@@ -153,6 +179,37 @@ class VIPFeedThreadObjTest(TestCase):
         self.assertFalse(thread_obj.update_vip_update_id(record))
         self.assertEqual(thread_obj.vip_data_update_id_dict, {'972960': 11866})
 
+    def test_clear_finished_match_update_ids(self):
+        thread_obj = self.ceate_thread_obj(use_mock_data=False)
+        template = 'M{}|02|A Cup|A Cup|A Cup|03|Team A|Team A|Team A|04|Team B|Team B|Team B|{}|#6F00DD|0|0|0||1|-1|-1'
+        self.assertTrue(thread_obj.update_vip_update_id(MatchInfoRecord(template.format('001', '2015-04-17 03:05:00'))))
+        self.assertTrue(thread_obj.update_vip_update_id(MatchInfoRecord(template.format('002', '2099-04-17 03:05:00'))))
+        self.assertTrue(thread_obj.update_vip_update_id(
+            VIPUpdateOddsRecord('o11866|0|0|001|5|4338773245!A127367|1.750|3.550|4.100')))
+
+        thread_obj.clear_finished_match_update_ids()  # not the time yet
+        self.assertEqual(thread_obj.vip_data_update_id_dict, {'001': 11866, '002': 0})
+
+        thread_obj.update_ids_last_cleared -= 600
+        thread_obj.get_update_record_list([])
+        self.assertEqual(thread_obj.vip_data_update_id_dict, {'002': 0})
+
+    def test_get_update_record_list(self):
+        thread_obj = self.ceate_thread_obj(use_mock_data=False)
+        thread_obj.vip_data_update_id_dict = {'972960': 11865}
+        packet = ['o11866|0|5|972960|5|4338773245!A127367|1.750|2.150|-2|0',
+                  'o11866|0|5|972960|5|4338773245!A127367|1.750|2.150|-2|0',  # out of date
+                  'o11867|0|7|972960|5|4338773245!A127367|1.750|3.550|4.100|0',  # unknown odds type
+                  'o11868|0|0|972960|5|4338773245!A127367|1.750|3.550|4.100',  # no lay flag
+                  'p1234567']
+
+        record_list = thread_obj.get_update_record_list(packet)
+
+        self.assertEqual([record.record_dict['update_id'] for record in record_list], [11866, 11868])
+        self.assertEqual([record.prices for record in record_list], [[1.75, 2.15], [1.75, 3.55, 4.1]])
+        self.assertEqual(record_list[0].record_dict['dish'], -0.5)
+        self.assertEqual(thread_obj.vip_data_update_id_dict, {'972960': 11868})
+
 
 class VIPFeedTest(TestCase):
     def test(self):
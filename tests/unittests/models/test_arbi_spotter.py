@@ -1,10 +1,13 @@
 import time
 import datetime
+from Queue import Queue
 from multiprocessing.pool import AsyncResult
 
 import mock
 from unittest2 import TestCase
 
+from arbi import constants
+from arbi.models.odds import Odds
 from arbi.models.arbi_spotter import ArbiSpotter
 from arbi.strats.direct_arbi import DirectArbiStrategy
 from arbi.strats.correlated_arbi import AHvsXvs2Strategy
@@ -96,6 +99,73 @@ class ArbiSpotterTest(TestCase):
         self.assertEqual(arbi_summary, expected)
 
 
+    def test_spot_arbi_with_dirty_match_ids(self):
+        match1 = mock.MagicMock(id='001')
+        match1.info = self.match_info
+        match1.odds.odds_dict = {
+            ('FT', 'AH'): {0.5: {'1': ([2.05, 1.90], 'a!A1', time.time()),
+                                  '5': ([1.95, 2.00], 'c!A3', time.time()),
+                                 }
+                           }
+        }
+        match2 = mock.MagicMock(id='002')
+        match2.info = dict(self.match_info, match_id='002')
+        match2.odds.odds_dict = {}
+        match_dict = {'001': match1, '002': match2}
+        for match in match_dict.itervalues():
+            match.odds.remove_expired_prices.return_value = False
+            match.odds.get_oldest_update_time.return_value = None
+
+        spotter = ArbiSpotter(match_dict, profit_threshold=profit_threshold)
+        spotter.initialize_strats()
+        arbi_opps = spotter.spot_arbi({'002': set()})  # full scan for the first time
+        self.assertEqual([opp.match_info['match_id'] for opp in arbi_opps], ['001'])
+        self.assertEqual(spotter.arbi_opps_tracker.get_updated_opps(), arbi_opps)
+
+        # match1 is not scanned again but its opps are kept
+        match1.odds.odds_dict = {}
+        first_arbi_opps = arbi_opps
+        arbi_opps = spotter.spot_arbi({'002': set()})
+        self.assertEqual([opp.match_info['match_id'] for opp in arbi_opps], ['001'])
+        self.assertIs(arbi_opps[0], first_arbi_opps[0])
+        self.assertEqual(spotter.arbi_opps_tracker.get_updated_opps(), [])
+
+        arbi_opps = spotter.spot_arbi({'001': set()})
+        self.assertEqual(arbi_opps, [])
+
+        match1.odds.odds_dict = {
+            ('FT', 'AH'): {0.5: {'1': ([2.05, 1.90], 'a!A1', time.time()),
+                                  '5': ([1.95, 2.00], 'c!A3', time.time()),
+                                 }
+                           }
+        }
+        self.assertEqual(len(spotter.spot_arbi({'001': set()})), 1)
+
+        # removed match should not have opps
+        match_dict.pop('001')
+        self.assertEqual(spotter.spot_arbi({}), [])
+
+    def test_spot_arbi_full_scan_required(self):
+        match = mock.MagicMock(id='001')
+        match.info = self.match_info
+        match.odds.odds_dict = {}
+        match.odds.remove_expired_prices.return_value = False
+        match.odds.get_oldest_update_time.return_value = None
+        spotter = ArbiSpotter({'001': match}, profit_threshold=profit_threshold)
+        spotter.initialize_strats()
+        spotter.apply_strats = mock.Mock(return_value={})
+
+        spotter.spot_arbi({})
+        spotter.apply_strats.assert_called_once_with([match])
+
+        spotter.spot_arbi({})
+        spotter.apply_strats.assert_called_with([])
+
+        spotter.full_scan_required = True
+        spotter.spot_arbi({})
+        spotter.apply_strats.assert_called_with([match])
+
+
 class ArbiSpotterMiscTest(TestCase):
     def test_selected_strats(self):
         menu_bar_model = mock.Mock()
@@ -105,6 +175,20 @@ class ArbiSpotterMiscTest(TestCase):
 
         self.assertEqual(spotter.selected_strats_str, {'DirectArbiStrategy', 'CrossHandicapArbiStrategy'})
 
+    def test_cross_handicap_pool_only_for_async(self):
+        menu_bar_model = mock.Mock()
+        menu_bar_model.strats_panel_model.get_enabled_strats.return_value = [CrossHandicapArbiStrategy]
+        menu_bar_model.strats_panel_model.use_async_for_cross_handicap_arb = False
+        spotter = ArbiSpotter({}, menu_bar_model=menu_bar_model)
+
+        with mock.patch('arbi.models.arbi_spotter.Pool') as mock_pool_class:
+            spotter.initialize_strats()
+            self.assertIsNone(spotter.cross_handicap_strat_pool)
+
+            menu_bar_model.strats_panel_model.use_async_for_cross_handicap_arb = True
+            spotter.initialize_strats()
+        self.assertIs(spotter.cross_handicap_strat_pool, mock_pool_class.return_value)
+
     def test_default_strats(self):
         defaults = {'DirectArbiStrategy', 'AHvsXvs2Strategy', 'AHvs2Strategy'}
         spotter = ArbiSpotter({})
@@ -126,61 +210,53 @@ class ArbiSpotterMethodsTest(TestCase):
         self.bookie_availability_dict = {bookie: {flag: True for flag in ['dead ball', 'running ball']}
                                          for bookie in ['b1', 'b2', 'b3', 'b7', 'b7 lay']}
 
-    def test_check_running_ball_prices_expiry(self):
-        t = time.time()
-        match = mock.Mock()
-        match.odds.odds_dict = {
-            ('FT', 'AH'): {0.5: {'b1': ([2.05, 1.90], 'a!A1', t),
-                                  'b2': ([2.00, 1.95], 'b!A2', 678.90),
-                                  'b3': ([1.95, 2.00], 'c!A3', 246.84),
-                                 }
-                           }
-        }
-
-        spotter = ArbiSpotter({'101': match})
-
-        spotter.check_running_ball_prices_expiry(match.odds.odds_dict)
-        expected_odds_dict = {('FT', 'AH'): {0.5: {'b1': ([2.05, 1.90], 'a!A1', t)}}}
-        self.assertEqual(match.odds.odds_dict, expected_odds_dict)
-
-    def test_check_rb_prices_expiry(self):
+    @staticmethod
+    def make_odds(updated_at_by_bookie_id):
+        odds = None
+        for bookie_id, updated_at in sorted(updated_at_by_bookie_id.iteritems()):
+            record_dict = {'event_type': 'FT', 'odds_type': 'AH', 'bookie_id': bookie_id, 'bet_data': 'a!A1',
+                           'dish': 0.5, 'o1': 2.05, 'o2': 1.90, 'o3': None, 'lay_flag': False}
+            with mock.patch('time.time', return_value=updated_at):
+                if odds is None:
+                    odds = Odds(record_dict)
+                else:
+                    odds.update_with_dict(record_dict)
+        return odds
+
+    def test_remove_expired_rb_prices(self):
         t = time.time()
-        b1_odds_info = ([2.05, 1.90], 'a!A1', t)
-        b2_odds_info = ([2.00, 1.95], 'b!A2', 67.9)
-        b3_odds_info = ([2.05, 1.90], 'a!A1', t)
-        b4_odds_info = ([2.00, 1.95], 'b!A2', 67.9)
-        match1 = mock.Mock(is_in_running=True, id='101')
-        match1.info = mock.MagicMock()
-        match1.odds.odds_dict = {
-            ('FT', 'AH'): {0.5: {'b1': b1_odds_info,
-                                  'b2': b2_odds_info,
-                                 }
-                           }
-        }
-
-        match2 = mock.Mock(is_in_running=False, id='102')
-        match2.info = mock.MagicMock()
-        match2.odds.odds_dict = {
-            ('FT', 'AH'): {0.5: {'b1': b3_odds_info,
-                                  'b2': b4_odds_info,
-                                 }
-                           }
-        }
-
-        spotter = ArbiSpotter({'101': match1, '102': match2})
-        spotter.last_rb_prices_expiry_checked -= 10
-        # spotter.apply_strats = mock.Mock(return_value=[])
-        spotter.apply_strats_in_parallel = mock.Mock(return_value={})
-        old_last_rb_prices_expiry_checked = spotter.last_rb_prices_expiry_checked
-
-        spotter.spot_arbi()
-
-        expected_odds_dict1 = {('FT', 'AH'): {0.5: {'b1': b1_odds_info}}}
-        expected_odds_dict2 = {('FT', 'AH'): {0.5: {'b1': b3_odds_info,
-                                                     'b2': b4_odds_info}}}
-        self.assertEqual(match1.odds.odds_dict, expected_odds_dict1)
-        self.assertEqual(match2.odds.odds_dict, expected_odds_dict2)
-        self.assertTrue(spotter.last_rb_prices_expiry_checked > old_last_rb_prices_expiry_checked)
+        match1 = mock.Mock(is_in_running=True, id='101', info=mock.MagicMock())
+        match1.odds = self.make_odds({'1': t, '2': 67.9, '5': t - 10})
+        match2 = mock.Mock(is_in_running=False, id='102', info=mock.MagicMock())
+        match2.odds = self.make_odds({'1': t, '2': 67.9})
+        match3 = mock.Mock(is_in_running=True, id='103', info=mock.MagicMock())
+        match3.odds = self.make_odds({'1': t - 5})
+
+        spotter = ArbiSpotter({'101': match1, '102': match2, '103': match3})
+        spotter.apply_strats = mock.Mock(return_value={})
+        spotter.full_scan_required = False
+        with mock.patch('time.time', return_value=t):
+            spotter.spot_arbi({'101': set(), '102': set(), '103': set()})
+
+        self.assertEqual(match1.odds.odds_dict, {('FT', 'AH'): {0.5: {'1': ([2.05, 1.90], 'a!A1', t),
+                                                                       '5': ([2.05, 1.90], 'a!A1', t - 10)}}})
+        self.assertEqual(match2.odds.odds_dict, {('FT', 'AH'): {0.5: {'1': ([2.05, 1.90], 'a!A1', t),
+                                                                       '2': ([2.05, 1.90], 'a!A1', 67.9)}}})
+        self.assertEqual(len(match3.odds.odds_dict[('FT', 'AH')][0.5]), 1)
+        # when the price updated 10 seconds ago expires
+        self.assertEqual(spotter.next_rb_prices_expiry, t - 10 + constants.RB_PRICE_EXPIRY_TIME)
+
+        # the matches not updated are only looked at when due
+        with mock.patch('time.time', return_value=t - 7 + constants.RB_PRICE_EXPIRY_TIME):
+            spotter.spot_arbi(set())
+
+        self.assertEqual(match1.odds.odds_dict, {('FT', 'AH'): {0.5: {'1': ([2.05, 1.90], 'a!A1', t)}}})
+        self.assertEqual(len(match3.odds.odds_dict[('FT', 'AH')][0.5]), 1)
+        # the match with expired prices is scanned again
+        self.assertEqual(spotter.apply_strats.call_args[0][0], [match1])
+        self.assertEqual(spotter.next_rb_prices_expiry, t - 5 + constants.RB_PRICE_EXPIRY_TIME)
+        self.assertEqual(spotter.rb_prices_expiry_by_id, {'101': t + constants.RB_PRICE_EXPIRY_TIME,
+                                                          '103': t - 5 + constants.RB_PRICE_EXPIRY_TIME})
 
     def test_update_raw_opps_dict(self):
         raw_opps_dict = {
@@ -213,6 +289,62 @@ class ArbiSpotterMethodsTest(TestCase):
         self.assertEqual(result, raw_opps_dict)
 
 
+    def get_spotter_with_strat_workers(self, strat, matches):
+        spotter = ArbiSpotter({match.id: match for match in matches})
+        spotter.selected_strats_name_map = {'DirectArbiStrategy': strat}
+        spotter.strat_workers = [mock.Mock(worker_id=worker_id, strat_names=['DirectArbiStrategy'])
+                                 for worker_id in xrange(2)]
+        for worker in spotter.strat_workers:
+            worker.submit.return_value = 3
+            worker.match_snapshot.full_snapshot_required = False
+        spotter.strat_result_queue = Queue()
+        return spotter
+
+    def test_apply_strats_in_parallel(self):
+        match1 = mock.Mock(id='001', odds=True, info=True)  # shard 1
+        match2 = mock.Mock(id='004', odds=True, info=True)  # shard 0
+        spotter = self.get_spotter_with_strat_workers(mock.Mock(id='1'), [match1, match2])
+        spotter.strat_result_queue.put((1, 2, 'DirectArbiStrategy', {'001': {'1': ['stale']}}))
+        spotter.strat_result_queue.put((1, 3, 'DirectArbiStrategy', {'001': {'1': ['opp1']}}))
+        spotter.strat_result_queue.put((0, 3, 'DirectArbiStrategy', {'004': {'1': ['opp2']}}))
+
+        result = spotter.apply_strats_in_parallel([match1, match2], {'001', '004'})
+
+        self.assertEqual(result, {'001': {'1': ['opp1']}, '004': {'1': ['opp2']}})
+        spotter.strat_workers[0].submit.assert_called_once_with(
+            spotter.match_dict, {'001', '004'}, ['004'], spotter.bookie_availability_dict)
+        spotter.strat_workers[1].submit.assert_called_once_with(
+            spotter.match_dict, {'001', '004'}, ['001'], spotter.bookie_availability_dict)
+
+    def test_apply_strats_in_parallel_replica_out_of_sync(self):
+        strat = mock.Mock(id='1')
+        strat.spot_arbi.return_value = ['opp']
+        match = mock.Mock(id='001', odds=True, info=True)  # shard 1
+        spotter = self.get_spotter_with_strat_workers(strat, [match])
+        spotter.strat_result_queue.put((1, 3, None, None))
+        spotter.strat_result_queue.put((0, 3, 'DirectArbiStrategy', {}))
+
+        result = spotter.apply_strats_in_parallel([match], {'001'})
+
+        self.assertEqual(result, {'001': {'1': ['opp']}})
+        self.assertTrue(spotter.strat_workers[1].match_snapshot.full_snapshot_required)
+        self.assertFalse(spotter.strat_workers[0].match_snapshot.full_snapshot_required)
+
+    def test_apply_strats_in_parallel_workers_time_out(self):
+        strat = mock.Mock(id='1')
+        strat.spot_arbi.return_value = ['opp']
+        match = mock.Mock(id='001', odds=True, info=True)
+        spotter = self.get_spotter_with_strat_workers(strat, [match])
+        workers = spotter.strat_workers
+
+        with mock.patch('arbi.constants.STRAT_WORKER_TIMEOUT', 0.01):
+            result = spotter.apply_strats_in_parallel([match], {'001'})
+
+        self.assertEqual(result, {'001': {'1': ['opp']}})
+        self.assertEqual(spotter.strat_workers, [])
+        for worker in workers:
+            worker.stop.assert_called_once_with()
+
     # def test_apply_strats_in_parallel(self):
     #     mock_strat_class1 = mock.Mock(__name__='1')
     #     mock_strat_class2 = mock.Mock(__name__='2')
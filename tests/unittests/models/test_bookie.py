@@ -0,0 +1,31 @@
+import mock
+from unittest2 import TestCase
+from arbi.models.bookie import get_bookie_attributes_map
+
+
+class BookieAttributesMapTest(TestCase):
+    def test_bookie_attributes(self):
+        bookie_attributes_map = get_bookie_attributes_map()
+        lay_attributes = bookie_attributes_map['7 lay']
+        self.assertEqual((lay_attributes.base_bookie_id, lay_attributes.is_lay, lay_attributes.commission),
+                         ('7', True, -0.02))
+        self.assertTrue(lay_attributes.has_lay_prices)
+        self.assertFalse(bookie_attributes_map['7'].is_traditional_ah)
+
+        sbobet_attributes = bookie_attributes_map['2']
+        self.assertEqual((sbobet_attributes.is_lay, sbobet_attributes.commission), (False, 0.0025))
+        self.assertTrue(sbobet_attributes.is_traditional_ah)
+        self.assertFalse(sbobet_attributes.has_lay_prices)
+
+        self.assertEqual(bookie_attributes_map['10'].commission, 0)  # a bookie we don't bet
+        self.assertIs(get_bookie_attributes_map()['2'], sbobet_attributes)
+
+    def test_bookie_attributes_map_follows_constants(self):
+        self.assertEqual(get_bookie_attributes_map()['2'].commission, 0.0025)
+
+        with mock.patch('arbi.constants.BOOKIE_COMMISSION_MAP', {'sbobet': 0.005}):
+            self.assertEqual(get_bookie_attributes_map()['2'].commission, 0.005)
+        with mock.patch('arbi.constants.BOOKIE_IDS_WITH_LAY_PRICES', ['2']):
+            self.assertTrue(get_bookie_attributes_map()['2 lay'].has_lay_prices)
+
+        self.assertEqual(get_bookie_attributes_map()['2'].commission, 0.0025)
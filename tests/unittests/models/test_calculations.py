@@ -1,6 +1,8 @@
+import random
 from unittest2 import TestCase
 from arbi.models.calculations import calculate_stakes, calculate_stakes_new, convert_back_lay_prices, \
-    get_better_price_from_back_lay_prices
+    get_better_price_from_back_lay_prices, get_accumulated_grid, bisect_grid, may_be_arbitrage, \
+    may_be_3_way_arbitrage
 
 
 profit_threshold = 0.01
@@ -102,6 +104,34 @@ class StakeCalculationTest(TestCase):
         self.assertEqual(result, expected)
 
 
+class MayBeArbitrageTest(TestCase):
+    def test_may_be_arbitrage(self):
+        self.assertTrue(may_be_arbitrage(2.02, 2.02, profit_threshold=profit_threshold))
+        self.assertFalse(may_be_arbitrage(2.02, 2.01, profit_threshold=profit_threshold))
+        self.assertFalse(may_be_arbitrage(0, 5.0, profit_threshold=profit_threshold))
+
+    def test_never_false_if_lower_odds_are_arbitrage(self):
+        random.seed(0)
+        for i in xrange(10000):
+            odds1, odds2 = random.uniform(1.01, 4.0), random.uniform(1.01, 4.0)
+            commission1, commission2 = random.choice([0, 0.0075, -0.02]), random.choice([0, 0.0075, -0.02])
+            if calculate_stakes(odds1, odds2, commission1, commission2, profit_threshold) is not None:
+                max_odds1, max_odds2 = odds1 + random.choice([0, 0.01]), odds2 + random.choice([0, 0.01])
+                self.assertTrue(may_be_arbitrage(max_odds1, max_odds2, 0.0075, profit_threshold))
+
+    def test_may_be_3_way_arbitrage(self):
+        self.assertTrue(may_be_3_way_arbitrage(3.1, 3.1, 3.1, profit_threshold=profit_threshold))
+        self.assertFalse(may_be_3_way_arbitrage(3.0, 3.0, 3.0, profit_threshold=profit_threshold))
+        self.assertFalse(may_be_3_way_arbitrage(3.1, 0, 3.1, profit_threshold=profit_threshold))
+
+        random.seed(0)
+        for i in xrange(10000):
+            prices = [random.uniform(2.5, 3.5) for j in xrange(3)]
+            commissions = [random.choice([0, 0.0075, -0.02]) for j in xrange(3)]
+            if calculate_stakes_new(*(prices + commissions + [profit_threshold])) is not None:
+                self.assertTrue(may_be_3_way_arbitrage(*(prices + [0.0075, profit_threshold])))
+
+
 class NewStakeCalculationTest(TestCase):
 
     def test_calculate_stakes_new_no_arb(self):
@@ -234,3 +264,30 @@ class GetBetterPriceFromBackLayPricesTest(TestCase):
             'b7': [('b7 lay', 1.95, 'b!2'), ('b7 lay', 2.0, 'b!2')]
         }
         self.assertEqual(result, expected)
+
+
+class BisectGridTest(TestCase):
+    def test_get_accumulated_grid(self):
+        grid = get_accumulated_grid(1.0, 0.001, 2000)
+        e = 1.0
+        for _ in range(1500):
+            e += 0.001
+        self.assertEqual(len(grid), 2001)
+        self.assertEqual(grid[1500], e)
+
+    def test_bisect_grid(self):
+        grid = range(100)
+        called = []
+
+        def condition(x):
+            called.append(x)
+            return x < 37
+
+        self.assertEqual(bisect_grid(condition, grid), 37)
+        self.assertLess(len(called), 10)
+
+    def test_bisect_grid_condition_never_true(self):
+        self.assertEqual(bisect_grid(lambda x: x > 5, range(100)), 0)
+
+    def test_bisect_grid_condition_always_true(self):
+        self.assertEqual(bisect_grid(lambda x: True, range(100), 50), 50)
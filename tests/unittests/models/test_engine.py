@@ -4,6 +4,7 @@ from Queue import Queue
 from unittest2 import TestCase
 from arbi.models.engine import DataEngine
 from arbi.feeds.vip.networking import VIPFeedThreadObj
+from arbi.models.record import MatchInfoRecord, VIPUpdateOddsRecord
 
 
 class DataEngineTest(TestCase):
@@ -80,29 +81,65 @@ class DataEngineTest(TestCase):
     def test_clear_unneeded_matches(self):
         engine = DataEngine()
         then = datetime.datetime.utcnow() - datetime.timedelta(minutes=15)
-        match1 = Mock(match_info_last_updated=then, info={
-            'running_time': '2h 47', 'league_name': 'A', 'home_team_name': 't1', 'away_team_name': 't2'})
-        match2 = Mock(match_info_last_updated=then, info={
-            'running_time': 'ht', 'league_name': 'A', 'home_team_name': 't3', 'away_team_name': 't4'})
-        match3 = Mock(match_info_last_updated=then, info={
-            'running_time': '1h 30', 'league_name': 'A', 'home_team_name': 't5', 'away_team_name': 't6'})
-        engine.match_dict = {'001': match1, '002': match2, '003': match3}
+        today = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        match1 = Mock(match_info_last_updated=then, odds=None, is_in_running=True, info={
+            'running_time': '2h 47', 'league_name': 'A', 'home_team_name': 't1', 'away_team_name': 't2',
+            'match_hk_time': today})
+        match2 = Mock(match_info_last_updated=then, odds=None, is_in_running=True, info={
+            'running_time': 'ht', 'league_name': 'A', 'home_team_name': 't3', 'away_team_name': 't4',
+            'match_hk_time': today})
+        match3 = Mock(match_info_last_updated=then, odds=None, is_in_running=True, info={
+            'running_time': '1h 30', 'league_name': 'A', 'home_team_name': 't5', 'away_team_name': 't6',
+            'match_hk_time': today})
+        match4 = Mock(match_info_last_updated=then, odds=None, is_in_running=False, info={
+            'running_time': '', 'league_name': 'B', 'home_team_name': 't7', 'away_team_name': 't8',
+            'match_hk_time': '2015-04-17 03:05:00'})
+        engine.init_match_dict({'001': match1, '002': match2, '003': match3, '004': match4})
         engine.last_clear_time = then
 
         engine.clear_unneeded_matches()
         expected = {'002': match2, '003': match3}
         self.assertEqual(engine.match_dict, expected)
+        self.assertEqual(engine.in_running_match_ids, {'002', '003'})
+        self.assertEqual((engine.finishing_match_ids, len(engine.kickoff_index)), (set(), 2))
+
+    def test_clear_unneeded_matches_follows_match_info(self):
+        template = 'M001|02|A Cup|A Cup|A Cup|03|Team A|Team A|Team A|04|Team B|Team B|Team B|{}|#6F00DD|1|1|0|{}|1|-1|-1'
+        today = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        engine = DataEngine()
+        engine.update_match_dict([MatchInfoRecord(template.format(today, '2h 46'))])
+        self.assertEqual((engine.in_running_match_ids, engine.finishing_match_ids), ({'001'}, {'001'}))
+
+        # injury time is not over if the match info is still updated
+        engine.last_clear_time = datetime.datetime.utcnow() - datetime.timedelta(minutes=15)
+        engine.clear_unneeded_matches()
+        self.assertIn('001', engine.match_dict)
+
+        # a match is no longer a candidate once its running time changes, e.g. when the feed corrects it
+        engine.update_match_dict([MatchInfoRecord(template.format(today, '2h 30'))])
+        self.assertEqual(engine.finishing_match_ids, set())
+        engine.match_dict['001'].match_info_last_updated -= datetime.timedelta(minutes=15)
+        engine.last_clear_time = datetime.datetime.utcnow() - datetime.timedelta(minutes=15)
+        engine.clear_unneeded_matches()
+        self.assertIn('001', engine.match_dict)
+
+        # the kickoff time can be changed too, e.g. for a postponed match
+        engine.update_match_dict([MatchInfoRecord(template.format('2015-04-17 03:05:00', '2h 30'))])
+        engine.last_clear_time = datetime.datetime.utcnow() - datetime.timedelta(minutes=15)
+        engine.clear_unneeded_matches()
+        self.assertEqual((engine.match_dict, engine.in_running_match_ids), ({}, set()))
 
     def test_clear_in_running_matches(self):
         engine = DataEngine()
-        match1 = Mock(is_in_running=False)
-        match2 = Mock(is_in_running=True)
-        match3 = Mock(is_in_running=True)
-        engine.match_dict = {'001': match1, '002': match2, '003': match3}
+        match1 = Mock(is_in_running=False, info=None, odds=None)
+        match2 = Mock(is_in_running=True, info=None, odds=None)
+        match3 = Mock(is_in_running=True, info=None, odds=None)
+        engine.init_match_dict({'001': match1, '002': match2, '003': match3})
 
         engine.clear_in_running_matches()
         expected = {'001': match1}
         self.assertEqual(engine.match_dict, expected)
+        self.assertEqual(engine.in_running_match_ids, set())
 
     def test_match_dict_update_scores_correctly(self):
         template = 'M1078200|396|Ger U19|\xb5\xc2U19\xc1\xaa|\xb5\xc2U19\xc2\x93|12340|Freiburg U19|\xb8\xa5\xc0\xd7\xb1\xa4U19|\xd9M\xc0\xd7\xb1\xa4U19|12203|Mainz U19|\xc3\xc0\xd2\xf0\xb4\xc4U19|\xbe\x92\xb6\xf7\xcb\xb9U19|2015-11-07 18:00:00|#9966CC|1|{}|{}|{}|1|0|0'
@@ -136,3 +173,43 @@ class DataEngineTest(TestCase):
             self.assertEqual(info['home_team_score'], home_score)
             self.assertEqual(info['away_team_score'], away_score)
             self.assertEqual(info['running_time'], match_time)
+
+    def test_dirty_match_dict(self):
+        engine = DataEngine()
+        match1 = Mock(info=None)
+        match1.odds.get_markets.return_value = [('FT', 'AH', 0.5)]
+        match2 = Mock(info=None, odds=None)
+        engine.init_match_dict({'001': match1, '002': match2})
+        self.assertEqual(engine.pop_dirty_match_dict(), {'001': {('FT', 'AH', 0.5)}, '002': set()})
+        self.assertEqual(engine.pop_dirty_match_dict(), {})
+
+        odds_record = Mock(record_dict={'match_id': '001'})
+        match1.update_with_record.return_value = ('FT', 'OU', 2.5)
+        ignored_odds_record = Mock(record_dict={'match_id': '002'})
+        match2.update_with_record.return_value = None
+        unknown_match_record = Mock(record_dict={'match_id': '003'})
+        engine.update_match_dict([odds_record, ignored_odds_record, unknown_match_record])
+
+        self.assertEqual(engine.pop_dirty_match_dict(), {'001': {('FT', 'OU', 2.5)}})
+
+    def test_coalesce_record_lists(self):
+        def odds_record(match_id, bookie_id, lay_flag=False, dish=0.5):
+            return Mock(spec=VIPUpdateOddsRecord, record_dict={
+                'match_id': match_id, 'event_type': 'FT', 'odds_type': 'AH', 'dish': dish, 'bookie_id': bookie_id,
+                'lay_flag': lay_flag})
+
+        record1 = odds_record('001', '7')
+        record2 = odds_record('001', '7', lay_flag=True)
+        record3 = odds_record('001', '7')  # supersedes record1
+        record4 = odds_record('002', '7')
+        match_info_record = Mock(spec=MatchInfoRecord, record_dict={'match_id': '002'})
+        record5 = odds_record('002', '7')  # does not supersede record4 as the scores could have changed
+        record6 = odds_record('001', '7', dish=0.75)
+        record7 = odds_record('001', '7')  # supersedes record3
+
+        engine = DataEngine()
+        record_lists = [[record1, record2], {'003': Mock()}, [record3, record4, match_info_record], None,
+                        [record5, record6, record7]]
+        self.assertEqual(engine.coalesce_record_lists(record_lists),
+                         [record2, record4, match_info_record, record5, record6, record7])
+        self.assertEqual((engine.update_count, engine.coalesced_update_count), (7, 2))
@@ -0,0 +1,66 @@
+import cPickle
+import mock
+from unittest2 import TestCase
+from arbi.models.latency import LatencyHistogram, LatencyStats, StampedRecordList, stamp_record_lists
+
+
+class StampedRecordListTest(TestCase):
+    def test_stamp_record_lists(self):
+        record_list = StampedRecordList(['record1'], {'read': 100.0})
+        with mock.patch('time.time', return_value=100.5):
+            stamp_record_lists([record_list, {'001': 'match1'}, ['record2']], 'dequeued')
+
+        self.assertEqual(record_list, ['record1'])
+        self.assertEqual(record_list.stamps, {'read': 100.0, 'dequeued': 100.5})
+
+    def test_pickle(self):
+        record_list = StampedRecordList(['record1'], {'read': 100.0})
+        record_list = cPickle.loads(cPickle.dumps(record_list, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual((record_list, record_list.stamps), (['record1'], {'read': 100.0}))
+
+
+class LatencyStatsTest(TestCase):
+    def test_histogram_percentiles(self):
+        histogram = LatencyHistogram()
+        for ms in xrange(1, 101):
+            histogram.add(ms)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.max, 100)
+        # percentiles are the bucket bounds, which are within 19% above
+        for percentile in [50, 90, 99]:
+            self.assertTrue(percentile <= histogram.get_percentile(percentile) <= percentile * 1.19)
+        self.assertEqual(histogram.get_percentile(100), 100)
+
+        histogram.add(10 ** 6)  # over the last bucket
+        self.assertEqual(histogram.get_percentile(100), 10 ** 6)
+
+    def test_add_stamps(self):
+        stats = LatencyStats()
+        stats.add_stamps({'read': 100.0, 'parsed': 100.001, 'enqueued': 100.001, 'dequeued': 100.011,
+                          'applied': 100.012, 'spotted': 101.512})
+        stats.add_stamps({'enqueued': 200.0, 'dequeued': 200.002})  # split by the shard router, not from a feed
+
+        stats = stats.get_stats()
+        self.assertItemsEqual(stats.keys(), ['parsed', 'enqueued', 'dequeued', 'applied', 'spotted', 'total'])
+        self.assertEqual(stats['dequeued']['count'], 2)
+        self.assertAlmostEqual(stats['dequeued']['max'], 10, places=3)
+        self.assertAlmostEqual(stats['spotted']['p50'], 1500, places=3)
+        self.assertAlmostEqual(stats['total']['max'], 1512, places=3)
+        self.assertEqual(stats['enqueued']['p99'], 0)
+
+    def test_log_if_due(self):
+        with mock.patch('time.time', return_value=1000):
+            stats = LatencyStats(log_interval=60)
+        stats.add('sent', 0.05)
+
+        with mock.patch('time.time', return_value=1059), mock.patch('arbi.models.latency.log') as mock_log:
+            self.assertFalse(stats.log_if_due())
+        self.assertEqual(mock_log.info.called, 0)
+
+        with mock.patch('time.time', return_value=1060), mock.patch('arbi.models.latency.log') as mock_log:
+            self.assertTrue(stats.log_if_due())
+        mock_log.info.assert_called_once_with(
+            'Latency of sent: 1 samples, p50 50.0, p90 50.0, p99 50.0 ms, max 50.0 ms')
+        self.assertEqual(stats.get_stats(), {})
+        self.assertEqual(stats.last_logged, 1060)
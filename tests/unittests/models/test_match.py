@@ -1,5 +1,5 @@
 from unittest2 import TestCase
-from arbi.models.match import Match
+from arbi.models.match import Match, KickoffIndex
 from arbi.models.record import MatchInfoRecord
 
 
@@ -51,3 +51,21 @@ class MatchTest(TestCase):
         record_new = MatchInfoRecord(new_str)
 
         self.assertFalse(match.in_running_match_scored(record_new))
+
+
+class KickoffIndexTest(TestCase):
+    def test_pop_kicked_off_before(self):
+        kickoff_index = KickoffIndex()
+        kickoff_index.set_kickoff('001', '2016-05-16 20:00:00')
+        kickoff_index.set_kickoff('002', '2016-05-16 19:30:00')
+        kickoff_index.set_kickoff('003', '2016-05-17 03:00:00')
+        kickoff_index.set_kickoff('002', '2016-05-16 19:30:00')
+        kickoff_index.set_kickoff('001', '2016-05-17 01:00:00')  # postponed
+        kickoff_index.set_kickoff('004', '2016-05-16 18:00:00')
+        kickoff_index.discard('004')
+        self.assertEqual(len(kickoff_index), 3)
+
+        self.assertEqual(kickoff_index.pop_kicked_off_before('2016-05-16 20:30:00'), ['002'])
+        self.assertEqual(kickoff_index.pop_kicked_off_before('2016-05-17 02:00:00'), ['001'])
+        self.assertEqual(len(kickoff_index), 1)
+        self.assertEqual(kickoff_index.heap, [('2016-05-17 03:00:00', '003')])
@@ -0,0 +1,61 @@
+from unittest2 import TestCase
+from arbi.models.match_snapshot import MatchSnapshotWriter, MatchReplica
+
+
+class MatchSnapshotTest(TestCase):
+    def setUp(self):
+        self.writer = MatchSnapshotWriter(size=64)
+        self.replica = MatchReplica()
+
+    def tearDown(self):
+        if self.replica.mm:
+            self.replica.mm.close()
+        self.writer.close()
+
+    def test_full_snapshot(self):
+        path, generation = self.writer.write({'001': 'match1', '002': 'match2'})
+
+        self.assertEqual(generation, 1)
+        self.assertTrue(self.replica.update(path, generation))
+        self.assertEqual(self.replica.match_dict, {'001': 'match1', '002': 'match2'})
+        self.assertEqual(self.replica.generation, 1)
+
+    def test_delta_snapshot(self):
+        match_dict = {'001': 'match1', '002': 'match2'}
+        self.replica.update(*self.writer.write(match_dict))
+
+        match_dict['001'] = 'match1 updated'
+        match_dict.pop('002')
+        match_dict['003'] = 'match3'
+        path, generation = self.writer.write(match_dict, updated_match_ids={'001', '003', '004'})
+
+        self.assertTrue(self.replica.update(path, generation))
+        self.assertEqual(self.replica.match_dict, {'001': 'match1 updated', '003': 'match3'})
+        self.assertEqual(self.writer.match_ids, {'001', '003'})
+
+    def test_missed_generation(self):
+        match_dict = {'001': 'match1'}
+        self.replica.update(*self.writer.write(match_dict))
+        self.writer.write(match_dict, updated_match_ids={'001'})
+
+        match_dict['001'] = 'match1 updated'
+        path, generation = self.writer.write(match_dict, updated_match_ids={'001'})
+        self.assertFalse(self.replica.update(path, generation))
+        self.assertEqual(self.replica.generation, 1)
+
+        self.writer.full_snapshot_required = True
+        path, generation = self.writer.write(match_dict, updated_match_ids={'001'})
+        self.assertTrue(self.replica.update(path, generation))
+        self.assertEqual(self.replica.match_dict, {'001': 'match1 updated'})
+
+    def test_snapshot_grows(self):
+        self.replica.update(*self.writer.write({'001': 'match1'}))
+        old_path = self.writer.path
+
+        match_dict = {'001': 'match1', '002': 'x' * 1000}
+        path, generation = self.writer.write(match_dict, updated_match_ids={'002'})
+
+        self.assertNotEqual(path, old_path)
+        self.assertTrue(self.writer.size >= 1000)
+        self.assertTrue(self.replica.update(path, generation))
+        self.assertEqual(self.replica.match_dict, match_dict)
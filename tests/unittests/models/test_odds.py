@@ -1,6 +1,7 @@
+import cPickle
 from mock import patch
 from unittest2 import TestCase
-from arbi.models.odds import Odds
+from arbi.models.odds import Odds, BookieOddsDict, BookieOddsInfo, get_sorted_prices
 
 class OddsTest(TestCase):
     def setUp(self):
@@ -83,6 +84,45 @@ class OddsTest(TestCase):
         }
         self.assertEqual(odds.odds_dict, expected_odds_dict)
 
+    def test_remove_expired_prices(self):
+        with patch('time.time', return_value=100):
+            odds = Odds(self.init_record_dict)
+            odds.update_with_dict(self.update_record_dict1)
+        with patch('time.time', return_value=110):
+            odds.update_with_dict(self.update_record_dict3)
+            odds.update_with_dict(dict(self.init_record_dict, o1=2.02))  # updated again since
+
+        self.assertEqual(odds.get_oldest_update_time(), 100)
+        self.assertFalse(odds.remove_expired_prices(100))
+        self.assertTrue(odds.remove_expired_prices(105))
+        expected_odds_dict = {
+            ('FT', 'AH'): {
+                -0.5: {
+                    '2': ([2.02, 1.95], 'abc!A123', 110),
+                    '5': ([1.95, 2.0], 'abf!A126', 110),
+                },
+            },
+            ('HT', '1x2'): {None: {}},
+        }
+        self.assertEqual(odds.odds_dict, expected_odds_dict)
+        self.assertEqual(odds.get_oldest_update_time(), 110)
+
+        odds.odds_dict[('FT', 'AH')][-0.5].pop('5')
+        self.assertTrue(odds.remove_expired_prices(111))
+        self.assertFalse(odds.remove_expired_prices(111))
+        self.assertIsNone(odds.get_oldest_update_time())
+
+    def test_expiry_heap_is_rebuilt(self):
+        with patch('arbi.models.odds.RB_PRICE_EXPIRY_HEAP_MIN_SIZE', 4), patch('time.time', return_value=99):
+            odds = Odds(self.init_record_dict)
+            for i in xrange(10):
+                with patch('time.time', return_value=100 + i):
+                    odds.update_with_dict(self.update_record_dict1 if i % 2 else self.update_record_dict3)
+
+        self.assertLessEqual(len(odds.expiry_heap), 6)
+        self.assertTrue(odds.remove_expired_prices(200))
+        self.assertEqual(odds.odds_dict, {('FT', 'AH'): {-0.5: {}}, ('HT', '1x2'): {None: {}}})
+
     def test_update_betfair_odds(self):
         """betfair AH odds is different from traditional bookies - it doesn't count current scores.
         """
@@ -183,6 +223,48 @@ class OddsTest(TestCase):
         odds_details = odds.get_odds_details(dict_with_unknown_bookie_id)
         self.assertIsNone(odds_details)
 
+    def test_sorted_prices_updated_with_dict(self):
+        odds = Odds(self.init_record_dict)
+        record_dict = dict(self.init_record_dict, bookie_id='69', bet_data='abf!A126', o1=2.1, o2=1.85)
+        odds.update_with_dict(record_dict)
+        sorted_prices = get_sorted_prices(odds.odds_dict[('FT', 'AH')][-0.5])
+        self.assertEqual(sorted_prices.get_back_prices(0), [('69', 2.1, 'abf!A126'), ('2', 2.0, 'abc!A123')])
+        self.assertEqual(sorted_prices.get_back_prices(1), [('2', 1.95, 'abc!A123'), ('69', 1.85, 'abf!A126')])
+
+        record_dict = dict(self.init_record_dict, bet_data='abg!A127', o1=2.2, o2=1.8)
+        odds.update_with_dict(record_dict)
+        self.assertEqual(sorted_prices.get_back_prices(0), [('2', 2.2, 'abg!A127'), ('69', 2.1, 'abf!A126')])
+        self.assertEqual(sorted_prices.get_best_back_price(1), ('69', 1.85, 'abf!A126'))
+        bookie_availability_dict = {'2': {'dead ball': True}, '69': {'dead ball': False}}
+        self.assertEqual(sorted_prices.get_best_back_price(1, bookie_availability_dict, 'dead ball'),
+                         ('2', 1.8, 'abg!A127'))
+
+        odds.odds_dict[('FT', 'AH')][-0.5].pop('2')
+        self.assertEqual(sorted_prices.get_back_prices(0), [('69', 2.1, 'abf!A126')])
+
+    def test_sorted_prices_lay(self):
+        bookie_odds_dict = BookieOddsDict({
+            '1': BookieOddsInfo([2.0, 0], 'a!1', 0),
+            '7 lay': BookieOddsInfo([3.0, 1.5], 'b!2', 0),
+        })
+        sorted_prices = get_sorted_prices(bookie_odds_dict)
+        self.assertEqual(sorted_prices.get_back_prices(0), [('1', 2.0, 'a!1')])
+        self.assertEqual(sorted_prices.get_back_prices(0, complete_only=True), [])
+        self.assertEqual(sorted_prices.get_lay_prices_converted(0), [('7 lay', 1.5, 'b!2')])
+        self.assertEqual(sorted_prices.get_lay_prices_converted(1), [('7 lay', 3.0, 'b!2')])
+        self.assertEqual(sorted_prices.get_best_price(0), ('7 lay', 3.0, 'b!2'))
+        self.assertIsNone(sorted_prices.get_best_price(2))
+        self.assertEqual(sorted_prices.get_max_back_price(0), 2.0)
+        self.assertEqual(sorted_prices.get_max_back_price(1), 0)
+        self.assertEqual(sorted_prices.get_max_lay_price_converted(1), 3.0)
+        self.assertEqual(sorted_prices.get_max_lay_price_converted(2), 0)
+
+    def test_bookie_odds_dict_pickle(self):
+        bookie_odds_dict = BookieOddsDict({'1': BookieOddsInfo([2.0, 1.9], 'a!1', 0)})
+        unpickled = cPickle.loads(cPickle.dumps(bookie_odds_dict, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(unpickled, {'1': ([2.0, 1.9], 'a!1', 0)})
+        self.assertEqual(unpickled.sorted_prices.get_back_prices(1), [('1', 1.9, 'a!1')])
+
     # def test_get_odds_details_unknown_odds_type(self):
     #     odds = Odds(self.init_record_dict)
     #     dict_with_unknown_odds_type = {
@@ -0,0 +1,99 @@
+import datetime
+import mock
+from unittest2 import TestCase
+from arbi.models.opportunity import ArbiOpportunity, ArbiOppsTracker, get_opp_key
+
+
+class ArbiOppsTrackerTest(TestCase):
+    def setUp(self):
+        self.match_info = {
+            'match_id': '001', 'league_name': 'A Cup', 'league_name_simp': 'A Cup',
+            'home_team_name': 'A', 'home_team_name_simp': 'A', 'away_team_name': 'B', 'away_team_name_simp': 'B',
+            'home_team_score': 0, 'away_team_score': 0, 'is_in_running': True,
+            'match_hk_time': '2016-05-16 20:00:00', 'running_time': '1h 5',
+        }
+        self.match_dict = {'001': mock.Mock(info=self.match_info)}
+        self.time1 = datetime.datetime(2016, 5, 16, 12, 5)
+        self.time2 = datetime.datetime(2016, 5, 16, 12, 6)
+
+    @staticmethod
+    def get_raw_opp(profit, home_odds, bookie_id='2'):
+        return profit, (('AH', 'home', 'FT', '1', 100, 2.05, 'a!A1', False),
+                        ('AH', 'away', 'FT', bookie_id, 100, home_odds, 'b!A2', False))
+
+    def test_update_with_raw_opps(self):
+        tracker = ArbiOppsTracker()
+        raw_opp1 = self.get_raw_opp(0.02, 2.1)
+        raw_opp2 = self.get_raw_opp(0.01, 2.05, '5')
+        arbi_opps = tracker.update_with_raw_opps({'001': {'1': [raw_opp2, raw_opp1]}}, self.match_dict, self.time1)
+        opp1, opp2 = arbi_opps
+        self.assertEqual((opp1.opportunity, opp2.opportunity), (raw_opp1, raw_opp2))
+        self.assertEqual(tracker.get_updated_opps(), [opp1, opp2])
+
+        # found again with the same prices
+        self.assertIs(tracker.update_with_raw_opps({'001': {'1': [raw_opp1, raw_opp2]}}, self.match_dict, self.time2),
+                      arbi_opps)
+        self.assertEqual((tracker.diff, opp1.occur_at_utc), (([], [], []), self.time1))
+
+        # opp2 at another price, opp1 withdrawn, and a new opp of another strat
+        raw_opp3 = self.get_raw_opp(0.015, 2.07, '5')
+        raw_opp4 = self.get_raw_opp(0.03, 2.15)
+        arbi_opps = tracker.update_with_raw_opps({'001': {'1': [raw_opp3], '3': [raw_opp4]}}, self.match_dict,
+                                                 self.time2)
+        opp3, opp4 = tracker.diff.changed[0], tracker.diff.new[0]
+        self.assertEqual((opp3.opportunity, opp3.occur_at_utc, opp4.strat_id), (raw_opp3, self.time2, '3'))
+        self.assertEqual(tracker.diff.withdrawn, [opp1])
+        self.assertEqual(arbi_opps, [opp4, opp3])
+        self.assertEqual(tracker.get_updated_opps(), [opp4, opp3])
+
+        # match info changed, e.g. running time
+        self.match_dict['001'].info = dict(self.match_info, running_time='1h 6')
+        tracker.update_with_raw_opps({'001': {'1': [raw_opp3], '3': [raw_opp4]}}, self.match_dict, self.time2)
+        self.assertEqual([opp.match_info['running_time'] for opp in tracker.diff.changed], ['1h 6', '1h 6'])
+
+    def test_update_with_same_bets_in_a_scan(self):
+        tracker = ArbiOppsTracker()
+        raw_opps = [self.get_raw_opp(0.02, 2.1), self.get_raw_opp(0.01, 2.05)]
+        self.assertEqual(get_opp_key('001', '1', raw_opps[0]), get_opp_key('001', '1', raw_opps[1]))
+
+        arbi_opps = tracker.update_with_raw_opps({'001': {'1': raw_opps}}, self.match_dict, self.time1)
+        self.assertEqual([arbi_opp.opportunity for arbi_opp in arbi_opps], raw_opps)
+
+    def test_update(self):
+        tracker = ArbiOppsTracker()
+        opp1 = ArbiOpportunity(self.match_info, self.time1, '1', self.get_raw_opp(0.02, 2.1))
+        opp2 = ArbiOpportunity(self.match_info, self.time1, '1', self.get_raw_opp(0.01, 2.05, '5'))
+        self.assertEqual(tracker.update([opp2, opp1]), [opp1, opp2])
+
+        # e.g. the same opps unpickled from a shard
+        opp1_copy = ArbiOpportunity(self.match_info, self.time2, '1', self.get_raw_opp(0.02, 2.1))
+        opp2_changed = ArbiOpportunity(self.match_info, self.time2, '1', self.get_raw_opp(0.015, 2.07, '5'))
+        self.assertEqual(tracker.update([opp1_copy, opp2_changed]), [opp1, opp2_changed])
+        self.assertIs(tracker.arbi_opps[0], opp1)
+        self.assertEqual(tracker.diff, ([], [opp2_changed], []))
+
+        tracker.update([])
+        self.assertEqual(tracker.arbi_opps, [])
+        self.assertItemsEqual(tracker.diff.withdrawn, [opp1, opp2_changed])
+
+    def test_forget(self):
+        tracker = ArbiOppsTracker()
+        opp1 = ArbiOpportunity(self.match_info, self.time1, '1', self.get_raw_opp(0.02, 2.1))
+        opp2 = ArbiOpportunity(self.match_info, self.time1, '1', self.get_raw_opp(0.01, 2.05, '5'))
+        tracker.update([opp1, opp2])
+
+        tracker.forget([opp1])
+        self.assertEqual(tracker.arbi_opps, [opp2])
+        self.assertTrue(tracker.has_forgotten_opps)
+
+        # found again unchanged, it is new
+        opp1_copy = ArbiOpportunity(self.match_info, self.time2, '1', self.get_raw_opp(0.02, 2.1))
+        tracker.update([opp1_copy, opp2])
+        self.assertEqual(tracker.diff, ([opp1_copy], [], []))
+        self.assertEqual(tracker.get_updated_opps(), [opp1_copy])
+        self.assertFalse(tracker.has_forgotten_opps)
+
+        # withdrawn if not found again
+        tracker.clear()
+        tracker.update([opp2])
+        self.assertEqual(tracker.diff, ([opp2], [], [opp1_copy]))
@@ -1,3 +1,5 @@
+import cPickle
+import datetime
 from mock import patch, ANY
 from Queue import Queue
 from unittest2 import TestCase
@@ -5,7 +7,7 @@ from arbi.models.engine import DataEngine
 from arbi.models.match import Match
 from arbi.feeds.vip.networking import VIPFeedThreadObj
 from arbi.feeds.betfair.feed import BetfairFeedThreadObj
-from arbi.models.record import MatchInfoRecord
+from arbi.models.record import MatchInfoRecord, InitOddsRecord, VIPUpdateOddsRecord, YYUpdateOddsRecord
 
 
 class RecordTest(TestCase):
@@ -74,5 +76,96 @@ class RecordTest(TestCase):
         thread_obj.start(thread_daemon=False)
 
         expected_odds_dict = {('FT', '1or2'): {None: {'5': ([1.83, 2.17], '1624750!B21698258', ANY)}}}
-        init_dict = source_queue.get()
-        self.assertEqual(init_dict['1135514'].odds.odds_dict, expected_odds_dict)
+        engine = DataEngine()
+        engine.init_match_dict(source_queue.get())
+        engine.update_match_dict(source_queue.get())  # init odds records come after the init dict
+        self.assertEqual(engine.match_dict['1135514'].odds.odds_dict, expected_odds_dict)
+
+    def test_odds_record(self):
+        record = VIPUpdateOddsRecord('o123|1|5|001|69|1A!2|1.93|2.01|-6')
+        self.assertTrue(record.is_valid())
+        record.post_validation_work()
+
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual((record.record_dict['event_type'], record.record_dict['odds_type']), ('HT', 'AH'))
+        self.assertEqual((record.record_dict['dish'], record.prices), (-1.5, [1.93, 2.01]))
+
+        record.timestamp = datetime.datetime(2016, 5, 16, 14, 27, 43, 987000)
+        record = cPickle.loads(cPickle.dumps(record, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(record.timestamp, datetime.datetime(2016, 5, 16, 14, 27, 43, 987000))
+        self.assertEqual(record.prices, [1.93, 2.01])
+
+    def test_odds_record_with_unknown_odds_type(self):
+        record = VIPUpdateOddsRecord('o123|1|7|001|69|1A!2|1.93|2.01|-6')
+        self.assertFalse(record.is_valid())
+
+    def assert_parsed_like_constructed(self, record_class, record_str):
+        parsed = record_class.parse(record_str)
+        record = record_class(record_str)
+        self.assertTrue(record.is_valid())
+        record.post_validation_work()
+
+        self.assertEqual(parsed.record_str, record.record_str)
+        self.assertEqual(parsed.record_dict, record.record_dict)
+        self.assertEqual(parsed.prices, record.prices)
+        parsed.post_validation_work()
+        self.assertEqual(parsed.record_dict, record.record_dict)
+        return parsed
+
+    def test_parse_vip_update_odds_record(self):
+        parsed = self.assert_parsed_like_constructed(VIPUpdateOddsRecord, 'o123|1|5|001|69|1A!2|1.93|2.01|-6|0')
+        self.assertEqual((parsed.record_dict['update_id'], parsed.record_dict['dish']), (123, -1.5))
+        self.assertEqual(parsed.prices, [1.93, 2.01])
+
+        parsed = self.assert_parsed_like_constructed(VIPUpdateOddsRecord, 'o124|0|0|001|69|1A!2|1.93|3.50|4.20|1')
+        self.assertEqual((parsed.record_dict['dish'], parsed.record_dict['lay_flag']), (None, True))
+        self.assertEqual(parsed.prices, [1.93, 3.5, 4.2])
+
+        # too big odds
+        parsed = self.assert_parsed_like_constructed(VIPUpdateOddsRecord, 'o125|0|4|001|69|1A!2|51|1.01|10|0')
+        self.assertEqual(parsed.prices, [0, 1.01])
+
+    def test_parse_init_odds_record(self):
+        parsed = self.assert_parsed_like_constructed(InitOddsRecord, 'O1|5|001|69|1A!2|1.93|2.01|-6|0')
+        self.assertEqual((parsed.record_dict['event_type'], parsed.record_dict['dish']), ('HT', -1.5))
+
+        parsed = self.assert_parsed_like_constructed(InitOddsRecord,
+                                                     'O0|6|1135514|5|1624750!B21698258|1.830|2.170|0.000|0')
+        self.assertEqual((parsed.record_dict['odds_type'], parsed.record_dict['dish']), ('1or2', None))
+        self.assertEqual(parsed.prices, [1.83, 2.17])
+
+        self.assertIsNone(InitOddsRecord.parse('O1|7|001|69|1A!2|1.93|2.01|-6|0'))  # unknown odds type
+        self.assertIsNone(InitOddsRecord.parse('O0|6|1135514|5|1624750!B21698258|1.830|2.170|0.000'))  # no lay flag
+
+    def test_parse_yy_update_odds_record(self):
+        parsed = self.assert_parsed_like_constructed(YYUpdateOddsRecord,
+                                                     'o11866|1|0|9|-2|972960|7|4338773245!A127367|2.90|3.00|3.10')
+        self.assertEqual((parsed.record_dict['dish'], parsed.record_dict['lay_flag']), (-0.5, True))
+        self.assertEqual(parsed.prices, [2.9, 3.0, 3.1])
+
+        parsed = self.assert_parsed_like_constructed(YYUpdateOddsRecord, 'o11867|0|0|0||972960|7|1A!2|2.90|3.00|3.10')
+        self.assertEqual((parsed.record_dict['dish'], parsed.record_dict['update_id']), (None, '11867'))
+
+    def test_parse_falls_back_to_constructor(self):
+        for record_str in ['o123|1|7|001|69|1A!2|1.93|2.01|-6|0',  # unknown odds type
+                           'o123|2|5|001|69|1A!2|1.93|2.01|-6|0',  # unknown event type
+                           'o123|1|9|001|69|1A!2|1.93|2.01|-6|0',  # EH is unknown for VIP data
+                           'o123|1|5|001|69|1A!2|1.93|2.01||0',  # no dish
+                           'o123|1|5|001|69|1A!2||2.01|-6|0',  # no odds
+                           'o123|1|5|001|69|1A!2|x|2.01|-6|0',
+                           'o123|1|5|001|69|1A!2|1.93|2.01|-6',  # no lay flag
+                           'o\xff|1|5|001|69|1A!2|1.93|2.01|-6|0']:
+            self.assertIsNone(VIPUpdateOddsRecord.parse(record_str), record_str)
+
+        self.assertIsNone(YYUpdateOddsRecord.parse('o11866|1|0|9|-2|972960|7|4338773245!A127367|2.90|3.00'))
+
+    def test_only_match_info_records_are_decoded(self):
+        match_record = MatchInfoRecord('M972960|891|Europa Cup|\xc5\xb7\xc1\xaa\xb1\xad|Europa Cup|1348|Wolfsburg|Wolfsburg|Wolfsburg|1012|Napoli|Napoli|Napoli|2015-04-17 03:05:00|#6F00DD|0|0|0||1|-1|-1')
+        self.assertIsInstance(match_record.record_str, unicode)
+        self.assertEqual(match_record.record_dict['league_name_simp'], u'\u6b27\u8054\u676f')
+
+        for record in [VIPUpdateOddsRecord('o123|1|5|972960|69|1A!2|1.93|2.01|-6'),
+                       VIPUpdateOddsRecord.parse('o123|1|5|972960|69|1A!2|1.93|2.01|-6|0'),
+                       YYUpdateOddsRecord.parse('o11866|1|0|9|-2|972960|7|1A!2|2.90|3.00|3.10')]:
+            self.assertIsInstance(record.record_str, str)
+            self.assertIn(record.record_dict['match_id'], {match_record.record_dict['match_id']: None})
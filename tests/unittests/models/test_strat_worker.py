@@ -0,0 +1,59 @@
+import mock
+from Queue import Queue
+from unittest2 import TestCase
+from arbi.models.match_snapshot import MatchSnapshotWriter
+from arbi.models.strat_worker import StratWorker, run_strat_worker, get_shard_index
+
+
+class StratWorkerTest(TestCase):
+    def setUp(self):
+        self.strat = mock.Mock(id='1')
+        self.strat.spot_arbi.return_value = ['opp']
+        self.match_snapshot = MatchSnapshotWriter()
+
+    def tearDown(self):
+        self.match_snapshot.close()
+
+    def test_get_shard_index(self):
+        shard_indexes = {get_shard_index(str(match_id), 4) for match_id in xrange(100)}
+        self.assertEqual(shard_indexes, {0, 1, 2, 3})
+        self.assertEqual(get_shard_index('001', 4), get_shard_index('001', 4))
+
+    def test_run_strat_worker(self):
+        match_dict = {'001': 'match1'}
+        task_queue = Queue()
+        result_queue = Queue()
+        path, generation = self.match_snapshot.write(match_dict)
+        task_queue.put((path, generation, ['001', '002'], {}))
+        task_queue.put((path, generation + 1, ['001'], {}))  # the snapshot has not got this generation
+        task_queue.put(None)
+
+        with mock.patch('arbi.models.strat_worker.run_one_strat', return_value={'001': {'1': ['opp']}}) as mock_run:
+            run_strat_worker(2, {'DirectArbiStrategy': self.strat}, task_queue, result_queue)
+
+        mock_run.assert_called_once_with(['match1'], self.strat, {})
+        self.assertEqual(result_queue.get_nowait(), (2, 1, 'DirectArbiStrategy', {'001': {'1': ['opp']}}))
+        self.assertEqual(result_queue.get_nowait(), (2, 2, None, None))
+        self.assertTrue(result_queue.empty())
+
+    def test_submit_writes_only_matches_of_the_shard(self):
+        match_dict = {str(match_id): match_id for match_id in xrange(10)}
+        worker = StratWorker(1, 2, {'DirectArbiStrategy': self.strat}, Queue())
+        worker.match_snapshot = mock.Mock(full_snapshot_required=True)
+        worker.match_snapshot.write.return_value = ('path', 1)
+        worker.task_queue = Queue()
+
+        generation = worker.submit(match_dict, {'1', '2'}, ['1'], {})
+        worker.match_snapshot.full_snapshot_required = False
+        worker.submit(match_dict, {'1', '2'}, ['1'], {})
+
+        self.assertEqual(generation, 1)
+        shard_match_dict = {match_id: match for match_id, match in match_dict.iteritems()
+                            if get_shard_index(match_id, 2) == 1}
+        shard_updated_match_ids = [match_id for match_id in ['1', '2'] if get_shard_index(match_id, 2) == 1]
+        self.assertEqual(worker.match_snapshot.write.call_args_list, [
+            mock.call(shard_match_dict, None),
+            mock.call(match_dict, mock.ANY),
+        ])
+        self.assertEqual(sorted(worker.match_snapshot.write.call_args_list[1][0][1]), shard_updated_match_ids)
+        self.assertEqual(worker.task_queue.get_nowait(), ('path', 1, ['1'], {}))
@@ -1,6 +1,7 @@
 import mock
 from unittest2 import TestCase
 
+from arbi.models.calculations import convert_back_lay_prices
 from arbi.strats.correlated_arbi import AHvsXvs2Strategy, AHvs2Strategy
 
 profit_threshold = 0.01
@@ -275,6 +276,26 @@ class AHvsXvs2StrategyMethodTest(TestCase):
         ]
         self.assertEqual(opps, expected_opps)
 
+    def test_lay_opp_at_the_profit_threshold(self, _):
+        x_lay_price_converted = convert_back_lay_prices(2.23, round_up=False)
+        threshold = 2.24 * x_lay_price_converted / (2.24 + x_lay_price_converted) - 1
+        match = mock.MagicMock()
+        match.info = {'home_team_score': 0, 'away_team_score': 0}
+        match.odds.odds_dict = {
+            ('FT', 'AH'): {-0.5: {'b1': ([2.24, 1.70], 'a!', 1.2)}},
+            ('FT', '1x2'): {None: {'b4 lay': ([2.23, 3.40, 3.40], 'f!', 3.4)}},
+        }
+        expected_arbi_opps = [(0.00201, (('AH Home', -0.5, 'FT', 'b1', 44.7, 2.24, 'a!', False),
+                                         ('1x2', 'Home', 'FT', 'b4', 55.3, 2.23, 'f!', True)))]
+
+        self.assertEqual(AHvsXvs2Strategy(threshold).spot_arbi(match, self.bookie_availability_dict),
+                         expected_arbi_opps)
+        self.assertEqual(AHvsXvs2Strategy(threshold + 1e-12).spot_arbi(match, self.bookie_availability_dict), [])
+        # the same opps as without pruning
+        arb = AHvsXvs2Strategy(threshold)
+        with mock.patch.object(arb, 'may_be_arbitrage', return_value=True):
+            self.assertEqual(arb.spot_arbi(match, self.bookie_availability_dict), expected_arbi_opps)
+
 
 @mock.patch('arbi.constants.BOOKIE_ID_MAP', return_value=mock_bookie_id_map)
 class AHvs2StrategyTest(TestCase):
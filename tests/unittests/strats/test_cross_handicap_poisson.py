@@ -0,0 +1,31 @@
+from unittest2 import TestCase
+
+from arbi.strats import cross_handicap_hcp_prices
+from arbi.strats.cross_handicap_poisson import poisson_pmf, score_matrix, sum_score_masses, get_score_masses
+
+
+class CrossHandicapPoissonTest(TestCase):
+    def test_poisson_pmf(self):
+        result = poisson_pmf(1.5, 4)
+        expected = [cross_handicap_hcp_prices.poisson_value(i, 1.5) for i in range(4)]
+        self.assertEqual(result, expected)
+
+    def test_score_matrix(self):
+        hg_info = cross_handicap_hcp_prices.calc_SJD([2.6, 0.7])
+        result = score_matrix(hg_info[0], hg_info[1], 11)
+        expected = cross_handicap_hcp_prices.db_poisson(11, 11, 0, hg_info)
+        self.assertEqual(result, expected)
+
+    def test_sum_score_masses(self):
+        matrix = [[0.1, 0.05, 0.01],
+                  [0.2, 0.15, 0.04],
+                  [0.1, 0.25, 0.1]]
+        jolly, draw, jolly_by_one, jolly_by_two = sum_score_masses(matrix)
+        self.assertAlmostEqual(jolly, 0.55)
+        self.assertAlmostEqual(draw, 0.35)
+        self.assertAlmostEqual(jolly_by_one, 0.45)
+        self.assertAlmostEqual(jolly_by_two, 0.1)
+
+    def test_get_score_masses(self):
+        result = get_score_masses(2.6, 0.7, 11)
+        self.assertEqual(result, sum_score_masses(score_matrix((2.6 + 0.7)/2.0, (2.6 - 0.7)/2.0, 11)))
@@ -0,0 +1,80 @@
+import os
+import cPickle
+import tempfile
+import mock
+from unittest2 import TestCase
+
+from arbi.strats.cross_handicap_price_cache import PriceCache, memoize_prices, save_price_table
+
+
+class PriceCacheTest(TestCase):
+    def test_lru(self):
+        price_cache = PriceCache('tg', 2)
+        price_cache.set(1, {0.5: 1.9})
+        price_cache.set(2, {0.5: 2.0})
+        self.assertEqual(price_cache.get(1), {0.5: 1.9})
+        price_cache.set(3, {0.5: 2.1})
+
+        self.assertIsNone(price_cache.get(2))
+        self.assertEqual(price_cache.get(3), {0.5: 2.1})
+        self.assertEqual(price_cache.get_stats(), {'hits': 2, 'misses': 1, 'size': 2, 'table size': 0})
+
+    def test_memoize_prices(self):
+        price_cache = PriceCache('tg', 10)
+        calls = []
+
+        @memoize_prices(price_cache)
+        def get_prices(line, odds):
+            calls.append((line, odds))
+            return {line: odds}
+
+        prices = get_prices(-2, 1.9)
+        prices[-2] = 0
+        self.assertEqual(get_prices(-2, 1.9), {-2: 1.9})
+        self.assertEqual(get_prices(-2, 1.9 + 1e-9), {-2: 1.9 + 1e-9})  # nearby inputs are not mixed up
+        self.assertEqual(calls, [(-2, 1.9), (-2, 1.9 + 1e-9)])
+        self.assertEqual((price_cache.hits, price_cache.misses), (1, 2))
+
+    def test_memoize_prices_with_keyword_arguments(self):
+        price_cache = PriceCache('tg', 10)
+
+        @memoize_prices(price_cache)
+        def get_prices(line, odds, tolerance=0):
+            return {line: odds + tolerance}
+
+        self.assertEqual(get_prices(-2, 1.9, tolerance=0.1), {-2: 2.0})
+        self.assertEqual(get_prices(-2, 1.9), {-2: 1.9})
+        self.assertEqual(get_prices(-2, 1.9, tolerance=0.1), {-2: 2.0})
+        self.assertEqual((price_cache.hits, price_cache.misses), (1, 2))
+
+    def test_log_stats(self):
+        with mock.patch('time.time', return_value=1000):
+            price_cache = PriceCache('tg', 10, log_interval=60)
+        with mock.patch('time.time', return_value=1059), \
+                mock.patch('arbi.strats.cross_handicap_price_cache.log') as mock_log:
+            price_cache.get((-2, 1.9))
+        self.assertEqual(mock_log.info.called, 0)
+
+        with mock.patch('time.time', return_value=1060), \
+                mock.patch('arbi.strats.cross_handicap_price_cache.log') as mock_log:
+            price_cache.get((-2, 1.9))
+        mock_log.info.assert_called_once_with('Cross handicap %s price cache: %s', 'tg',
+                                              {'hits': 0, 'misses': 1, 'size': 0, 'table size': 0})
+
+    def test_load_table(self):
+        table_path = os.path.join(tempfile.mkdtemp(), 'prices.pkl')
+        price_cache = PriceCache('tg', 10)
+        price_cache.set((-2, 1.9), {2: 1.9})
+        save_price_table(table_path, [price_cache])
+        with open(table_path, 'rb') as f:
+            self.assertEqual(cPickle.load(f), {'tg': {(-2, 1.9): {2: 1.9}}})
+
+        price_cache = PriceCache('tg', 10, table_path)
+        self.assertEqual(price_cache.get((-2, 1.9)), {2: 1.9})
+        self.assertEqual(price_cache.get_stats(), {'hits': 1, 'misses': 0, 'size': 0, 'table size': 1})
+        os.remove(table_path)
+
+    def test_no_table(self):
+        price_cache = PriceCache('tg', 10, '/no/such/file.pkl')
+        self.assertIsNone(price_cache.get((-2, 1.9)))
+        self.assertTrue(price_cache.table_loaded)
@@ -272,6 +272,25 @@ class DirectArbiStrategyTest(TestCase):
                     ]
         self.assertEqual(opps, expected)
 
+    def test_lay_opp_at_the_profit_threshold(self):
+        # backing away at 2.1 against laying away at 2.0, i.e. backing home at 2.0, is exactly the threshold
+        threshold = 2.0 * 2.1 / (2.0 + 2.1) - 1
+        match = mock.Mock()
+        match.info = {'home_team_score': 0, 'away_team_score': 0}
+        match.odds.odds_dict = {('FT', 'AH'): {-0.5: {'b1': ([1.90, 2.10], 'a!A1', 0),
+                                                      'b3 lay': ([3.00, 2.00], 'c!A3', 0)}}}
+        expected = [(0.02439, (('AH Away', 0.5, 'FT', 'b3', 51.2, 2.0, 'c!A3', True),
+                               ('AH Away', 0.5, 'FT', 'b1', 48.8, 2.1, 'a!A1', False)))]
+
+        with mock.patch('arbi.constants.BOOKIE_IDS_WITH_LAY_PRICES', ['b3']), \
+                mock.patch('arbi.constants.BOOKIE_ID_MAP', {'b1': 'b1', 'b3': 'b3', 'b3 lay': 'b3'}):
+            self.assertEqual(DirectArbiStrategy(threshold).spot_arbi(match, self.bookie_availability_dict), expected)
+            self.assertEqual(DirectArbiStrategy(threshold + 1e-12).spot_arbi(match, self.bookie_availability_dict), [])
+            # the same opps as without pruning
+            with mock.patch('arbi.strats.direct_arbi.may_be_arbitrage', return_value=True):
+                self.assertEqual(DirectArbiStrategy(threshold).spot_arbi(match, self.bookie_availability_dict),
+                                 expected)
+
 
 class DirectArbiStrategyMethodsTest(TestCase):
     def setUp(self):
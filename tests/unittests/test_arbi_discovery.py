@@ -1,10 +1,13 @@
 import mock
+import socket
 import datetime
+from Queue import Queue
 from unittest2 import TestCase
 
 from arbi.models.arbi_spotter import ArbiSpotter
-from arbi.models.opportunity import ArbiOpportunity
+from arbi.models.opportunity import ArbiOpportunity, OppsDiff
 from arbi.arbi_discovery import ArbiDiscoveryThread
+from arbi.execution.arbi_exec import ArbiExecMessenger, ArbiExecSender
 from arbi.constants import BOOKIE_ID_MAP
 
 
@@ -49,6 +52,28 @@ class ArbiDiscoveryTest(TestCase):
         arbi_discovery.betfair_feed_thread.start.assert_called_once_with(delay=mock.ANY)
         arbi_discovery.run_exec_msger_thread.assert_called_once_with(restart=True)
 
+    def test_check_threads_alive_restarts_dead_shards(self):
+        arbi_discovery = ArbiDiscoveryThread(mock.Mock(), mock.Mock(), None)
+        arbi_discovery.check_vip_thread_flag = False
+        arbi_discovery.shard_router = mock.Mock()
+        arbi_discovery.shard_router.restart_dead_shards.return_value = [1]
+        old_vip_feed_thread = arbi_discovery.vip_feed_thread = mock.Mock()
+        arbi_discovery.run_vip_feed_thread = mock.Mock()
+
+        with mock.patch('time.time', return_value=120):
+            arbi_discovery.check_threads_alive()
+
+        # the restarted shard needs the bookie availability, and its matches from a new init dict
+        arbi_discovery.shard_router.put_bookie_availability.assert_called_once_with(
+            arbi_discovery.arbi_spotter.bookie_availability_dict)
+        old_vip_feed_thread.stop_event.set.assert_called_once_with()
+        arbi_discovery.run_vip_feed_thread.assert_called_once_with()
+
+        arbi_discovery.shard_router.restart_dead_shards.return_value = []
+        with mock.patch('time.time', return_value=140):
+            arbi_discovery.check_threads_alive()
+        self.assertEqual(arbi_discovery.run_vip_feed_thread.call_count, 1)
+
     def test_process_exec_msger_queue(self):
         arbi_discovery = ArbiDiscoveryThread(None, None, None)
         arbi_discovery.exec_msger_queue = mock.Mock()
@@ -64,6 +89,97 @@ class ArbiDiscoveryTest(TestCase):
             {'bookie1': False, 'bookie2': True})
         self.assertEqual(arbi_discovery.switch_vip_feed.called, 0)
 
+    def test_opps_released_from_cooldown_are_sent_again(self):
+        arbi_discovery = ArbiDiscoveryThread(None, ArbiSpotter({}), None)
+        arbi_discovery.exec_msger_queue = Queue()
+        arbi_discovery.exec_msger_thread = mock.Mock()
+        with mock.patch('arbi.execution.arbi_exec.socket'):
+            messenger = arbi_discovery.exec_msger_thread.exec_messenger = ArbiExecMessenger('', '')
+        tracker = arbi_discovery.arbi_spotter.arbi_opps_tracker
+        match_info = {'match_id': '001', 'home_team_score': 0, 'away_team_score': 0, 'is_in_running': True}
+
+        def get_opps():
+            return [ArbiOpportunity(match_info, self.occur_at_utc, '1',
+                                    (0.02, (('AH Home', -0.5, 'FT', '1', 49, 2.08, 'a!A1', False),
+                                            ('AH Away', 0.5, 'FT', '2', 51, 2.02, 'b!B2', False)))),
+                    ArbiOpportunity(match_info, self.occur_at_utc, '1',
+                                    (0.01, (('AH Home', -0.75, 'FT', '3', 49, 2.07, 'c!C3', False),
+                                            ('AH Away', 0.75, 'FT', '4', 51, 2.01, 'd!D4', False))))]
+
+        opp1, opp2 = get_opps()
+        tracker.update([opp1, opp2])
+        self.assertEqual(arbi_discovery.filter_arbi_opps(tracker.get_updated_opps()), [opp1, opp2])
+        tracker.update(get_opps())
+        self.assertEqual(tracker.get_updated_opps(), [])
+
+        # the execution system releases the bookies of opp1
+        messenger.read_exec_msg = lambda: ['NR^1^001^0^0^B1|4|-2^B2|5|2']
+        arbi_discovery.exec_msger_queue.put(messenger.process_exec_msg())
+        arbi_discovery.process_exec_msger_queue()
+
+        opp1_again, opp2_again = get_opps()
+        tracker.update([opp1_again, opp2_again])
+        self.assertEqual(arbi_discovery.filter_arbi_opps(tracker.get_updated_opps()), [opp1_again])
+
+    def test_opps_sent_again_after_reconnect(self):
+        arbi_discovery = ArbiDiscoveryThread(None, ArbiSpotter({}), self.menu_bar_model)
+        arbi_discovery.exec_msger_thread = mock.Mock()
+        with mock.patch('arbi.execution.arbi_exec.socket'):
+            messenger = arbi_discovery.exec_msger_thread.exec_messenger = ArbiExecMessenger('', '')
+        messenger.wfile = mock.Mock()
+        tracker = arbi_discovery.arbi_spotter.arbi_opps_tracker
+        match_info = {'match_id': '001', 'home_team_score': 0, 'away_team_score': 0, 'is_in_running': True}
+
+        def get_opps():
+            return [ArbiOpportunity(match_info, self.occur_at_utc, '1',
+                                    (0.02, (('AH Home', -0.5, 'FT', '1', 49, 2.08, 'a!A1', False),
+                                            ('AH Away', 0.5, 'FT', '2', 51, 2.02, 'b!B2', False))))]
+
+        tracker.update(get_opps())
+        arbi_discovery.send_arbi_opps(arbi_discovery.filter_arbi_opps(tracker.get_updated_opps()))
+        tracker.update(get_opps())
+        self.assertEqual(tracker.get_updated_opps(), [])
+
+        # the connection is lost when sending the next opps
+        messenger.wfile.write.side_effect = socket.error
+        new_exec_msger_thread = mock.Mock()
+        with mock.patch('arbi.execution.arbi_exec.socket'):
+            new_exec_msger_thread.exec_messenger = ArbiExecMessenger('', '')
+        with mock.patch('arbi.arbi_discovery.EXEC_RECONNECT_DELAY', 0), \
+                mock.patch('arbi.arbi_discovery.ArbiExecMsgerThreadObj', return_value=new_exec_msger_thread):
+            arbi_discovery.send_arbi_opps([tracker.arbi_opps[0]])
+        self.assertIs(arbi_discovery.exec_msger_thread, new_exec_msger_thread)
+
+        # the unchanged opps are sent to the new connection
+        opps = get_opps()
+        tracker.update(opps)
+        self.assertEqual(arbi_discovery.filter_arbi_opps(tracker.get_updated_opps()), opps)
+
+    def test_opps_dropped_by_the_sender_are_sent_again(self):
+        arbi_discovery = ArbiDiscoveryThread(None, ArbiSpotter({}), None)
+        arbi_discovery.exec_msger_thread = mock.Mock()
+        with mock.patch('arbi.execution.arbi_exec.socket'):
+            messenger = arbi_discovery.exec_msger_thread.exec_messenger = ArbiExecMessenger('', '')
+        messenger.sender = ArbiExecSender(messenger, queue_size=1)
+        tracker = arbi_discovery.arbi_spotter.arbi_opps_tracker
+        match_info = {'match_id': '001', 'home_team_score': 0, 'away_team_score': 0, 'is_in_running': True}
+
+        def get_opp(handicap):
+            return ArbiOpportunity(match_info, self.occur_at_utc, '1',
+                                   (0.02, (('AH Home', -handicap, 'FT', '1', 49, 2.08, 'a!A1', False),
+                                           ('AH Away', handicap, 'FT', '2', 51, 2.02, 'b!B2', False))))
+
+        for handicap in [0.5, 0.75]:  # the second is dropped, as the first fills the queue
+            tracker.update([get_opp(handicap)])
+            arbi_discovery.send_arbi_opps(arbi_discovery.filter_arbi_opps(tracker.get_updated_opps()))
+        self.assertEqual(messenger.sender.dropped_batch_count, 1)
+        self.assertTrue(tracker.has_forgotten_opps)
+
+        messenger.sender.queue.get()
+        opp = get_opp(0.75)
+        tracker.update([opp])
+        self.assertEqual(arbi_discovery.filter_arbi_opps(tracker.get_updated_opps()), [opp])
+
     def test_process_exec_msger_queue_switch_vip_feed(self):
         arbi_discovery = ArbiDiscoveryThread(None, None, None)
         arbi_discovery.exec_msger_queue = mock.Mock()
@@ -99,6 +215,70 @@ class ArbiDiscoveryTest(TestCase):
         }
         self.assertEqual(arbi_spotter.bookie_availability_dict, expected)
 
+    def test_update_arbi_spotter_unavailable_bookie_ids_sharded(self):
+        arbi_spotter = ArbiSpotter({})
+        arbi_spotter.bookie_availability_dict = {'b1': {'dead ball': True, 'running ball': False}}
+        arbi_discovery = ArbiDiscoveryThread(None, arbi_spotter, self.menu_bar_model)
+        arbi_discovery.shard_router = mock.Mock()
+
+        arbi_discovery.update_arbi_spotter_unavailable_bookie_ids({'b1': {'running ball': True}})
+
+        arbi_discovery.shard_router.put_bookie_availability.assert_called_once_with(
+            {'b1': {'dead ball': True, 'running ball': True}})
+
+    def test_run_sharded_discovery_loop(self):
+        arbi_discovery = ArbiDiscoveryThread(None, ArbiSpotter({}), self.menu_bar_model)
+        arbi_discovery.is_running = True
+        arbi_discovery.break_loop_count = 1
+        arbi_discovery.check_threads_alive = mock.Mock()
+        arbi_discovery.signal = mock.Mock()
+        arbi_discovery.exec_msger_queue = mock.Mock()
+        arbi_discovery.exec_msger_queue.empty.return_value = True
+        arbi_discovery.exec_msger_thread = mock.Mock()
+        arbi_discovery.exec_msger_thread.exec_messenger.filter_by_bookie_cooldown.side_effect = lambda opps: opps
+        arbi_discovery.send_arbi_opps = mock.Mock()
+        arbi_discovery.shard_router = mock.Mock(pkg_count=0)
+        arbi_discovery.shard_router.qsize.return_value = 0
+        opp1, opp2, opp3 = mock.Mock(profit=0.01), mock.Mock(profit=0.03), mock.Mock(profit=0.02)
+        arbi_discovery.shard_router.get_opps.side_effect = [{0: [opp1], 1: [opp2]}, {0: [opp3]}, {}]
+
+        arbi_discovery.run_sharded_discovery_loop()
+
+        # opp2 is unchanged the second time
+        self.assertEqual(arbi_discovery.send_arbi_opps.call_args_list,
+                         [mock.call([opp2, opp1]), mock.call([opp3])])
+        self.assertEqual(arbi_discovery.arbi_spotter.arbi_opps_tracker.arbi_opps, [opp2, opp3])
+
+    def test_get_wait_timeout(self):
+        arbi_discovery = ArbiDiscoveryThread(None, mock.Mock(cross_handicap_strat_result=None), None)
+        arbi_discovery.heartbeat_time = 100
+        arbi_discovery.threads_alive_last_checked = 95
+        arbi_discovery.arbi_spotter.next_rb_prices_expiry = 104
+
+        with mock.patch('arbi.arbi_discovery.HEARTBEAT_INTERVAL', 10), \
+                mock.patch('arbi.arbi_discovery.THREAD_ALIVE_CHECK_INTERVAL', 10), \
+                mock.patch('time.time', return_value=101):
+            self.assertEqual(arbi_discovery.get_wait_timeout(), 3)
+
+            arbi_discovery.arbi_spotter.cross_handicap_strat_result = mock.Mock()
+            self.assertEqual(arbi_discovery.get_wait_timeout(), 0.02)
+
+            arbi_discovery.arbi_spotter.cross_handicap_strat_result = None
+            arbi_discovery.arbi_spotter.next_rb_prices_expiry = 95
+            self.assertEqual(arbi_discovery.get_wait_timeout(), 0.02)
+
+    def test_exec_msger_queue_wakes_up_discovery_loop(self):
+        arbi_discovery = ArbiDiscoveryThread(None, None, mock.Mock())
+        with mock.patch('arbi.arbi_discovery.ArbiExecMsgerThreadObj'):
+            arbi_discovery.run_exec_msger_thread()
+
+        arbi_discovery.exec_msger_queue.put({'restart exec msger': True})
+        self.assertTrue(arbi_discovery.wakeup_event.is_set())
+
+        arbi_discovery.wakeup_event.clear()
+        arbi_discovery.source_queue.put([])
+        self.assertTrue(arbi_discovery.wakeup_event.is_set())
+
     def test_filter_bookies_leagues_and_teams(self):
         self.menu_bar_model.filter_panel_model.filtered_bookies = ['sbobet', 'ibcbet']
         self.menu_bar_model.filter_panel_model.filtered_leagues = ['ABC League']
@@ -192,11 +372,14 @@ class ArbiDiscoveryTest(TestCase):
         arbi_discovery.signal.found = mock.Mock()
 
         dummy_summary = ['some dummy summary']
-        opp1 = mock.Mock()
+        opp1 = mock.Mock(key='key1')
         opp1.get_summary.return_value = dummy_summary
-        opp2 = mock.Mock()
+        opp2 = mock.Mock(key='key2')
         opp2.get_summary.return_value = dummy_summary
-        arbi_opps = [opp1, opp2]
+        opp3 = mock.Mock(key='key3')
 
-        arbi_discovery.signal_table_view_update(arbi_opps)
-        arbi_discovery.signal.found.emit.assert_called_once_with([dummy_summary] * 2)
+        arbi_discovery.signal_table_view_update(OppsDiff([], [], []))
+        self.assertEqual(arbi_discovery.signal.found.emit.call_count, 0)
+        arbi_discovery.signal_table_view_update(OppsDiff([opp1], [opp2], [opp3]))
+        arbi_discovery.signal.found.emit.assert_called_once_with(
+            OppsDiff([('key1', dummy_summary)], [('key2', dummy_summary)], ['key3']))
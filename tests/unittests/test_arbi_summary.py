@@ -5,7 +5,7 @@ import StringIO
 from mock import patch, call, ANY
 from unittest2 import TestCase, main
 from arbi.arbi_summary import ArbiSummaryTableModel, ArbiSummaryLogger
-from arbi.models.opportunity import ArbiOpportunity
+from arbi.models.opportunity import ArbiOpportunity, OppsDiff
 from arbi.constants import ROOT_PATH
 
 
@@ -13,6 +13,18 @@ class SummaryTableModelTest(TestCase):
     def test(self):
         table_model = ArbiSummaryTableModel([], ['a'])
 
+    def test_apply_diff(self):
+        table_model = ArbiSummaryTableModel([], ['a'])
+        table_model.apply_diff(OppsDiff([('key1', ['opp1']), ('key2', ['opp2'])], [], []))
+        self.assertEqual(table_model.table, [['opp1'], ['opp2']])
+
+        table_model.apply_diff(OppsDiff([('key3', ['opp3'])], [('key2', ['opp2 changed'])], ['key1']))
+        self.assertEqual(table_model.table, [['opp3'], ['opp2 changed']])
+
+        table_model.clear_data()
+        table_model.apply_diff(OppsDiff([], [], ['key3']))
+        self.assertEqual(table_model.table, [])
+
 
 class SummaryLoggerTest(TestCase):
     # def test(self):
@@ -69,6 +81,24 @@ class SummaryLoggerTest(TestCase):
 
         self.assertEqual(results, expected)
 
+    def test_save_diff(self):
+        logger = ArbiSummaryLogger(os.path.join(ROOT_PATH, 'tests', 'test_arbi_opps_folder'), StringIO.StringIO())
+        logger.file = StringIO.StringIO()  # create_storage_file can be patched out by the other tests
+        logger.occurred_time_index = 3
+        logger.chinese_column_indices = [4]
+        opp1 = [False, 1, '8.438 %', '20150504 18:05:09', u'Ukraine U21', 'OU', 5.5, 1.66]
+        opp1_later = [False, 1, '8.438 %', '20150504 18:05:10', u'Ukraine U21', 'OU', 5.5, 1.66]
+        opp1_changed = [False, 1, '9.001 %', '20150504 18:05:11', u'Ukraine U21', 'OU', 5.5, 1.7]
+        opp2 = [False, 2, '1.018 %', '20150504 18:05:09', u'Ukraine U21', 'AH', -0.5, 1.78]
+
+        with patch('arbi.arbi_summary.log'):
+            results = [logger.save_diff(OppsDiff([('key1', opp1), ('key2', opp2)], [], [])),
+                       logger.save_diff(OppsDiff([('key1', opp1_later)], [], [])),  # e.g. forgotten and found again
+                       logger.save_diff(OppsDiff([], [('key1', opp1_changed)], ['key2']))]
+
+        self.assertEqual(results, [None, None, [opp2, opp1_later]])
+        self.assertEqual(logger.cached_arbi_opps_dict, {'key1': opp1_changed})
+
     def test_filter_out_saved_opps_no_filter(self):
         ArbiSummaryLogger.create_storage_file = lambda *args: None
         logger = ArbiSummaryLogger('')
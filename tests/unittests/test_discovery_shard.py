@@ -0,0 +1,145 @@
+import mock
+from Queue import Queue
+from unittest2 import TestCase
+
+from arbi.discovery_shard import ShardRouter, run_discovery_shard
+from arbi.models.strat_worker import get_shard_index
+from arbi.models.opportunity import OppsDiff
+from arbi.models.latency import StampedRecordList
+from arbi.ui_models.menu_bar_model import MenuBarModel
+
+
+class ShardRouterTest(TestCase):
+    def setUp(self):
+        self.router = ShardRouter(2, MenuBarModel())
+        for shard in self.router.shards:
+            shard.record_queue = Queue()
+
+    def get_queued(self, shard_index):
+        record_queue = self.router.shards[shard_index].record_queue
+        return [record_queue.get_nowait() for i in xrange(record_queue.qsize())]
+
+    def test_put_record_list(self):
+        # match 001 is in shard 1 and 004 in shard 0
+        record1 = mock.Mock(record_dict={'match_id': '001'})
+        record2 = mock.Mock(record_dict={'match_id': '004'})
+        record3 = mock.Mock(record_dict={'match_id': '001'})
+
+        self.router.put([record1, record2, record3])
+        self.router.put([record1])
+        self.router.put(None)
+
+        self.assertEqual(get_shard_index('001', 2), 1)
+        self.assertEqual(self.get_queued(0), [[record2]])
+        self.assertEqual(self.get_queued(1), [[record1, record3], [record1]])
+        self.assertEqual(self.router.pkg_count, 2)
+
+    def test_put_stamped_record_list(self):
+        record1 = mock.Mock(record_dict={'match_id': '001'})
+        record2 = mock.Mock(record_dict={'match_id': '004'})
+
+        with mock.patch('time.time', return_value=100.5):
+            self.router.put(StampedRecordList([record1, record2], {'read': 100.0, 'enqueued': 100.1}))
+
+        part0, = self.get_queued(0)
+        part1, = self.get_queued(1)
+        self.assertEqual((part0, part1), ([record2], [record1]))
+        self.assertEqual(part1.stamps, {'read': 100.0, 'enqueued': 100.5})
+        self.assertIsNot(part0.stamps, part1.stamps)
+
+    def test_put_init_dict(self):
+        self.router.put({'001': 'match1', '003': 'match3'})
+
+        self.assertEqual(self.get_queued(0), [{}])
+        self.assertEqual(self.get_queued(1), [{'001': 'match1', '003': 'match3'}])
+
+    def test_put_bookie_availability(self):
+        bookie_availability_dict = {'2': {'dead ball': True, 'running ball': False}}
+        self.router.put_bookie_availability(bookie_availability_dict)
+        bookie_availability_dict['2']['dead ball'] = False
+
+        expected = [('bookie availability', {'2': {'dead ball': True, 'running ball': False}})]
+        self.assertEqual(self.get_queued(0), expected)
+        self.assertEqual(self.get_queued(1), expected)
+
+    def test_restart_dead_shards(self):
+        for shard in self.router.shards:
+            shard.process = mock.Mock()
+        self.router.shards[0].process.is_alive.return_value = True
+        self.router.shards[1].process.is_alive.return_value = False
+        alive_shard = self.router.shards[0]
+
+        with mock.patch('arbi.discovery_shard.DiscoveryShard') as mock_shard_class:
+            self.assertEqual(self.router.restart_dead_shards(), [1])
+
+        mock_shard_class.assert_called_once_with(1, self.router.menu_bar_model, self.router.opps_queue)
+        mock_shard_class.return_value.start.assert_called_once_with()
+        self.assertEqual(self.router.shards, [alive_shard, mock_shard_class.return_value])
+
+    def test_get_opps(self):
+        self.router.opps_queue = Queue()
+        self.router.opps_queue.put((0, ['opp1']))
+        self.router.opps_queue.put((1, ['opp2']))
+        self.router.opps_queue.put((0, ['opp3']))
+
+        self.assertEqual(self.router.get_opps(timeout=0.01), {0: ['opp3'], 1: ['opp2']})
+        self.assertEqual(self.router.get_opps(timeout=0.01), {})
+
+
+class RunDiscoveryShardTest(TestCase):
+    def test_run_discovery_shard(self):
+        menu_bar_model = MenuBarModel()
+        menu_bar_model.account_model.use_parallel_computing = True
+        record_queue = Queue()
+        opps_queue = Queue()
+        record_list = [mock.Mock()]
+        record_queue.put({'001': 'match1'})
+        record_queue.put(record_list)
+        record_queue.put({'002': 'match2'})  # init dict sent again when vip server is switched
+        record_queue.put(('bookie availability', {'2': {'dead ball': False}}))
+        record_queue.put(None)
+
+        with mock.patch('arbi.discovery_shard.DataEngine') as mock_engine_class, \
+                mock.patch('arbi.discovery_shard.ArbiSpotter') as mock_spotter_class:
+            mock_spotter = mock_spotter_class.return_value
+            mock_spotter.bookie_availability_dict = {'2': {'dead ball': True, 'running ball': True}}
+            run_discovery_shard(1, menu_bar_model, record_queue, opps_queue)
+
+        mock_engine = mock_engine_class.return_value
+        self.assertFalse(menu_bar_model.account_model.use_parallel_computing)
+        self.assertFalse(menu_bar_model.strats_panel_model.use_async_for_cross_handicap_arb)
+        mock_engine.init_match_dict.assert_called_once_with({'001': 'match1'})
+        mock_engine.coalesce_record_lists.assert_called_once_with([record_list, {'002': 'match2'}])
+        mock_engine.update_match_dict.assert_called_once_with(mock_engine.coalesce_record_lists.return_value)
+        self.assertEqual(mock_spotter.bookie_availability_dict, {'2': {'dead ball': False, 'running ball': True}})
+        self.assertTrue(mock_spotter.full_scan_required)
+        mock_spotter.terminate_all_pools.assert_called_once_with()
+        self.assertEqual(mock_spotter.spot_arbi.called, 0)  # stopped before the scan
+
+    def test_run_discovery_shard_puts_opps(self):
+        record_queue = Queue()
+        opps_queue = Queue()
+
+        with mock.patch('arbi.discovery_shard.DataEngine'), \
+                mock.patch('arbi.discovery_shard.ArbiSpotter') as mock_spotter_class:
+            mock_spotter = mock_spotter_class.return_value
+            # the loop is stopped by None from the record queue after four scans
+            mock_spotter.spot_arbi.side_effect = self.get_spot_arbi_side_effect(
+                record_queue, mock_spotter, [(['opp1'], OppsDiff(['opp1'], [], [])), (['opp1'], OppsDiff([], [], [])),
+                                             ([], OppsDiff([], [], ['opp1'])), ([], OppsDiff([], [], []))])
+            run_discovery_shard(1, MenuBarModel(), record_queue, opps_queue)
+
+        # opps are only put when they have changed
+        self.assertEqual([opps_queue.get_nowait() for i in xrange(opps_queue.qsize())], [(1, ['opp1']), (1, [])])
+
+    @staticmethod
+    def get_spot_arbi_side_effect(record_queue, mock_spotter, results):
+        results = list(results)
+
+        def spot_arbi(dirty_match_dict):
+            if len(results) == 1:
+                record_queue.put(None)
+            arbi_opps, mock_spotter.arbi_opps_tracker.diff = results.pop(0)
+            return arbi_opps
+
+        return spot_arbi
@@ -1,5 +1,8 @@
+import time
+from io import BytesIO
 from unittest2 import TestCase, main
-from arbi.utils import gzip_string, unzip_string
+from threading import Event, Timer
+from arbi.utils import gzip_string, unzip_string, NotifyingQueue, WakeupTimer, read_gzip_lines
 
 
 class UtilTest(TestCase):
@@ -8,3 +11,49 @@ class UtilTest(TestCase):
         zipped_data = gzip_string(data)
         unzipped_data = unzip_string(zipped_data)
         self.assertEqual(unzipped_data, data)
+
+    def test_notifying_queue(self):
+        event = Event()
+        queue1 = NotifyingQueue(event)
+        queue2 = NotifyingQueue(event)
+
+        queue1.put('a')
+        self.assertTrue(event.is_set())
+
+        event.clear()
+        queue2.put('b')
+        self.assertTrue(event.wait(0))
+        self.assertEqual((queue1.get(), queue2.get()), ('a', 'b'))
+
+    def test_wakeup_timer(self):
+        event = Event()
+        queue = NotifyingQueue(event)
+        wakeup_timer = WakeupTimer(event, 0.02)
+
+        t0 = time.time()
+        wakeup_timer.wait(0.05)
+        self.assertTrue(0.05 <= time.time() - t0 < 1)
+
+        event.clear()
+        Timer(0.05, queue.put, ('a',)).start()
+        t0 = time.time()
+        wakeup_timer.wait(10)
+        self.assertTrue(0.05 <= time.time() - t0 < 1)
+        self.assertEqual(queue.get_nowait(), 'a')
+
+        thread = wakeup_timer.thread
+        wakeup_timer.stop()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+
+    def test_read_gzip_lines(self):
+        for data in ['abc', '\n abc\n\ndef \n\n', 'o1|2|3\n' * 5000, ' \n ', '']:
+            zipped_data = gzip_string(data)
+            for block_size in [1, 7, 4096]:
+                lines = read_gzip_lines(BytesIO(zipped_data + '[END]'), len(zipped_data), block_size)
+                self.assertEqual(lines, data.strip().split('\n'))
+
+    def test_read_gzip_lines_error(self):
+        zipped_data = gzip_string('abc')
+        self.assertIsNone(read_gzip_lines(BytesIO('not zipped'), 10, 4096))
+        self.assertIsNone(read_gzip_lines(BytesIO(zipped_data[:-3]), len(zipped_data), 4096))
@@ -1,3 +1,4 @@
+from multiprocessing import cpu_count
 from arbi.constants import MINI_PROFIT
 from arbi.feeds.vip.constants import HOSTS, PORTS
 from arbi.feeds.betfair.constants import BETFAIR_FEED_IP, BETFAIR_FEED_PORT
@@ -56,3 +57,4 @@ class TCAccountModel(object):
         self.yy_port = BETFAIR_FEED_PORT
 
         self.use_parallel_computing = False
+        self.strat_worker_count = max(cpu_count() - 2, 1)  # leave cores for the discovery loop and the feeds
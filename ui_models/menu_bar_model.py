@@ -1,3 +1,4 @@
+from multiprocessing import cpu_count
 from arbi.constants import MINI_PROFIT
 from arbi.feeds.vip.constants import HOSTS, PORTS
 from arbi.feeds.betfair.constants import BETFAIR_FEED_IP, BETFAIR_FEED_PORT
@@ -60,6 +61,9 @@ class AccountModel(object):
         self.yy_port = BETFAIR_FEED_PORT
 
         self.use_parallel_computing = False
+        self.strat_worker_count = max(cpu_count() - 2, 1)  # leave cores for the discovery loop and the feeds
+        # Matches are split across this number of processes, each with its own engine and spotter. 1 to disable.
+        self.discovery_shard_count = 1
 
 
 class FilterPanelModel(object):
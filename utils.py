@@ -1,9 +1,11 @@
 import os
+import io
+import time
 import zlib
-import gzip
-import StringIO
 import datetime
 import psutil
+from Queue import Queue
+from threading import Thread, current_thread
 # from dateutil import tz
 
 
@@ -37,16 +39,73 @@ def unzip_string(zipped_string):
     return data
 
 
-def gzip_string(arbi_opps_orders_str):
-    """Given a string, return a string compressed by gnu gzip"""
-    buf = StringIO.StringIO()
-    gz = gzip.GzipFile(fileobj=buf, mode='w')
+def read_gzip_lines(rfile, size, block_size):
+    """Read a gzipped body of size bytes from rfile and return its lines, same as
+    unzip_string(body).strip().split('\n'), or None if it can't be unzipped.
+
+    The body is read block by block into one buffer and unzipped as it comes, so a big packet is never held
+    as a whole in compressed form. Socket errors are raised.
+    """
+    buf = bytearray(min(size, block_size))
+    view = memoryview(buf)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    lines = ['']
     try:
-        gz.write(arbi_opps_orders_str)
-    finally:
-        gz.close()
+        while size > 0:
+            n = rfile.readinto(view[:min(size, block_size)])
+            if not n:
+                # the connection is closed before the end of the body
+                return None
+            size -= n
+            # zlib doesn't take memoryview in python 2, buffer doesn't copy either
+            extend_lines(lines, decompressor.decompress(buffer(buf, 0, n)))
+        extend_lines(lines, decompressor.flush())
+    except zlib.error:
+        return None
+
+    # strip the whole data
+    start = 0
+    while start < len(lines) and not lines[start].strip():
+        start += 1
+    end = len(lines)
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    if start == end:
+        return ['']
+    lines = lines[start:end]
+    lines[0] = lines[0].lstrip()
+    lines[-1] = lines[-1].rstrip()
+    return lines
+
+
+def extend_lines(lines, data):
+    """Add the lines of data to lines, where the last one of lines may be unfinished"""
+    if data:
+        data_lines = data.split('\n')
+        lines[-1] += data_lines[0]
+        lines.extend(data_lines[1:])
+
+
+class SocketReader(io.RawIOBase):
+    """Raw stream of a socket. Unlike socket.makefile(), io.BufferedReader(SocketReader(sock)) has readinto()."""
+    def __init__(self, sock):
+        self.sock = sock
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self.sock.recv_into(b)
+
+
+# a fresh compressor writing gzip headers, at the level of GzipFile, copied for each string
+gzip_compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
 
-    return buf.getvalue()
+
+def gzip_string(arbi_opps_orders_str):
+    """Given a string, return a string compressed by gnu gzip"""
+    compressor = gzip_compressor.copy()
+    return compressor.compress(arbi_opps_orders_str) + compressor.flush()
 
 
 def get_body_size(s):
@@ -77,4 +136,57 @@ def get_memory_usage(pid=None):
     # return the memory usage in MB
     process = psutil.Process(pid or os.getpid())
     mem = process.memory_info()[0] / 2 ** 20
-    return mem
\ No newline at end of file
+    return mem
+
+
+class NotifyingQueue(Queue):
+    """A Queue that sets event whenever an item is put, so that a thread can wait for more than one queue.
+
+    :param event: threading.Event, which can be shared by several queues
+    """
+    def __init__(self, event, maxsize=0):
+        Queue.__init__(self, maxsize)
+        self.event = event
+
+    def _put(self, item):
+        Queue._put(self, item)
+        self.event.set()
+
+
+class WakeupTimer(object):
+    """Wait for an event with a timeout, which is set by a timer thread at the deadline.
+
+    On Python 2, Event.wait(timeout) polls with sleeps of up to 50 ms, so it wakes up late when the event is set.
+    Event.wait() with no timeout wakes up at once.
+
+    :param event: threading.Event, e.g. of NotifyingQueues
+    :param check_interval: the longest sleep of the timer thread, i.e. how late it can be for an earlier deadline
+    """
+    def __init__(self, event, check_interval):
+        self.event = event
+        self.check_interval = check_interval
+        self.deadline = None
+        self.thread = None
+
+    def wait(self, timeout):
+        """Block until the event is set, or timeout seconds have passed"""
+        self.deadline = time.time() + timeout
+        if self.thread is None:
+            self.thread = Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+        self.event.wait()
+        self.deadline = None
+
+    def run(self):
+        while self.thread is current_thread():  # until stopped, or replaced after being stopped
+            deadline = self.deadline
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                self.event.set()
+                time.sleep(self.check_interval)
+            else:
+                time.sleep(self.check_interval if deadline is None else min(deadline - now, self.check_interval))
+
+    def stop(self):
+        self.thread = None